@@ -0,0 +1,152 @@
+"""
+bench_assembly.py - Chapter Assembly Throughput Benchmark
+
+Builds a synthetic chunk store (chunks written in shuffled completion
+order, like concurrent mode) and times three ways of producing the
+chapter WAV:
+
+1. disk    - sequential write of the same number of bytes (baseline)
+2. wave    - payloads read into Python and written with the wave module
+3. kernel  - ChunkStore.export_wav (copy_file_range / sendfile / mmap)
+
+Usage:
+    python scripts/bench_assembly.py --size-gb 4 --dir /path/on/target/disk
+    python scripts/bench_assembly.py --size-gb 1 --json
+
+Note: the page cache is not dropped between runs (needs root); on a
+machine with less RAM than --size-gb the numbers are disk-bound.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.chunk_store import ChunkStore  # noqa: E402
+
+
+def _mb_per_s(size, seconds):
+    return size / 1024 / 1024 / seconds if seconds > 0 else float("inf")
+
+
+def build_store(directory, total_bytes, chunk_bytes, seed=0):
+    """Create a chunk store of ~total_bytes with chunks in shuffled order"""
+    store = ChunkStore(directory, "bench")
+    total_chunks = max(1, total_bytes // chunk_bytes)
+    payload = os.urandom(chunk_bytes)
+
+    order = list(range(total_chunks))
+    random.Random(seed).shuffle(order)
+    for chunk_id in order:
+        store.put(chunk_id, payload)
+
+    return store, total_chunks
+
+
+def bench_disk(directory, size, block=8 * 1024 * 1024):
+    path = Path(directory) / "disk.bin"
+    block_data = os.urandom(block)
+    started = time.perf_counter()
+
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        written = 0
+        while written < size:
+            written += os.write(fd, block_data[: min(block, size - written)])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    seconds = time.perf_counter() - started
+    path.unlink()
+    return seconds
+
+
+def bench_wave(store, total_chunks, directory):
+    path = Path(directory) / "wave.wav"
+    started = time.perf_counter()
+
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(store.params["channels"])
+        wf.setsampwidth(store.params["sample_width"])
+        wf.setframerate(store.params["rate"])
+        for chunk_id in range(total_chunks):
+            wf.writeframes(store.read(chunk_id))
+
+    fd = os.open(path, os.O_RDONLY)
+    os.fsync(fd)  # same durability as the other two paths
+    os.close(fd)
+
+    seconds = time.perf_counter() - started
+    path.unlink()
+    return seconds
+
+
+def bench_kernel(store, total_chunks, directory):
+    path = Path(directory) / "kernel.wav"
+    result = store.export_wav(path, range(total_chunks))
+    path.unlink()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chapter WAV assembly")
+    parser.add_argument("--size-gb", type=float, default=1.0, help="Chapter size in GB (default: 1)")
+    parser.add_argument(
+        "--chunk-mb", type=float, default=2.9, help="Chunk size in MB (default: 2.9 ≈ 1 min of audio)"
+    )
+    parser.add_argument("--dir", default=None, help="Directory on the disk to test (default: temp dir)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    size = int(args.size_gb * 1024 ** 3)
+    chunk_bytes = int(args.chunk_mb * 1024 * 1024) & ~1  # whole 16-bit samples
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        if not args.json:
+            print(f"🧪 Building {args.size_gb:g} GB chunk store in {directory}...")
+        store, total_chunks = build_store(directory, size, chunk_bytes)
+        data_bytes = total_chunks * chunk_bytes
+
+        disk_seconds = bench_disk(directory, data_bytes)
+        wave_seconds = bench_wave(store, total_chunks, directory)
+        kernel = bench_kernel(store, total_chunks, directory)
+        store.remove()
+
+    results = {
+        "bytes": data_bytes,
+        "chunks": total_chunks,
+        "disk_mb_s": _mb_per_s(data_bytes, disk_seconds),
+        "wave_mb_s": _mb_per_s(data_bytes, wave_seconds),
+        "kernel_mb_s": _mb_per_s(data_bytes, kernel["seconds"]),
+        "kernel_method": kernel["method"],
+        "kernel_copies": kernel["copies"],
+    }
+    results["kernel_vs_disk"] = results["kernel_mb_s"] / results["disk_mb_s"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{'='*60}")
+    print(f"📊 Assembly throughput ({data_bytes / 1024 ** 3:.2f} GB, {total_chunks} chunks)")
+    print(f"{'='*60}")
+    print(f"Disk (sequential write): {results['disk_mb_s']:8.0f} MB/s")
+    print(f"wave module:             {results['wave_mb_s']:8.0f} MB/s")
+    print(
+        f"Kernel copy:             {results['kernel_mb_s']:8.0f} MB/s "
+        f"({results['kernel_method']}, {results['kernel_copies']} copies)"
+    )
+    print(f"Kernel vs disk:          {results['kernel_vs_disk']:8.0%}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
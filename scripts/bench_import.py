@@ -0,0 +1,133 @@
+"""
+bench_import.py - Cold-start Import Benchmark
+
+Imports each module in a fresh interpreter with `python -X importtime`,
+takes the cumulative import time of the module (median of --runs) and
+fails when it exceeds the budget. Also checks that importing has no side
+effects: the Gemini SDK, tiktoken and python-dotenv must stay unloaded and
+the shared APIKeyManager must not be created.
+
+Usage:
+    python scripts/bench_import.py
+    python scripts/bench_import.py --budget-ms 80 --runs 9 --top 15
+    python scripts/bench_import.py src.text_chunker --json
+
+Exit code 1 if a module is over budget or loads a lazy dependency.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ["src.audiobook_generator", "src.text_chunker", "src.book_planner"]
+
+# Must only be imported when a run actually needs them
+LAZY_MODULES = ["google.genai", "tiktoken", "dotenv"]
+
+CHECK_SNIPPET = """
+import json, sys
+import {module} as m
+gen = sys.modules.get("src.audiobook_generator")
+print(json.dumps({{
+    "loaded": [name for name in {lazy!r} if name in sys.modules],
+    "key_manager": getattr(gen, "_api_key_manager", None) is not None if gen else False,
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output
+
+    Returns:
+        Dict module → (self_us, cumulative_us)
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def import_once(module):
+    """Import module in a fresh interpreter, return its importtime table"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def check_side_effects(module):
+    """Lazy dependencies loaded / key manager created by a bare import"""
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK_SNIPPET.format(module=module, lazy=LAZY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_module(module, runs, top):
+    """
+    Benchmark one module
+
+    Returns:
+        Dict with median/min cumulative ms, the slowest dependencies
+        (self time, median run) and the side-effect check
+    """
+    samples = [import_once(module) for _ in range(runs)]
+    totals = sorted(s[module][1] for s in samples)
+    median_run = min(samples, key=lambda s: abs(s[module][1] - statistics.median(totals)))
+
+    slowest = sorted(median_run.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "module": module,
+        "median_ms": statistics.median(totals) / 1000,
+        "min_ms": totals[0] / 1000,
+        "slowest": [{"module": name, "self_ms": s / 1000, "cumulative_ms": c / 1000} for name, (s, c) in slowest],
+        **check_side_effects(module),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start import time")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Max median import time (default: 150)")
+    parser.add_argument("--top", type=int, default=8, help="Slowest dependencies to show (default: 8)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [bench_module(module, max(1, args.runs), args.top) for module in args.modules]
+    ok = all(r["median_ms"] <= args.budget_ms and not r["loaded"] and not r["key_manager"] for r in results)
+
+    if args.json:
+        print(json.dumps({"budget_ms": args.budget_ms, "ok": ok, "results": results}, indent=2))
+        sys.exit(0 if ok else 1)
+
+    for r in results:
+        status = "✅" if r["median_ms"] <= args.budget_ms else "❌"
+        print(f"\n{status} {r['module']}: {r['median_ms']:.1f} ms median, {r['min_ms']:.1f} ms min "
+              f"(budget {args.budget_ms:.0f} ms)")
+        if r["loaded"]:
+            print(f"   ❌ Loaded at import time: {', '.join(r['loaded'])}")
+        if r["key_manager"]:
+            print("   ❌ APIKeyManager created at import time")
+        for s in r["slowest"]:
+            print(f"   {s['self_ms']:>7.1f} ms self {s['cumulative_ms']:>8.1f} ms cum  {s['module']}")
+
+    print(f"\n{'🎉 All imports within budget' if ok else '❌ Import budget exceeded'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+bench_throughput.py - End-to-end Synthesis Throughput Benchmark
+
+Runs the real chapter pipeline (process_chapter / process_chapter_concurrent:
+key rotation, retries, chunk store, checkpoints, assembly, encoding)
+against a simulated TTS backend and sweeps workers × keys × chunk size.
+
+Simulated backend (replaces google.genai.Client for the run):
+- Latency = (base + per-token cost) × lognormal noise, per latency profile
+- Failure profile: soft-fails (finish_reason=OTHER, no content) and
+  "model overloaded" errors at fixed rates → exercises cooldown + retry
+- Audio: a tone of tokens × 0.08 s per chunk (24 kHz mono 16-bit)
+- All latencies and the 30 s cooldowns are multiplied by --time-scale so a
+  sweep finishes in minutes; compare results at the same settings only
+
+Reported per configuration (JSON comparable across commits):
+- chunks/s, requests/s, chapters/hour at the simulated latency
+- chunk latency p50 / p95 / p99 (chunk_done events of the run)
+- wasted requests (calls that did not produce a chunk)
+- scheduler overhead = wall − backend busy time / parallelism, key wait
+  time, and the tail after the last chunk (assembly / encode)
+
+Usage:
+    python scripts/bench_throughput.py
+    python scripts/bench_throughput.py --workers 1,3,5,7 --keys 7 --chunk-tokens 500,1000
+    python scripts/bench_throughput.py --profile degraded --output bench/HEAD.json
+    python scripts/bench_throughput.py --compare bench/HEAD.json --output bench/new.json
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types as _types
+from contextlib import redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import audiobook_generator as generator  # noqa: E402
+from src.api_key_manager import APIKeyManager  # noqa: E402
+from src.audio_check import AudioChecker  # noqa: E402
+from src.events import emit, start_event_log, stop_event_log  # noqa: E402
+from src.key_rotation_manager import KeyRotationManager  # noqa: E402
+from src.text_chunker import count_tokens  # noqa: E402
+
+SAMPLE_RATE = 24000
+SECONDS_PER_TOKEN = 0.08
+
+# Real-world seconds (before --time-scale)
+PROFILES = {
+    "ideal": {"base": 3.0, "per_token": 0.008, "sigma": 0.1, "soft_fail": 0.0, "overload": 0.0},
+    "realistic": {"base": 4.0, "per_token": 0.010, "sigma": 0.35, "soft_fail": 0.05, "overload": 0.02},
+    "degraded": {"base": 6.0, "per_token": 0.015, "sigma": 0.6, "soft_fail": 0.15, "overload": 0.08},
+}
+
+WORDS = (
+    "python audio chapter voice stream token worker queue retry latency signal buffer "
+    "encoder speech model request sentence paragraph reader listener narrator"
+).split()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def build_chapter(tokens, seed=0):
+    """Synthetic Markdown chapter of ~tokens tokens (headings + paragraphs)"""
+    rng = random.Random(seed)
+    parts = ["# Benchmark Chapter\n"]
+    total = 0
+    while total < tokens:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        if rng.random() < 0.1:
+            parts.append(f"\n## Section {len(parts)}\n")
+        parts.append(paragraph + "\n")
+        total += count_tokens(paragraph)
+    return "\n".join(parts)
+
+
+class SimulatedBackend:
+    """
+    Thay google.genai.Client bằng backend giả lập (latency + lỗi có kiểm soát)
+
+    Workflow:
+    1. install() → genai.Client trả về client giả lập
+    2. Pipeline gọi generate_content như bình thường
+    3. calls / soft_fails / overloads / busy_seconds → số request, lỗi, thời gian backend bận
+    """
+
+    def __init__(self, profile, time_scale=0.01, seed=0):
+        self.profile = profile
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.soft_fails = 0
+        self.overloads = 0
+        self.busy_seconds = 0.0
+        self._original = None
+        # One second of a 220 Hz tone (voiced, so the audio check passes)
+        self._tone = b"".join(
+            int(8000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE)).to_bytes(2, "little", signed=True)
+            for i in range(SAMPLE_RATE)
+        )
+
+    def install(self):
+        from google import genai
+
+        self._original = genai.Client
+        genai.Client = self._client
+
+    def uninstall(self):
+        if self._original is not None:
+            from google import genai
+
+            genai.Client = self._original
+            self._original = None
+
+    def _client(self, api_key=None, **kwargs):
+        return _types.SimpleNamespace(models=_types.SimpleNamespace(generate_content=self.generate_content))
+
+    def _audio(self, seconds):
+        size = int(seconds * SAMPLE_RATE) * 2
+        repeats = size // len(self._tone) + 1
+        return (self._tone * repeats)[:size]
+
+    def generate_content(self, model, contents, config=None):
+        tokens = count_tokens(contents)
+        p = self.profile
+        with self.lock:
+            self.calls += 1
+            roll = self.rng.random()
+            noise = self.rng.lognormvariate(0.0, p["sigma"])
+        latency = (p["base"] + p["per_token"] * tokens) * noise * self.time_scale
+
+        if roll < p["soft_fail"]:
+            latency *= 0.3  # refused early
+            self._sleep(latency)
+            with self.lock:
+                self.soft_fails += 1
+            candidate = _types.SimpleNamespace(content=None, finish_reason="FinishReason.OTHER")
+            return _types.SimpleNamespace(candidates=[candidate])
+
+        if roll < p["soft_fail"] + p["overload"]:
+            self._sleep(latency * 0.1)
+            with self.lock:
+                self.overloads += 1
+            raise RuntimeError("503 UNAVAILABLE: The model is overloaded. Please try again later.")
+
+        self._sleep(latency)
+        part = _types.SimpleNamespace(inline_data=_types.SimpleNamespace(data=self._audio(tokens * SECONDS_PER_TOKEN)))
+        candidate = _types.SimpleNamespace(content=_types.SimpleNamespace(parts=[part]), finish_reason="STOP")
+        return _types.SimpleNamespace(candidates=[candidate])
+
+    def _sleep(self, seconds):
+        time.sleep(seconds)
+        with self.lock:
+            self.busy_seconds += seconds
+
+
+class ScaledRotationManager(KeyRotationManager):
+    """KeyRotationManager with cooldowns scaled like the backend and key wait measured"""
+
+    def __init__(self, api_keys, time_scale):
+        super().__init__(api_keys)
+        self.time_scale = time_scale
+        self.key_wait_seconds = 0.0
+
+    def mark_key_failed(self, key, cooldown_seconds=30):
+        super().mark_key_failed(key, cooldown_seconds=cooldown_seconds * self.time_scale)
+
+    def get_next_key(self):
+        started = time.perf_counter()
+        key = super().get_next_key()
+        waited = time.perf_counter() - started
+        with self.lock:
+            self.key_wait_seconds += waited
+        return key
+
+
+def use_keys(count, usage_file):
+    """Install an APIKeyManager with `count` fake keys and no daily limit"""
+    for name in [n for n in os.environ if n.startswith("GEMINI_API_KEY_")]:
+        del os.environ[name]
+    for i in range(1, count + 1):
+        os.environ[f"GEMINI_API_KEY_{i}"] = f"bench-key-{i}"
+    manager = APIKeyManager(usage_file=str(usage_file), threshold=10 ** 9)
+    generator.set_api_key_manager(manager)
+    return manager
+
+
+def read_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_config(mode, workers, keys, chunk_tokens, chapter_text, args, seed):
+    """
+    Synthesize the synthetic chapter once with one configuration
+
+    Returns:
+        Result dict (see module docstring)
+    """
+    if args.dir:
+        Path(args.dir).mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix="bench_", dir=args.dir))
+    chapter = run_dir / "chapter.md"
+    chapter.write_text(chapter_text, encoding="utf-8")
+    events_path = run_dir / "events.jsonl"
+
+    with redirect_stdout(io.StringIO()):
+        manager = use_keys(keys, run_dir / "api_usage.json")
+    rotation = ScaledRotationManager(manager.keys, args.time_scale)
+    backend = SimulatedBackend(PROFILES[args.profile], time_scale=args.time_scale, seed=seed)
+    audio_checker = AudioChecker(path=str(run_dir / "audio_checks.json")) if args.audio_check else None
+
+    previous_chunk_size = generator.MAX_TOKENS_PER_CHUNK
+    generator.MAX_TOKENS_PER_CHUNK = chunk_tokens
+    backend.install()
+    start_event_log(events_path, console=False)
+    try:
+        with redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            if mode == "sequential":
+                ok = generator.process_chapter(
+                    None, chapter, rotation_manager=rotation, audio_checker=audio_checker
+                )
+            else:
+                ok = generator.process_chapter_concurrent(
+                    None, chapter, max_workers=workers, rotation_manager=rotation, audio_checker=audio_checker
+                )
+            wall = time.perf_counter() - started
+        emit("run_done", ok=ok, seconds=wall)
+    finally:
+        stop_event_log()
+        backend.uninstall()
+        generator.MAX_TOKENS_PER_CHUNK = previous_chunk_size
+        generator.set_api_key_manager(None)
+
+    events = read_events(events_path)
+    done = [e for e in events if e["event"] == "chunk_done"]
+    latencies = [e["seconds"] for e in done]
+    last = max((e["elapsed"] for e in done), default=None)
+    end = next((e["elapsed"] for e in events if e["event"] == "run_done"), None)
+    tail = end - last if last is not None and end is not None else None
+
+    parallelism = 1 if mode == "sequential" else max(1, min(workers, keys))
+    overhead = max(0.0, wall - backend.busy_seconds / parallelism)
+
+    if not args.keep:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "workers": workers if mode == "concurrent" else 1,
+        "keys": keys,
+        "chunk_tokens": chunk_tokens,
+        "ok": bool(ok),
+        "chunks": len(done),
+        "requests": backend.calls,
+        "wasted_requests": backend.calls - len(done),
+        "soft_fails": backend.soft_fails,
+        "overloads": backend.overloads,
+        "wall_seconds": wall,
+        "chunks_per_second": len(done) / wall if wall > 0 else 0.0,
+        "requests_per_second": backend.calls / wall if wall > 0 else 0.0,
+        "chapters_per_hour": 3600 / wall if ok and wall > 0 else 0.0,
+        "chunk_p50": percentile(latencies, 0.50),
+        "chunk_p95": percentile(latencies, 0.95),
+        "chunk_p99": percentile(latencies, 0.99),
+        "backend_busy_seconds": backend.busy_seconds,
+        "scheduler_overhead_seconds": overhead,
+        "scheduler_overhead_fraction": overhead / wall if wall > 0 else 0.0,
+        "key_wait_seconds": rotation.key_wait_seconds,
+        "tail_seconds": tail,
+    }
+
+
+def _config_key(r):
+    return (r["mode"], r["workers"], r["keys"], r["chunk_tokens"])
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'='*96}")
+    print("📊 Synthesis throughput (simulated backend)")
+    print(f"{'='*96}")
+    print(
+        f"{'Mode':<11}{'W':>3}{'K':>3}{'Tok':>6}{'Chunks':>7}{'Req':>5}{'Waste':>6}{'Wall s':>8}"
+        f"{'Chunk/s':>9}{'p50':>7}{'p95':>7}{'p99':>7}{'Ovh%':>6}{'KeyW s':>8}{'Tail s':>8}"
+    )
+    by_key = {_config_key(r): r for r in (baseline or [])}
+    for r in results:
+        fmt = lambda v: f"{v:>7.3f}" if v is not None else f"{'-':>7}"  # noqa: E731
+        line = (
+            f"{r['mode']:<11}{r['workers']:>3}{r['keys']:>3}{r['chunk_tokens']:>6}{r['chunks']:>7}"
+            f"{r['requests']:>5}{r['wasted_requests']:>6}{r['wall_seconds']:>8.2f}{r['chunks_per_second']:>9.2f}"
+            f"{fmt(r['chunk_p50'])}{fmt(r['chunk_p95'])}{fmt(r['chunk_p99'])}"
+            f"{r['scheduler_overhead_fraction']:>6.0%}{r['key_wait_seconds']:>8.2f}"
+            f"{r['tail_seconds'] if r['tail_seconds'] is not None else 0:>8.2f}"
+        )
+        old = by_key.get(_config_key(r))
+        if old and old["chunks_per_second"]:
+            line += f"  {r['chunks_per_second'] / old['chunks_per_second'] - 1:+.0%} vs baseline"
+        if not r["ok"]:
+            line += "  ❌ failed"
+        print(line)
+    print(f"{'='*96}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end synthesis throughput")
+    parser.add_argument("--modes", default="sequential,concurrent", help="Comma list (default: both)")
+    parser.add_argument("--workers", default="1,3,5,7", help="Concurrent workers to sweep (default: 1,3,5,7)")
+    parser.add_argument("--keys", default="7", help="Key counts to sweep (default: 7)")
+    parser.add_argument("--chunk-tokens", default="1000", help="Chunk sizes to sweep (default: 1000)")
+    parser.add_argument("--tokens", type=int, default=20000, help="Chapter size in tokens (default: 20000)")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic", help="Latency/failure profile")
+    parser.add_argument(
+        "--time-scale", type=float, default=0.01,
+        help="Multiplier on simulated latency and cooldowns (default: 0.01 → 12 s request = 0.12 s)",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration (best kept, default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (chapter text + backend)")
+    parser.add_argument("--audio-check", action="store_true", help="Validate every chunk (AudioChecker)")
+    parser.add_argument("--dir", default=None, help="Directory for temporary run files (default: temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep per-run directories")
+    parser.add_argument("--output", default=None, metavar="PATH", help="Write results as JSON to PATH")
+    parser.add_argument("--compare", default=None, metavar="PATH", help="Baseline JSON from an earlier run")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    configs = []
+    for keys in _ints(args.keys):
+        for chunk_tokens in _ints(args.chunk_tokens):
+            if "sequential" in modes:
+                configs.append(("sequential", 1, keys, chunk_tokens))
+            if "concurrent" in modes:
+                configs += [("concurrent", w, keys, chunk_tokens) for w in _ints(args.workers)]
+
+    chapter_text = build_chapter(args.tokens, seed=args.seed)
+    results = []
+    for i, (mode, workers, keys, chunk_tokens) in enumerate(configs, 1):
+        if not args.json:
+            print(f"🧪 [{i}/{len(configs)}] {mode} workers={workers} keys={keys} chunk={chunk_tokens}...", flush=True)
+        runs = [
+            run_config(mode, workers, keys, chunk_tokens, chapter_text, args, seed=args.seed + n)
+            for n in range(max(1, args.repeat))
+        ]
+        results.append(max(runs, key=lambda r: (r["ok"], r["chunks_per_second"])))
+
+    document = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "profile": args.profile,
+            "profile_params": PROFILES[args.profile],
+            "time_scale": args.time_scale,
+            "tokens": args.tokens,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "audio_check": args.audio_check,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(output.name + ".tmp")
+        tmp_path.write_text(json.dumps(document, indent=2), encoding="utf-8")
+        os.replace(tmp_path, output)
+
+    if args.json:
+        print(json.dumps(document, indent=2))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline_doc = json.load(f)
+        baseline = baseline_doc["results"]
+        if baseline_doc.get("settings", {}).get("time_scale") != args.time_scale:
+            print("⚠️  Baseline was recorded with a different --time-scale")
+    print_results(results, baseline)
+    if args.output:
+        print(f"💾 Results written: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -44,9 +44,30 @@ process_dir() {
     echo "-------------------------------------------------------"
     
     # Tìm file .md trong thư mục (xử lý cả file có khoảng trắng)
-    find "$dir" -maxdepth 1 -name "*.md" | sort | while read -r file; do
-        process_file "$file"
-    done
+    local files=()
+    while IFS= read -r file; do
+        files+=("$file")
+    done < <(find "$dir" -maxdepth 1 -name "*.md" | sort)
+
+    if [ ${#files[@]} -eq 0 ]; then
+        echo "⚠️  Không có file .md nào trong $dir"
+        return
+    fi
+
+    # Một process cho cả thư mục → chapter trước encode nền trong khi
+    # chapter sau đang synthesize (API keys không phải chờ encode)
+    .venv/bin/python -m src.audiobook_generator "${files[@]}" \
+        --voice "$VOICE" \
+        --concurrent \
+        --workers "$WORKERS" \
+        --resume
+
+    if [ $? -eq 0 ]; then
+        echo "✅ Hoàn thành thư mục: $dir"
+    else
+        echo "❌ Có lỗi khi xử lý thư mục: $dir"
+    fi
+    echo "-------------------------------------------------------"
 }
 
 # --- LOGIC CHÍNH ---
@@ -5,6 +5,9 @@ import threading
 from datetime import datetime
 from pathlib import Path
 
+from .events import emit
+from .metrics import KEY_REQUESTS_TODAY
+
 
 class APIKeyManager:
     """Manage multiple API keys with rotation and usage tracking"""
@@ -19,6 +22,9 @@ class APIKeyManager:
         # Thread safety for concurrent processing
         self.lock = threading.Lock()
 
+        # Daily usage per key, read when metrics are exported
+        KEY_REQUESTS_TODAY.set_function(self._requests_today)
+
     def load_keys(self):
         """Load all numbered API keys from environment"""
         keys = []
@@ -59,6 +65,17 @@ class APIKeyManager:
 
         return data
 
+    def reset_usage(self):
+        """Reset usage counters (provider quota has been reset)"""
+        with self.lock:
+            self.usage_data = {
+                "date": datetime.now().strftime("%Y-%m-%d"),
+                "keys": {},
+                "current_key_index": 0,
+            }
+            self.current_index = 0
+            self.save_usage()
+
     def save_usage(self):
         """Persist usage data to JSON file"""
         with open(self.usage_file, "w") as f:
@@ -68,6 +85,10 @@ class APIKeyManager:
         """Generate short hash for key identification"""
         return hashlib.sha256(key.encode()).hexdigest()[:8]
 
+    def _requests_today(self):
+        with self.lock:
+            return {(key_hash,): entry.get("requests", 0) for key_hash, entry in self.usage_data["keys"].items()}
+
     def get_active_key(self):
         """Return current active API key"""
         return self.keys[self.current_index]
@@ -162,20 +183,18 @@ class APIKeyManager:
             key_hash = self.hash_key(assigned_key)
             usage = self.get_key_usage(assigned_key)
 
-            # Only log if we are doing a re-assignment (i.e., the "natural" key was exhausted)
-            # Or just always log for clarity in debug mode? Let's keep it clean but informative.
-            # The caller prints the chunk start, but we can print a subtle info if it's a "smart" assignment.
-
-            # Check if this was the "natural" assignment
+            # Re-routed = the "natural" key (chunk_id % keys) was exhausted.
+            # Event is only enqueued here → the lock is never held for console I/O
             natural_index = chunk_id % len(self.keys)
-            if key_index != natural_index:
-                print(
-                    f"   🔄 Chunk {chunk_id + 1}: Re-routed to Key #{key_index + 1} ({key_hash}): {usage}/{self.threshold + 1} requests"
-                )
-            else:
-                print(
-                    f"   🔑 Chunk {chunk_id + 1}: Using Key #{key_index + 1} ({key_hash}): {usage}/{self.threshold + 1} requests"
-                )
+            emit(
+                "key_rerouted" if key_index != natural_index else "key_assigned",
+                chunk=chunk_id + 1,
+                key=key_hash,
+                key_index=key_index + 1,
+                key_display=f"Key #{key_index + 1} ({key_hash})",
+                usage=usage,
+                limit=self.threshold + 1,
+            )
 
             return assigned_key
 
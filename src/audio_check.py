@@ -0,0 +1,307 @@
+"""
+audio_check.py - Fast Validation of Synthesized Chunk Audio
+
+Features:
+- Runs on every chunk as it arrives (milliseconds per chunk, NumPy if
+  installed, pure Python on a decimated signal otherwise)
+- Truncation check: speech span vs expected duration from the chunk's
+  token count (seconds per token learned per voice, EWMA)
+- Degenerate audio check: RMS energy in 50 ms windows → mostly silence,
+  or runaway audio far longer than the text
+- Suspect chunks are re-requested by generate_audio_data (bounded retries,
+  best attempt kept if every retry is suspect)
+- Per-key / per-voice metrics persisted to data/audio_checks.json
+
+Keys are stored by short SHA256 hash (same as KeyHealthStore), never in
+plain text.
+"""
+
+import array
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .key_health import hash_key
+from .text_chunker import count_tokens
+
+# Prior until a voice has enough accepted chunks (Gemini TTS, cl100k tokens)
+DEFAULT_SECONDS_PER_TOKEN = 0.08
+
+# Accepted chunks needed before the learned rate replaces the prior
+MIN_RATE_SAMPLES = 5
+
+WINDOW_MS = 50
+SILENCE_DB = -45.0  # window RMS below this (dBFS) counts as silence
+
+# Verdict thresholds
+MIN_DURATION_RATIO = 0.4  # speech span < 40% of expected → truncated
+MAX_DURATION_RATIO = 3.0  # > 3× expected → runaway / looping audio
+MIN_VOICED_FRACTION = 0.3  # < 30% voiced windows → mostly silence
+MIN_EXPECTED_SECONDS = 3.0  # very short texts: duration checks too noisy
+
+REASONS = ("short", "silent", "long")
+
+
+def window_levels(pcm_data, rate=24000, channels=1, window_ms=WINDOW_MS):
+    """
+    RMS level (dBFS) of each window of 16-bit PCM
+
+    Returns:
+        List of floats (one per full window)
+    """
+    window = max(1, rate * window_ms // 1000) * channels
+    usable = len(pcm_data) // 2 // window * window
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        samples = np.frombuffer(pcm_data, dtype="<i2", count=usable).astype(np.float32)
+        power = np.mean(np.square(samples.reshape(-1, window)), axis=1)
+        return (10 * np.log10(power / 32768.0 ** 2 + 1e-12)).tolist()
+
+    samples = array.array("h")
+    samples.frombytes(bytes(pcm_data[: usable * 2]))
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    step = 4  # every 4th sample is plenty for a level estimate
+    levels = []
+    for start in range(0, usable, window):
+        chunk = samples[start:start + window:step]
+        power = sum(s * s for s in chunk) / len(chunk)
+        levels.append(10 * math.log10(power / 32768.0 ** 2 + 1e-12))
+    return levels
+
+
+def analyze_audio(pcm_data, rate=24000, channels=1):
+    """
+    Duration and voiced-window statistics of a chunk
+
+    Returns:
+        Dict with seconds, speech_seconds (first → last voiced window),
+        voiced_fraction
+    """
+    levels = window_levels(pcm_data, rate, channels)
+    seconds = len(pcm_data) / 2 / channels / rate
+    voiced = [i for i, level in enumerate(levels) if level > SILENCE_DB]
+
+    if not voiced:
+        return {"seconds": seconds, "speech_seconds": 0.0, "voiced_fraction": 0.0}
+
+    span = voiced[-1] - voiced[0] + 1
+    return {
+        "seconds": seconds,
+        "speech_seconds": span * WINDOW_MS / 1000,
+        "voiced_fraction": len(voiced) / len(levels),
+    }
+
+
+class AudioChecker:
+    """
+    Kiểm tra audio của từng chunk ngay khi API trả về
+
+    Workflow:
+    1. check(audio, text, voice, key) → phân tích RMS + so độ dài với số token
+    2. Suspect → generate_audio_data gọi lại API (tối đa max_retries lần)
+    3. Chunk hợp lệ → cập nhật seconds_per_token của voice (EWMA)
+    4. Đếm checked / suspect / retries theo key và voice, lưu JSON
+    """
+
+    def __init__(self, path="data/audio_checks.json", max_retries=2, rate=24000, channels=1,
+                 alpha=0.1, save_interval=5.0):
+        """
+        Args:
+            path: JSON metrics file (None = in memory only)
+            max_retries: Re-requests per chunk before the best attempt is kept
+            rate: PCM sample rate returned by the API
+            channels: PCM channels returned by the API
+            alpha: EWMA smoothing factor for seconds per token
+            save_interval: Min seconds between writes
+        """
+        self.path = Path(path) if path else None
+        self.max_retries = max_retries
+        self.rate = rate
+        self.channels = channels
+        self.alpha = alpha
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.data = self._load()
+        self._last_save = 0.0
+        self._dirty = False
+
+        # This run only
+        self.run = {"checked": 0, "suspect": 0, "retries": 0, "accepted_suspect": 0}
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+
+    def _load(self):
+        data = {"keys": {}, "voices": {}}
+        if self.path is None or not self.path.exists():
+            return data
+
+        try:
+            with open(self.path, "r") as f:
+                loaded = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Warning: Failed to load audio check stats: {e}")
+            return data
+
+        data.update(loaded)
+        return data
+
+    def _save_locked(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+    def save(self):
+        """Flush pending metrics to disk"""
+        with self.lock:
+            if self._dirty:
+                self._save_locked()
+
+    @staticmethod
+    def _counters(table, name):
+        entry = table.setdefault(name, {"checked": 0, "suspect": 0, "retries": 0})
+        for reason in REASONS:
+            entry.setdefault(reason, 0)
+        return entry
+
+    # ------------------------------------------------------------
+    # Checking
+    # ------------------------------------------------------------
+
+    def seconds_per_token(self, voice):
+        """Learned speech rate of a voice (prior until MIN_RATE_SAMPLES)"""
+        with self.lock:
+            entry = self.data["voices"].get(voice, {})
+            if entry.get("rate_samples", 0) >= MIN_RATE_SAMPLES:
+                return entry["seconds_per_token"]
+        return DEFAULT_SECONDS_PER_TOKEN
+
+    def check(self, pcm_data, text, voice="Kore", key=None, retry=False):
+        """
+        Validate one chunk's audio and record the outcome
+
+        Args:
+            pcm_data: Raw PCM returned by the API
+            text: Chunk text that was synthesized
+            voice: Voice name
+            key: API key that produced the audio (metrics only)
+            retry: True if this is a re-request of a suspect chunk
+
+        Returns:
+            Dict with suspect (bool), reason (short / silent / long / None),
+            seconds, speech_seconds, expected_seconds, ratio, voiced_fraction
+        """
+        tokens = count_tokens(text)
+        expected = tokens * self.seconds_per_token(voice)
+        result = analyze_audio(pcm_data, self.rate, self.channels)
+        ratio = result["speech_seconds"] / expected if expected > 0 else 1.0
+
+        reason = None
+        if result["voiced_fraction"] < MIN_VOICED_FRACTION:
+            reason = "silent"
+        elif expected >= MIN_EXPECTED_SECONDS and ratio < MIN_DURATION_RATIO:
+            reason = "short"
+        elif expected >= MIN_EXPECTED_SECONDS and ratio > MAX_DURATION_RATIO:
+            reason = "long"
+
+        result.update(
+            {
+                "suspect": reason is not None,
+                "reason": reason,
+                "tokens": tokens,
+                "expected_seconds": expected,
+                "ratio": ratio,
+            }
+        )
+        self._record(result, voice, key, retry)
+        return result
+
+    def _record(self, result, voice, key, retry):
+        with self.lock:
+            entries = [self._counters(self.data["voices"], voice)]
+            if key is not None:
+                entries.append(self._counters(self.data["keys"], hash_key(key)))
+
+            for entry in entries:
+                entry["checked"] += 1
+                entry["retries"] += 1 if retry else 0
+                if result["suspect"]:
+                    entry["suspect"] += 1
+                    entry[result["reason"]] += 1
+                entry["last_update"] = datetime.now().isoformat()
+
+            self.run["checked"] += 1
+            self.run["retries"] += 1 if retry else 0
+            self.run["suspect"] += 1 if result["suspect"] else 0
+
+            # Only clean, long-enough chunks teach the voice's speech rate
+            voice_entry = entries[0]
+            if not result["suspect"] and result["tokens"] >= 50 and result["speech_seconds"] > 0:
+                observed = result["speech_seconds"] / result["tokens"]
+                previous = voice_entry.get("seconds_per_token")
+                voice_entry["seconds_per_token"] = (
+                    observed if previous is None else (1 - self.alpha) * previous + self.alpha * observed
+                )
+                voice_entry["rate_samples"] = voice_entry.get("rate_samples", 0) + 1
+
+            self._dirty = True
+            if time.monotonic() - self._last_save >= self.save_interval:
+                self._save_locked()
+
+    def record_accepted_suspect(self):
+        """A chunk kept its best attempt after max_retries suspect results"""
+        with self.lock:
+            self.run["accepted_suspect"] += 1
+
+    # ------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------
+
+    def print_stats(self):
+        """Print this run's validation summary and per-key / per-voice history"""
+        self.save()
+        with self.lock:
+            run = dict(self.run)
+            voices = {k: dict(v) for k, v in self.data["voices"].items()}
+            keys = {k: dict(v) for k, v in self.data["keys"].items()}
+
+        if not run["checked"]:
+            return
+
+        print(f"\n{'='*60}")
+        print(f"🔎 Chunk Audio Checks")
+        print(f"{'='*60}")
+        print(
+            f"This run: {run['checked']} checked, {run['suspect']} suspect, "
+            f"{run['retries']} re-requests, {run['accepted_suspect']} kept after retries"
+        )
+        for title, table in (("Voice", voices), ("Key", keys)):
+            for name, entry in sorted(table.items()):
+                rate = entry["suspect"] / entry["checked"] if entry["checked"] else 0.0
+                reasons = ", ".join(f"{r} {entry[r]}" for r in REASONS if entry.get(r))
+                line = f"{title} {name}: {rate:.1%} suspect ({entry['suspect']}/{entry['checked']})"
+                if reasons:
+                    line += f" [{reasons}]"
+                if entry.get("seconds_per_token"):
+                    line += f", {entry['seconds_per_token'] * 1000:.0f} ms/token"
+                print(line)
+        print(f"{'='*60}\n")
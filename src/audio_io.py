@@ -0,0 +1,374 @@
+"""
+audio_io.py - Shared Audio I/O Helpers
+
+Features:
+- StreamingWavWriter: append PCM chunk by chunk with constant memory
+- Header patched after every write → file on disk is always a valid WAV
+  containing every chunk written so far (durable partial output)
+- copy_range(): file-to-file copy inside the kernel (copy_file_range →
+  sendfile → mmap fallback), payload bytes never enter Python
+- wav_data_range(): locate the PCM payload of a WAV file once
+- PcmMap: read-only memory map of a PCM region (chunk store segment or
+  WAV payload) → zero-copy memoryview / NumPy views per chunk or frame
+  range; the page cache is the buffer, nothing is materialized in RAM
+"""
+
+import errno
+import mmap
+import os
+import struct
+from pathlib import Path
+
+WAV_HEADER_SIZE = 44
+
+# Errors meaning "this copy primitive can't handle these files" → next fallback
+_COPY_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+    errno.ENOTSUP,
+}
+
+# Primitives that failed once stay disabled for this process
+_unsupported_copy = set()
+
+# mmap fallback window (multiple of the allocation granularity)
+_MMAP_WINDOW = 64 * 1024 * 1024
+
+
+def build_wav_header(data_size, channels=1, rate=24000, sample_width=2):
+    """
+    Build a canonical 44-byte PCM WAV header
+
+    Args:
+        data_size: Size of PCM payload in bytes
+        channels: Number of channels (1 = mono)
+        rate: Sample rate in Hz
+        sample_width: Bytes per sample (2 = 16-bit)
+    """
+    block_align = channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,  # PCM fmt chunk size
+        1,  # PCM format
+        channels,
+        rate,
+        rate * block_align,  # byte rate
+        block_align,
+        sample_width * 8,
+        b"data",
+        data_size,
+    )
+
+
+def wav_data_range(path):
+    """
+    Find the PCM payload of a WAV file by walking its RIFF chunks
+
+    Returns:
+        Tuple (data_offset, data_length, params dict with channels,
+        sample_width, rate)
+
+    Raises:
+        ValueError: If the file is not a PCM WAV
+    """
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            raise ValueError(f"Not a WAV file: {path}")
+
+        file_size = os.fstat(f.fileno()).st_size
+        params = None
+        offset = 12
+
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(16)
+                _, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt)
+                params = {"channels": channels, "sample_width": bits // 8, "rate": rate}
+            elif chunk_id == b"data":
+                if params is None:
+                    raise ValueError(f"WAV data before fmt chunk: {path}")
+                # Clamp to the real file size (streamed / truncated files)
+                return offset + 8, min(chunk_size, file_size - offset - 8), params
+
+            offset += 8 + chunk_size + (chunk_size & 1)  # chunks are word-aligned
+
+    raise ValueError(f"No data chunk in WAV file: {path}")
+
+
+def _copy_with_mmap(src_fd, dst_fd, src_offset, dst_offset, length):
+    if src_offset + length > os.fstat(src_fd).st_size:
+        raise IOError("Source file is shorter than the requested range")
+
+    copied = 0
+    while copied < length:
+        start = src_offset + copied
+        aligned = start - start % mmap.ALLOCATIONGRANULARITY
+        window = min(_MMAP_WINDOW, length - copied + (start - aligned))
+
+        with mmap.mmap(src_fd, window, access=mmap.ACCESS_READ, offset=aligned) as mm:
+            view = memoryview(mm)[start - aligned:]
+            try:
+                written = 0
+                while written < len(view):
+                    written += os.pwrite(dst_fd, view[written:], dst_offset + copied + written)
+            finally:
+                view.release()
+        copied += written
+
+
+def copy_range(src_fd, dst_fd, src_offset, dst_offset, length):
+    """
+    Copy `length` bytes from src_fd@src_offset to dst_fd@dst_offset
+
+    Tries os.copy_file_range (in-kernel, reflink on CoW filesystems), then
+    os.sendfile, then an mmap + pwrite loop. File positions of src_fd are
+    not used; dst_fd's position is moved by the sendfile path.
+
+    Returns:
+        Name of the primitive that finished the copy
+    """
+    copied = 0
+
+    if hasattr(os, "copy_file_range") and "copy_file_range" not in _unsupported_copy:
+        try:
+            while copied < length:
+                n = os.copy_file_range(
+                    src_fd, dst_fd, length - copied, src_offset + copied, dst_offset + copied
+                )
+                if n == 0:
+                    break  # short source
+                copied += n
+            if copied == length:
+                return "copy_file_range"
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+            _unsupported_copy.add("copy_file_range")
+
+    if hasattr(os, "sendfile") and "sendfile" not in _unsupported_copy:
+        try:
+            # sendfile writes at the destination's current position
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < length:
+                n = os.sendfile(dst_fd, src_fd, src_offset + copied, length - copied)
+                if n == 0:
+                    break
+                copied += n
+            if copied == length:
+                return "sendfile"
+        except OSError as e:
+            if e.errno not in _COPY_FALLBACK_ERRNOS:
+                raise
+            _unsupported_copy.add("sendfile")
+
+    if copied < length:
+        _copy_with_mmap(src_fd, dst_fd, src_offset + copied, dst_offset + copied, length - copied)
+    return "mmap"
+
+
+class PcmMap:
+    """
+    Read-only memory map of raw PCM in a file
+
+    Byte offsets are relative to the start of the PCM region (`offset` in
+    the file, e.g. the WAV data chunk). Views share the mapping's pages:
+    release them (or let them go out of scope) before close().
+    """
+
+    def __init__(self, path, params, offset=0, length=None):
+        """
+        Args:
+            path: File holding the PCM
+            params: Dict with channels, sample_width, rate
+            offset: Byte offset of the PCM region in the file
+            length: Region length (default: to the end of the file)
+        """
+        self.path = Path(path)
+        self.params = dict(params)
+        self.frame_size = self.params["channels"] * self.params["sample_width"]
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            file_size = os.fstat(fd).st_size
+            available = max(0, file_size - offset)
+            self.length = available if length is None else min(length, available)
+
+            aligned = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self._skip = offset - aligned
+            self._mmap = None
+            if self.length > 0:
+                self._mmap = mmap.mmap(fd, self._skip + self.length, access=mmap.ACCESS_READ, offset=aligned)
+        finally:
+            os.close(fd)  # the mapping keeps its own reference
+
+        self._view = memoryview(self._mmap)[self._skip:] if self._mmap is not None else memoryview(b"")
+
+    @classmethod
+    def from_wav(cls, path):
+        """Map the PCM payload of a WAV file (header parsed once)"""
+        offset, length, params = wav_data_range(path)
+        return cls(path, params, offset, length)
+
+    @property
+    def frames(self):
+        """Whole PCM frames in the region"""
+        return self.length // self.frame_size
+
+    @property
+    def seconds(self):
+        return self.frames / self.params["rate"]
+
+    def view(self, offset=0, length=None):
+        """Zero-copy memoryview of `length` bytes at `offset` (clamped to the region)"""
+        end = self.length if length is None else min(self.length, offset + length)
+        return self._view[offset:end]
+
+    def frame_view(self, start, count=None):
+        """Zero-copy memoryview of `count` frames starting at frame `start`"""
+        return self.view(start * self.frame_size, None if count is None else count * self.frame_size)
+
+    def array(self, offset=0, length=None):
+        """
+        Zero-copy NumPy int16 view shaped (frames, channels)
+
+        Raises:
+            ImportError: If NumPy is not installed
+            ValueError: If the PCM is not 16-bit
+        """
+        import numpy as np
+
+        if self.params["sample_width"] != 2:
+            raise ValueError("Only 16-bit PCM is supported")
+
+        view = self.view(offset, length)
+        usable = len(view) - len(view) % self.frame_size
+        samples = np.frombuffer(view, dtype="<i2", count=usable // 2)
+        return samples.reshape(-1, self.params["channels"])
+
+    def iter_blocks(self, ranges, block_size=1024 * 1024):
+        """
+        Yield memoryview blocks for (offset, length) ranges, in order
+
+        Raises:
+            IOError: If a range extends past the mapped region
+        """
+        for offset, length in ranges:
+            if offset + length > self.length:
+                raise IOError(f"PCM range {offset}+{length} is past the end of {self.path.name}")
+            end = offset + length
+            while offset < end:
+                step = min(block_size, end - offset)
+                yield self._view[offset:offset + step]
+                offset += step
+
+    def close(self):
+        """Unmap (views still in use keep the pages alive until released)"""
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # exported views outstanding → unmapped when they are freed
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class StreamingWavWriter:
+    """
+    Ghi WAV theo kiểu streaming (không giữ cả chapter trong RAM)
+
+    Workflow:
+    1. Mở file → ghi header với data_size = 0
+    2. write(pcm) → append PCM, patch lại 2 trường size trong header
+    3. close() → patch lần cuối + fsync
+
+    Sau mỗi write(), file luôn là WAV hợp lệ chứa mọi chunk đã ghi.
+    """
+
+    def __init__(self, path, channels=1, rate=24000, sample_width=2, fsync=True):
+        """
+        Args:
+            path: Output WAV path
+            channels: Number of channels
+            rate: Sample rate in Hz
+            sample_width: Bytes per sample
+            fsync: fsync after every write (durable against power loss)
+        """
+        self.path = Path(path)
+        self.channels = channels
+        self.rate = rate
+        self.sample_width = sample_width
+        self.fsync = fsync
+        self.data_bytes = 0
+
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.write(self._fd, self._header())
+
+    def _header(self):
+        return build_wav_header(
+            self.data_bytes, self.channels, self.rate, self.sample_width
+        )
+
+    def _patch_header(self):
+        # RIFF size @4 and data size @40 (canonical header layout)
+        os.pwrite(self._fd, struct.pack("<I", 36 + self.data_bytes), 4)
+        os.pwrite(self._fd, struct.pack("<I", self.data_bytes), 40)
+
+    @property
+    def closed(self):
+        """True once close() has been called"""
+        return self._fd is None
+
+    @property
+    def duration(self):
+        """Seconds of audio written so far"""
+        return self.data_bytes / (self.rate * self.channels * self.sample_width)
+
+    def write(self, pcm_data):
+        """Append PCM data and make it visible in the header immediately"""
+        if self._fd is None:
+            raise ValueError("WAV writer is closed")
+
+        view = memoryview(pcm_data)
+        offset = WAV_HEADER_SIZE + self.data_bytes
+        written = 0
+        while written < len(view):
+            written += os.pwrite(self._fd, view[written:], offset + written)
+
+        self.data_bytes += len(view)
+        self._patch_header()
+        if self.fsync:
+            os.fsync(self._fd)
+
+    def close(self):
+        """Finalize header and close the file"""
+        if self._fd is None:
+            return
+        self._patch_header()
+        os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -1,31 +1,113 @@
 import hashlib
-import json
+import math
 import os
 import re
 import threading
 import time
-import wave
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
 from pathlib import Path
 
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from google.genai.errors import ClientError
-
 from .api_key_manager import APIKeyManager
+from .audio_check import AudioChecker
+from .audio_io import StreamingWavWriter, build_wav_header
+from .chunk_store import DEFAULT_PARAMS, ChunkStore, get_store_paths
+from .chapter_index import (
+    REPLACEABLE_LAYOUTS,
+    chunk_char_ranges,
+    chunk_text_hash,
+    get_index_path,
+    load_index,
+    replace_chunk,
+    source_manifest,
+    write_cue,
+    write_index,
+)
+from .checkpoint import (
+    CheckpointJournal,
+    get_chunk_path,
+    load_checkpoint,
+    read_source,
+    scan_chunk_files,
+    source_fingerprint,
+    verify_checkpoint,
+)
+from .encode_pipeline import EncodePipeline, finalize_chapter_audio, write_chapter_index
+from .events import current_context, emit, event_context, flush_events, start_event_log, stop_event_log
+from .encoder import encode_chunk_mp3, encode_stats, open_mp3_encoder
+from .key_health import KeyHealthStore
+from .metrics import CHUNK_QUEUE_WAIT, CHUNKS, ERROR_OUTCOMES, SUSPECT_AUDIO, MetricsExporter, record_assembly, record_request
+from .post_process import DEFAULT_TARGET_LUFS, master_summary
+from .profiler import PROFILER
+from .tracer import TRACER
 from .key_rotation_manager import KeyRotationManager
 from .text_chunker import count_tokens, split_into_chunks
 
 # Note: Token counting and chunking functions are now in text_chunker.py
-
-load_dotenv()
-api_key_manager = APIKeyManager(usage_file="data/api_usage.json", threshold=9)
+# Note: google.genai (~0.4s), python-dotenv and the key manager are loaded on
+# first use, so importing this module (clean_markdown, TUI, planner) is cheap
 
 # Configuration
 MAX_TOKENS_PER_CHUNK = 1000  # Chỉ cần sửa 1 chỗ này để thay đổi chunk size!
 
+_api_key_manager = None
+_api_key_manager_lock = threading.Lock()
+_clients = {}  # (genai.Client, key) → client
+
+
+def get_api_key_manager():
+    """
+    Shared APIKeyManager, created on first use (loads .env + data/api_usage.json)
+
+    Returns:
+        APIKeyManager
+    """
+    global _api_key_manager
+    if _api_key_manager is None:
+        with _api_key_manager_lock:
+            if _api_key_manager is None:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                _api_key_manager = APIKeyManager(usage_file="data/api_usage.json", threshold=9)
+    return _api_key_manager
+
+
+def set_api_key_manager(manager):
+    """Use `manager` for every following run (benchmarks, job server; None = reload from .env)"""
+    global _api_key_manager
+    with _api_key_manager_lock:
+        _api_key_manager = manager
+
+
+def get_client(api_key):
+    """
+    Cached genai.Client per key (reuses its HTTP connection pool across requests)
+
+    Args:
+        api_key: Gemini API key
+
+    Returns:
+        genai.Client
+    """
+    from google import genai
+
+    # Keyed by the Client class too → a patched/simulated client never gets a stale entry
+    cache_key = (genai.Client, api_key)
+    client = _clients.get(cache_key)
+    if client is None:
+        with _api_key_manager_lock:
+            client = _clients.get(cache_key)
+            if client is None:
+                client = _clients[cache_key] = genai.Client(api_key=api_key)
+    return client
+
+
+def __getattr__(name):
+    # `from .audiobook_generator import api_key_manager` keeps working (lazily)
+    if name == "api_key_manager":
+        return get_api_key_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def classify_error(error: Exception) -> str:
     """
@@ -37,12 +119,16 @@ def classify_error(error: Exception) -> str:
         "MODEL_OVERLOAD": Server busy, cooldown 30s
         "UNKNOWN": Lỗi khác, không retry
     """
+    from google.genai.errors import ClientError
+
     error_str = str(error)
 
-    # Check 429 QUOTA_EXHAUSTED
+    # Check 429 QUOTA_EXHAUSTED (per-minute RPM / TPM limits → cooldown only)
     if isinstance(error, ClientError):
         if hasattr(error, 'code') and error.code == 429:
             if 'quota' in error_str.lower() or 'RESOURCE_EXHAUSTED' in error_str:
+                if parse_quota_error(error)["scope"] == "minute":
+                    return "RATE_LIMIT"
                 return "QUOTA_EXHAUSTED"
 
     # Check Model Overloaded
@@ -55,6 +141,43 @@ def classify_error(error: Exception) -> str:
     return "UNKNOWN"
 
 
+def parse_quota_error(error: Exception) -> dict:
+    """
+    Scope of a 429 RESOURCE_EXHAUSTED, from its google.rpc error details
+
+    Gemini answers the daily request quota and the per-minute RPM / TPM
+    limits with the same status; QuotaFailure.violations[].quotaId
+    (...PerDay... / ...PerMinute...) tells them apart. Without a quotaId,
+    a RetryInfo.retryDelay means the limit clears on its own (minute).
+
+    Returns:
+        Dict with scope ("day", "minute" or None if unknown) and
+        retry_delay (seconds, None if absent)
+    """
+    details = getattr(error, "details", None)
+    body = details.get("error", details) if isinstance(details, dict) else {}
+    quota_ids, retry_delay = [], None
+    for detail in body.get("details") or []:
+        if not isinstance(detail, dict):
+            continue
+        quota_ids += [str(v.get("quotaId", "")) for v in detail.get("violations") or [] if isinstance(v, dict)]
+        delay = detail.get("retryDelay")
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                retry_delay = float(delay[:-1])
+            except ValueError:
+                pass
+
+    text = " ".join(quota_ids) if quota_ids else str(error)
+    if "PerDay" in text:
+        scope = "day"
+    elif "PerMinute" in text or retry_delay is not None:
+        scope = "minute"
+    else:
+        scope = None
+    return {"scope": scope, "retry_delay": retry_delay}
+
+
 def clean_markdown(text: str) -> str:
     # clean Headers
     text = re.sub(r"^#+\s+", "", text, flags=re.MULTILINE)
@@ -80,144 +203,16 @@ def clean_markdown(text: str) -> str:
     return text
 
 
-# ============================================================ 
-# Checkpoint Functions (Phase 8: Resume Feature)
-# ============================================================ 
-
-
-def calculate_file_hash(file_path):
-    """Calculate SHA256 hash of file content to detect modifications"""
-    sha256 = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
-
-def get_chunk_path(output_dir, file_stem, chunk_id):
-    """Get path for an individual chunk file"""
-    return output_dir / f".chunk_{chunk_id}_{file_stem}.wav"
-
-
-def save_checkpoint(
-    output_dir, file_path, total_chunks, completed_chunks, voice="Kore"
-):
-    """
-    Save checkpoint after completed chunks
-
-    Args:
-        output_dir: Output directory path
-        file_path: Source markdown file path
-        total_chunks: Total number of chunks
-        completed_chunks: List of completed chunk IDs
-        voice: Voice name used
-
-    Returns:
-        Path to checkpoint file
-    """
-    checkpoint_data = {
-        "file": Path(file_path).name,
-        "file_path": str(Path(file_path).absolute()),
-        "file_hash": calculate_file_hash(file_path),
-        "total_chunks": total_chunks,
-        "completed_chunks": sorted(completed_chunks),
-        "timestamp": datetime.now().isoformat(),
-        "voice": voice,
-        "version": "2.0",
-    }
-
-    checkpoint_file = output_dir / f".checkpoint_{Path(file_path).stem}.json"
-    with open(checkpoint_file, "w") as f:
-        json.dump(checkpoint_data, f, indent=2)
-
-    return checkpoint_file
-
-
-def load_checkpoint(output_dir, file_path):
-    """
-    Load existing checkpoint if available
-
-    Args:
-        output_dir: Output directory path
-        file_path: Source markdown file path
-
-    Returns:
-        Checkpoint data dict or None if not found
-    """
-    checkpoint_file = output_dir / f".checkpoint_{Path(file_path).stem}.json"
-
-    if not checkpoint_file.exists():
-        return None
-
-    try:
-        with open(checkpoint_file, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"⚠️  Warning: Failed to load checkpoint: {e}")
-        return None
-
-
-def verify_checkpoint(checkpoint, file_path, output_dir):
-    """
-    Verify checkpoint is valid and all claimed chunk files exist
-
-    Args:
-        checkpoint: Checkpoint data dict
-        file_path: Source markdown file path
-        output_dir: Output directory path
-
-    Returns:
-        Tuple (is_valid: bool, valid_chunks: list, message: str)
-    """
-    if not checkpoint:
-        return False, [], "No checkpoint found"
-
-    # Check if source file still exists
-    if not Path(file_path).exists():
-        return False, [], "Source file no longer exists"
-
-    # Check if file hash matches
-    current_hash = calculate_file_hash(file_path)
-    if current_hash != checkpoint.get("file_hash"):
-        return False, [], "Source file has been modified since checkpoint"
-
-    # Check if completed_chunks list is valid
-    completed_chunks = checkpoint.get("completed_chunks")
-    if not isinstance(completed_chunks, list):
-        return False, [], "Invalid checkpoint format"
-
-    # Verify individual chunk files exist
-    file_stem = Path(file_path).stem
-    valid_chunks = []
-    missing_chunks = []
-
-    for chunk_id in completed_chunks:
-        chunk_path = get_chunk_path(output_dir, file_stem, chunk_id)
-        if chunk_path.exists() and chunk_path.stat().st_size > 0:
-            valid_chunks.append(chunk_id)
-        else:
-            missing_chunks.append(chunk_id)
-
-    if missing_chunks:
-        print(f"⚠️  Warning: {len(missing_chunks)} chunk files missing from checkpoint")
-
-    if not valid_chunks:
-        return False, [], "No valid chunk files found"
-
-    return True, valid_chunks, f"Checkpoint valid ({len(valid_chunks)} chunks)"
-
-
 # ============================================================
 # Audio File Operations
 # ============================================================
 
 
 def save_wav_file(filename, pcm_data, channels=1, rate=24000, sample_width=2):
-    with wave.open(str(filename), "wb") as wf:
-        wf.setnchannels(channels)  # Mono
-        wf.setsampwidth(sample_width)  # 16-bit
-        wf.setframerate(rate)  # 24kHz
-        wf.writeframes(pcm_data)  # Write PCM data
+    # Mono, 16-bit, 24kHz; payload written as-is (no copy through the wave module)
+    with open(filename, "wb") as f:
+        f.write(build_wav_header(len(pcm_data), channels, rate, sample_width))
+        f.write(pcm_data)
 
 
 def convert_wav_to_mp3(wav_path, mp3_path, bitrate="128k", delete_wav=True):
@@ -289,7 +284,7 @@ def convert_wav_to_mp3(wav_path, mp3_path, bitrate="128k", delete_wav=True):
         return False
 
 
-def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
+def generate_audio_data(client, text, voice="Kore", rotation_manager=None, audio_checker=None):
     """
     Generate audio with automatic key rotation using KeyRotationManager
 
@@ -298,6 +293,8 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
         text: Text to convert to speech
         voice: Voice name (default: Kore)
         rotation_manager: KeyRotationManager instance (required)
+        audio_checker: AudioChecker; truncated / mostly-silent audio is
+                       re-requested up to audio_checker.max_retries times
 
     Returns:
         bytes: Audio data
@@ -308,9 +305,12 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
     if rotation_manager is None:
         raise ValueError("rotation_manager is required!")
 
-    global api_key_manager  # For logging only
+    from google.genai import types
+
+    api_key_manager = get_api_key_manager()  # For logging only
 
     max_attempts = 9  # Max attempts = number of keys
+    suspect_attempts = []  # (speech_seconds, audio) of rejected responses
 
     for attempt in range(max_attempts):
         # Get next available key
@@ -329,27 +329,34 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
         key_display = f"Key #{key_index} ({key_hash})" if key_index > 0 else f"Key ({key_hash})"
         
         # Log active key execution
-        print(f"      ▶️  Thực thi: {key_display}")
+        emit("request_start", key=key_hash, key_index=key_index, key_display=key_display, attempt=attempt + 1)
 
         try:
-            # Create client with current key
-            client = genai.Client(api_key=current_key)
-
-            # Call API
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-preview-tts",
-                contents=text,
-                config=types.GenerateContentConfig(
-                    response_modalities=["AUDIO"],
-                    speech_config=types.SpeechConfig(
-                        voice_config=types.VoiceConfig(
-                            prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                voice_name=voice
-                            )
-                        )
-                    ),
-                ),
-            )
+            request_started = time.perf_counter()
+
+            with PROFILER.stage("api_request"):
+                TRACER.counter("in_flight_requests", 1)
+                try:
+                    # Client of the current key (cached, keeps its connections)
+                    client = get_client(current_key)
+
+                    # Call API
+                    response = client.models.generate_content(
+                        model="gemini-2.5-flash-preview-tts",
+                        contents=text,
+                        config=types.GenerateContentConfig(
+                            response_modalities=["AUDIO"],
+                            speech_config=types.SpeechConfig(
+                                voice_config=types.VoiceConfig(
+                                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                                        voice_name=voice
+                                    )
+                                )
+                            ),
+                        ),
+                    )
+                finally:
+                    TRACER.counter("in_flight_requests", -1)
 
             # Check candidates
             if not hasattr(response, "candidates") or not response.candidates:
@@ -362,7 +369,10 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
                 finish_reason = getattr(candidate, "finish_reason", "UNKNOWN")
                 if "OTHER" in str(finish_reason):
                     # Rate limit soft-fail
-                    print(f"   ⚠️  {key_display}: Rate limit soft-fail, cooldown 30s")
+                    emit("retry", key=key_hash, key_display=key_display, reason="Rate limit soft-fail",
+                         outcome="soft_fail", cooldown=30)
+                    record_request(key_hash, "soft_fail", time.perf_counter() - request_started)
+                    TRACER.instant("retry", reason="soft_fail", key=key_hash)
                     api_key_manager.log_request(current_key, success=False, error=f"Soft-fail: {finish_reason}")
                     rotation_manager.mark_key_failed(current_key, cooldown_seconds=30)
                     continue  # Retry with next key
@@ -378,7 +388,7 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
                     audio_data = part.inline_data.data
                     all_audio_parts.append(audio_data)
                 else:
-                    print(f"      Part {i}: No audio data (skipped)")
+                    emit("audio_part_skipped", part=i)
 
             if not all_audio_parts:
                 raise ValueError("No audio data found in API response!")
@@ -386,38 +396,85 @@ def generate_audio_data(client, text, voice="Kore", rotation_manager=None):
             # Concatenate all parts
             final_audio = b"".join(all_audio_parts)
 
-            # Success → return key to queue
-            rotation_manager.return_key(current_key)
+            latency = time.perf_counter() - request_started
             api_key_manager.log_request(current_key, success=True)
+            frame_size = DEFAULT_PARAMS["channels"] * DEFAULT_PARAMS["sample_width"]
+            record_request(
+                key_hash, "success", latency, len(final_audio),
+                len(final_audio) / frame_size / DEFAULT_PARAMS["rate"]
+            )
 
+            if audio_checker is not None:
+                with PROFILER.stage("audio_check", local=True):
+                    verdict = audio_checker.check(
+                        final_audio, text, voice=voice, key=current_key, retry=bool(suspect_attempts)
+                    )
+                if verdict["suspect"]:
+                    # Suspect audio is a soft failure of the key, never a success
+                    rotation_manager.return_key(current_key)
+                    health_store = getattr(rotation_manager, "health_store", None)
+                    if health_store is not None:
+                        health_store.record_soft_fail(current_key)
+                    SUSPECT_AUDIO.inc(reason=verdict["reason"])
+                    TRACER.instant("retry", reason=f"suspect_{verdict['reason']}", key=key_hash)
+                    suspect_attempts.append((verdict["speech_seconds"], final_audio))
+                    emit(
+                        "suspect_audio", key=key_hash, key_display=key_display, reason=verdict["reason"],
+                        speech_seconds=verdict["speech_seconds"], expected_seconds=verdict["expected_seconds"],
+                        voiced_fraction=verdict["voiced_fraction"],
+                    )
+                    if len(suspect_attempts) <= audio_checker.max_retries:
+                        emit("suspect_retry", attempt=len(suspect_attempts), max_retries=audio_checker.max_retries)
+                        continue
+                    # Every retry suspect → keep the attempt with the most speech
+                    audio_checker.record_accepted_suspect()
+                    emit("suspect_kept", attempts=len(suspect_attempts))
+                    return max(suspect_attempts, key=lambda item: item[0])[1]
+
+            # Accepted audio → return key to queue (latency feeds key health)
+            rotation_manager.return_key(current_key, latency=latency)
             return final_audio
 
         except Exception as e:
             error_type = classify_error(e)
+            record_request(key_hash, ERROR_OUTCOMES[error_type], time.perf_counter() - request_started)
+            if error_type != "UNKNOWN":
+                TRACER.instant("retry", reason=ERROR_OUTCOMES[error_type], key=key_hash)
 
             if error_type == "QUOTA_EXHAUSTED":
-                print(f"   ❌ {key_display}: Quota exhausted, removed permanently")
+                # Only a confirmed daily limit is persisted (banned until the reset
+                # in later runs too); an unknown scope removes the key for this run
+                daily = parse_quota_error(e)["scope"] == "day"
+                emit("key_removed", key=key_hash, key_display=key_display, error=str(e), persisted=daily)
                 api_key_manager.log_request(current_key, success=False, error=str(e))
-                rotation_manager.remove_key(current_key)
+                rotation_manager.remove_key(current_key, persist=daily)
                 # Retry với key khác
 
             elif error_type == "RATE_LIMIT" or error_type == "MODEL_OVERLOAD":
-                print(f"   ⚠️  {key_display}: {error_type}, cooldown 30s")
+                # Per-minute quota: wait as long as the server asks (RetryInfo)
+                retry_delay = parse_quota_error(e)["retry_delay"] if error_type == "RATE_LIMIT" else None
+                cooldown = min(max(1, math.ceil(retry_delay)), 120) if retry_delay else 30
+                emit("retry", key=key_hash, key_display=key_display, reason=error_type,
+                     outcome=ERROR_OUTCOMES[error_type], cooldown=cooldown)
                 api_key_manager.log_request(current_key, success=False, error=str(e))
-                rotation_manager.mark_key_failed(current_key, cooldown_seconds=30)
+                rotation_manager.mark_key_failed(current_key, cooldown_seconds=cooldown)
                 # Retry với key khác
 
             else:
                 # Unknown error, return key và raise
                 rotation_manager.return_key(current_key)
-                print(f"   ❌ Unknown error: {e}")
+                emit("request_error", key=key_hash, error=str(e))
                 raise
 
     # Hết attempts
+    if suspect_attempts:
+        return max(suspect_attempts, key=lambda item: item[0])[1]
     raise Exception(f"❌ Failed to generate audio after {max_attempts} attempts")
 
 
-def process_chapter(client, file_path, voice="Kore", rotation_manager=None):
+def process_chapter(client, file_path, voice="Kore", rotation_manager=None, audio_checker=None, cue=False):
+    partial_writer = None
+
     try:
         input_path = Path(file_path)
         parent_dir = input_path.parent
@@ -425,211 +482,329 @@ def process_chapter(client, file_path, voice="Kore", rotation_manager=None):
         # Use .mp3 for final output
         output_filename_mp3 = input_path.stem + ".mp3"
         output_path_mp3 = output_dir / output_filename_mp3
-        # Temp WAV file
+        # WAV fallback when no MP3 encoder is available
         output_filename_wav = input_path.stem + ".wav"
         output_path_wav = output_dir / output_filename_wav
+        # Chunks stream into a _PARTIAL file; renamed when complete
+        partial_mp3_path = output_dir / (input_path.stem + "_PARTIAL.mp3")
+        partial_wav_path = output_dir / (input_path.stem + "_PARTIAL.wav")
 
-        print(f"\n📖 Đang xử lý: {input_path.name}")
         output_dir.mkdir(exist_ok=True)
-        print(f"📁 Output directory: {output_dir}")
-
-        print("📄 Đang đọc file...")
-        with open(input_path, "r", encoding="utf-8") as f:
-            markdown_text = f.read()
+        emit("chapter_open", chapter=input_path.name, output_dir=str(output_dir), mode="sequential")
 
-        print(f"🧼 Đang làm sạch Markdown ({len(markdown_text):,} ký tự)...")
-        clean_text = clean_markdown(markdown_text)
-        print(f"✅ Đã làm sạch còn {len(clean_text):,} ký tự")
+        with PROFILER.stage("read_text", local=True):
+            # Stat before reading, hash the bytes read: an edit made mid-run
+            # leaves a stale fingerprint and hash in the index → watch mode
+            # picks the file up again
+            fingerprint = source_fingerprint(input_path)
+            markdown_text, file_hash = read_source(input_path)
 
+        with PROFILER.stage("clean_markdown", local=True):
+            clean_text = clean_markdown(markdown_text)
         total_tokens = count_tokens(clean_text)
-        print(f"📊 Tổng số tokens: {total_tokens:,}")
 
         if total_tokens > MAX_TOKENS_PER_CHUNK:
-            print(f"⚠️  File vượt {MAX_TOKENS_PER_CHUNK} tokens, cần chia nhỏ...")
-            text_chunks = split_into_chunks(clean_text, max_tokens=MAX_TOKENS_PER_CHUNK)
-            print(f"📦 Đã chia thành {len(text_chunks)} chunks")
+            with PROFILER.stage("split_chunks", local=True):
+                text_chunks = split_into_chunks(clean_text, max_tokens=MAX_TOKENS_PER_CHUNK)
         else:
-            print(f"✅ File nhỏ hơn {MAX_TOKENS_PER_CHUNK} tokens, xử lý một lần")
             text_chunks = [clean_text]
+        emit(
+            "text_ready", chapter=input_path.name, raw_chars=len(markdown_text), chars=len(clean_text),
+            tokens=total_tokens, chunks=len(text_chunks), max_tokens=MAX_TOKENS_PER_CHUNK,
+        )
+        emit("chapter_start", chapter=input_path.name, chunks=len(text_chunks), tokens=total_tokens, mode="sequential")
 
-        all_audio_parts = []
-        total_bytes = 0
+        # Stream each chunk straight into the MP3 encoder → memory stays flat,
+        # no temp WAV (falls back to a streaming WAV if no encoder is installed)
+        partial_writer = open_mp3_encoder(partial_mp3_path)
+        if partial_writer is None:
+            partial_writer = StreamingWavWriter(partial_wav_path)
+        chunks_written = 0
+        chunk_samples = []
+        frame_size = DEFAULT_PARAMS["channels"] * DEFAULT_PARAMS["sample_width"]
 
         for i, chunk in enumerate(text_chunks, 1):
-            print(f"\n🎙️  Đang xử lý chunk {i}/{len(text_chunks)}...")
-            print(f"   Chunk size: {count_tokens(chunk):,} tokens")
-
-            audio_part = generate_audio_data(client, chunk, voice=voice, rotation_manager=rotation_manager)
-            all_audio_parts.append(audio_part)
-            total_bytes += len(audio_part)
-
-            print(f"   ✅ Chunk {i} hoàn thành: {len(audio_part):,} bytes")
-
-        print(f"\n✅ Đã tạo xong {len(all_audio_parts)} phần audio")
-        print(f"📊 Tổng dung lượng: {total_bytes:,} bytes ({total_bytes/1024/1024:.2f} MB)")
-
-        print("🔗 Đang nối các phần audio...")
-        final_audio_data = b"".join(all_audio_parts)
-
-        print(f"💾 Đang lưu file WAV tạm...")
-        save_wav_file(str(output_path_wav), final_audio_data)
-
-        print(f"🔄 Đang convert sang MP3...")
-        if convert_wav_to_mp3(output_path_wav, output_path_mp3):
-            print(f"✅ Đã lưu: {output_path_mp3}")
+            chunk_started = time.perf_counter()
+            with PROFILER.chunk(i, chapter=input_path.stem), event_context(chapter=input_path.name, chunk=i):
+                emit("chunk_start", total=len(text_chunks), tokens=count_tokens(chunk))
+                try:
+                    audio_part = generate_audio_data(
+                        client, chunk, voice=voice, rotation_manager=rotation_manager, audio_checker=audio_checker
+                    )
+                except Exception as e:
+                    CHUNKS.inc(status="failed")
+                    emit("chunk_failed", error=str(e))
+                    raise
+                with PROFILER.stage("stream_write", local=True):
+                    partial_writer.write(audio_part)
+                chunks_written += 1
+                CHUNKS.inc(status="done")
+                chunk_samples.append(len(audio_part) // frame_size)
+                emit("chunk_done", total=len(text_chunks), bytes=len(audio_part),
+                     seconds=time.perf_counter() - chunk_started)
+
+        total_bytes = partial_writer.data_bytes
+        assembly_started = time.perf_counter()
+        with PROFILER.stage("assembly", local=True):
+            partial_writer.close()
+
+        if isinstance(partial_writer, StreamingWavWriter):
+            os.replace(partial_wav_path, output_path_wav)
+            final_output = output_path_wav
+            stats = None
+            record_assembly({"mode": "wav", "seconds": time.perf_counter() - assembly_started})
         else:
-            print(f"⚠️  Convert MP3 thất bại, giữ file WAV: {output_path_wav}")
+            stats = encode_stats(partial_writer)
+            os.replace(partial_mp3_path, output_path_mp3)
+            # Encoded while streaming → assembly is only the flush + rename
+            record_assembly({"mode": "stream", "seconds": time.perf_counter() - assembly_started, "encode": stats})
+            final_output = output_path_mp3
+
+        with PROFILER.stage("timing_index", local=True):
+            index_path = write_chapter_index(
+                final_output, input_path, DEFAULT_PARAMS, chunk_samples,
+                chunk_char_ranges(clean_text, text_chunks), cue=cue,
+                source_info=source_manifest(fingerprint, file_hash, text_chunks)
+            )
+        mode = "wav" if final_output == output_path_wav else "stream"
+        emit(
+            "assembly_done", chapter=input_path.name, output=str(final_output), mode=mode,
+            seconds=time.perf_counter() - assembly_started, encode=stats, index=str(index_path),
+            chunks=chunks_written, bytes=total_bytes,
+        )
+        emit(
+            "chapter_done", chapter=input_path.name, ok=True, output=str(final_output), mode=mode,
+            assembly_seconds=time.perf_counter() - assembly_started,
+        )
 
         return True
 
     except FileNotFoundError:
-        print(f"❌ Lỗi: Không tìm thấy file {file_path}")
+        emit("chapter_done", chapter=Path(file_path).name, ok=False, error=f"Không tìm thấy file {file_path}")
         return False
 
     except Exception as e:
+        import traceback
+
+        failure = {"error": str(e), "traceback": traceback.format_exc()}
         try:
-            if "all_audio_parts" in locals() and all_audio_parts:
-                partial_filename = output_filename_wav.replace(".wav", "_PARTIAL.wav")
-                partial_path = output_dir / partial_filename
-                partial_audio = b"".join(all_audio_parts)
-                save_wav_file(str(partial_path), partial_audio)
-
-                print(f"\n💾 Saved partial progress ({len(all_audio_parts)}/{len(text_chunks)} chunks):")
-                print(f"   File: {partial_path}")
-                print(f"   Size: {len(partial_audio):,} bytes ({len(partial_audio)/1024/1024:.2f} MB)")
-                print(f"   ℹ️  You can listen to completed chunks while investigating the error.")
+            # Partial audio is already on disk and playable; just finalize
+            if partial_writer is not None and not partial_writer.closed:
+                partial_writer.close()
+
+                if chunks_written:
+                    failure.update(
+                        partial=str(partial_writer.path), partial_bytes=partial_writer.data_bytes,
+                        partial_chunks=chunks_written, chunks=len(text_chunks),
+                    )
+                else:
+                    partial_writer.path.unlink(missing_ok=True)
         except Exception as save_error:
-            print(f"⚠️  Warning: Failed to save partial progress: {save_error}")
+            failure["partial_error"] = str(save_error)
 
-        print(f"\n❌ Lỗi khi xử lý {file_path}: {e}")
-        import traceback
-        traceback.print_exc()
+        emit("chapter_done", chapter=Path(file_path).name, ok=False, **failure)
         return False
 
 
-def process_chapter_concurrent(client, file_path, voice="Kore", max_workers=3, resume=False, rotation_manager=None):
+def process_chapter_concurrent(client, file_path, voice="Kore", max_workers=3, resume=False, rotation_manager=None, encode_pipeline=None, chunk_mp3=False, target_lufs=None, audio_checker=None, cue=False):
     """
     Process chapter with concurrent chunk processing using individual chunk files.
+
+    With an EncodePipeline, the finished chapter is queued for background
+    encoding and this returns as soon as synthesis is done. With chunk_mp3,
+    each chunk is encoded to MP3 as soon as it lands and the chapter is
+    built by joining MP3 frames (no chapter-length re-encode). With
+    target_lufs, chunk-edge silence is trimmed and the chapter is
+    loudness-normalized during the encode. With an AudioChecker, each
+    chunk's audio is validated on arrival and suspect chunks re-requested.
+    A timing index ({stem}.index.json, + {stem}.cue with cue) is written
+    next to the chapter output.
     """
-    global api_key_manager
+    api_key_manager = get_api_key_manager()
+
+    journal = None
+    store = None
+    mp3_store = None
 
     try:
         # Step 1: Parse paths
         input_path = Path(file_path)
         parent_dir = input_path.parent
         output_dir = parent_dir / "TTS"
-        # Final output is MP3, temp WAV for assembly
-        output_filename_mp3 = input_path.stem + ".mp3"
-        output_path_mp3 = output_dir / output_filename_mp3
-        output_filename_wav = input_path.stem + ".wav"
-        output_path_wav = output_dir / output_filename_wav
-
-        print(f"\n{'='*60}")
-        print(f"🎯 Processing Chapter: {input_path.name}")
-        print(f"⚡ Concurrent Mode: {max_workers} workers")
-        if resume:
-            print(f"🔄 Resume Mode: Enabled")
-        print(f"{ '='*60}\n")
 
         # Step 2: Create output directory
         output_dir.mkdir(exist_ok=True)
+        emit(
+            "chapter_open", chapter=input_path.name, output_dir=str(output_dir), mode="concurrent",
+            workers=max_workers, resume=resume,
+        )
 
-        # Step 3: Read and clean text
-        with open(input_path, "r", encoding="utf-8") as f:
-            markdown_text = f.read()
+        # Step 3: Read and clean text (stat before reading, hash the bytes
+        # read: an edit made mid-run leaves a stale fingerprint and hash in
+        # the index → watch mode picks the file up again)
+        with PROFILER.stage("read_text", local=True):
+            fingerprint = source_fingerprint(input_path)
+            markdown_text, file_hash = read_source(input_path)
 
-        clean_text = clean_markdown(markdown_text)
+        with PROFILER.stage("clean_markdown", local=True):
+            clean_text = clean_markdown(markdown_text)
         total_tokens = count_tokens(clean_text)
 
         # Step 4: Split into chunks
-        if total_tokens > MAX_TOKENS_PER_CHUNK:
-            text_chunks = split_into_chunks(clean_text, max_tokens=MAX_TOKENS_PER_CHUNK)
-        else:
-            text_chunks = [clean_text]
+        with PROFILER.stage("split_chunks", local=True):
+            if total_tokens > MAX_TOKENS_PER_CHUNK:
+                text_chunks = split_into_chunks(clean_text, max_tokens=MAX_TOKENS_PER_CHUNK)
+            else:
+                text_chunks = [clean_text]
 
         total_chunks = len(text_chunks)
-        
+        chunk_ranges = chunk_char_ranges(clean_text, text_chunks)
+
         # Step 5: Determine completed chunks (Resume logic)
         completed_chunks_list = []
         checkpoint = None
+        chunk_files = {}
+
+        if not resume:
+            # Fresh run: drop any chunk store left by an earlier attempt
+            for kind in ("chunks", "mp3"):
+                for path in get_store_paths(output_dir, input_path.stem, kind):
+                    path.unlink(missing_ok=True)
+        store = ChunkStore(output_dir, input_path.stem)
+        if chunk_mp3:
+            mp3_store = ChunkStore(output_dir, input_path.stem, kind="mp3")
         
         if resume:
-            checkpoint = load_checkpoint(output_dir, input_path)
-            is_valid, valid_chunks, msg = verify_checkpoint(checkpoint, input_path, output_dir)
+            with PROFILER.stage("resume_scan", local=True):
+                checkpoint = load_checkpoint(output_dir, input_path)
+
+                # Migrate legacy .chunk_N WAV files (one scandir pass) into the store
+                legacy_files = scan_chunk_files(output_dir, input_path.stem)
+                if legacy_files:
+                    emit("resume_import", chapter=input_path.name, files=len(legacy_files))
+                    for chunk_id in sorted(legacy_files):
+                        legacy_path = get_chunk_path(output_dir, input_path.stem, chunk_id)
+                        if chunk_id not in store:
+                            store.import_wav(chunk_id, legacy_path)
+                        legacy_path.unlink()
+
+                chunk_files = store.chunk_sizes()
+        if resume:
+            with PROFILER.stage("resume_scan", local=True):
+                is_valid, valid_chunks, msg = verify_checkpoint(
+                    checkpoint, input_path, output_dir, file_hash=file_hash, chunk_files=chunk_files
+                )
             
             if is_valid:
                 completed_chunks_list = valid_chunks
-                print(f"✅ Resuming from checkpoint: {len(completed_chunks_list)} chunks already done.")
-            else:
-                print(f"ℹ️  Resume info: {msg}. Starting fresh or reprocessing invalid chunks.")
+            emit(
+                "resume_checked", chapter=input_path.name, ok=is_valid, completed=len(completed_chunks_list),
+                message=msg,
+            )
 
         # Identify chunks to process
+        completed_chunks_set = set(completed_chunks_list)
         chunks_to_process = {}
         for i, chunk in enumerate(text_chunks):
-            if i not in completed_chunks_list:
+            if i not in completed_chunks_set:
                 chunks_to_process[i] = chunk
 
-        # Info display
-        print(f"📊 Chapter Info:")
-        print(f"   Total chunks: {total_chunks}")
-        print(f"   Already completed: {len(completed_chunks_list)}")
-        print(f"   Remaining to process: {len(chunks_to_process)}")
-        
-        if not chunks_to_process and total_chunks > 0:
-            print("\n✨ All chunks already completed! Proceeding to assembly.")
-        else:
-            print(f"   Expected API calls: {len(chunks_to_process)}")
-            print(f"   Estimated time: {(len(chunks_to_process) / max_workers) * 20:.0f}s ⚡")
-            print()
+        # Chapter info (time estimate from the keys' observed latency)
+        health_store = getattr(rotation_manager, "health_store", None)
+        latency = health_store.mean_latency() if health_store is not None else 20.0
+        rounds = -(-len(chunks_to_process) // max_workers)
+        emit(
+            "chapter_start", chapter=input_path.name, chunks=total_chunks, tokens=total_tokens,
+            resumed=len(completed_chunks_list), remaining=len(chunks_to_process), mode="concurrent",
+            workers=max_workers, estimate_seconds=rounds * latency, latency=latency,
+        )
 
-        # Thread-safe locks
-        checkpoint_lock = threading.Lock()
+        # Thread-safe progress + append-only checkpoint journal
         progress_lock = threading.Lock()
         completed_count = [len(completed_chunks_list)] 
-        current_completed_set = set(completed_chunks_list)
+        journal = CheckpointJournal(
+            output_dir,
+            input_path,
+            total_chunks,
+            completed_chunks_list,
+            voice=voice,
+            file_hash=file_hash,
+            fingerprint=fingerprint,
+        )
 
-        def process_single_chunk(chunk_id, chunk_text):
-            """Process a single chunk and save to individual file"""
-            nonlocal current_completed_set
-            
+        # Caller's event fields (e.g. job id) follow the chunk into worker threads
+        parent_context = current_context()
+
+        def process_single_chunk(chunk_id, chunk_text, queued_at):
+            """Process a single chunk and append it to the chapter chunk store"""
+            with event_context(**parent_context, chapter=input_path.name, chunk=chunk_id + 1):
+                return _process_single_chunk(chunk_id, chunk_text, queued_at)
+
+        def _process_single_chunk(chunk_id, chunk_text, queued_at):
+            chunk_started = time.perf_counter()
+            CHUNK_QUEUE_WAIT.observe(chunk_started - queued_at)
+            emit("chunk_start", total=total_chunks, tokens=count_tokens(chunk_text),
+                 queue_wait=chunk_started - queued_at)
             try:
                 # Get assigned API key
                 assigned_key = api_key_manager.get_key_for_chunk(chunk_id)
                 
                 # Create client
-                chunk_client = genai.Client(api_key=assigned_key)
+                chunk_client = get_client(assigned_key)
                 
                 # Generate audio
-                audio_data = generate_audio_data(chunk_client, chunk_text, voice=voice, rotation_manager=rotation_manager)
-                
-                # Save individual chunk file
-                chunk_path = get_chunk_path(output_dir, input_path.stem, chunk_id)
-                save_wav_file(chunk_path, audio_data)
+                with PROFILER.chunk(chunk_id + 1, chapter=input_path.stem):
+                    audio_data = generate_audio_data(
+                        chunk_client, chunk_text, voice=voice, rotation_manager=rotation_manager,
+                        audio_checker=audio_checker
+                    )
+
+                    # Append to chunk store (journal record comes after → never dangling).
+                    # Old MP3 frames of this chunk go first: if the encode below fails
+                    # or we die in between, finalize re-encodes instead of joining stale audio
+                    with PROFILER.stage("store_put", local=True):
+                        if mp3_store is not None:
+                            mp3_store.discard(chunk_id)
+                        store.put(chunk_id, audio_data)
                 
                 # Update progress and checkpoint
                 with progress_lock:
                     completed_count[0] += 1
-                    print(f"✅ Chunk {chunk_id + 1}/{total_chunks} saved to {chunk_path.name}")
-                    
-                with checkpoint_lock:
-                    current_completed_set.add(chunk_id)
-                    save_checkpoint(
-                        output_dir, input_path, total_chunks, list(current_completed_set), voice
-                    )
+                    done = completed_count[0]
+                emit("chunk_done", total=total_chunks, bytes=len(audio_data),
+                     seconds=time.perf_counter() - chunk_started, completed=done)
+
+                with PROFILER.chunk(chunk_id + 1, chapter=input_path.stem), \
+                        PROFILER.stage("checkpoint", local=True):
+                    journal.mark_completed(chunk_id)
+                emit("checkpoint", completed=done, total=total_chunks)
+                completed_chunks_set.add(chunk_id)
+
+                # Encode this chunk now, in parallel with the other workers;
+                # a miss here is encoded at finalize (PCM is already safe)
+                if mp3_store is not None:
+                    try:
+                        with PROFILER.chunk(chunk_id + 1, chapter=input_path.stem), \
+                                PROFILER.stage("chunk_mp3_encode", local=True):
+                            frames = encode_chunk_mp3(audio_data, store.params)
+                            if frames:
+                                mp3_store.put(chunk_id, frames)
+                    except Exception as e:
+                        emit("chunk_mp3_failed", error=str(e))
                 
+                CHUNKS.inc(status="done")
                 return True
                 
             except Exception as e:
-                print(f"❌ Error processing chunk {chunk_id + 1}: {e}")
+                CHUNKS.inc(status="failed")
+                emit("chunk_failed", error=str(e))
                 raise
 
         # Step 6: Execute Concurrent Processing
         if chunks_to_process:
-            print(f"⏳ Starting processing with {max_workers} workers...\n")
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"chunk-worker-{input_path.stem}") as executor:
                 future_to_chunk = {
-                    executor.submit(process_single_chunk, cid, text): cid
+                    executor.submit(process_single_chunk, cid, text, time.perf_counter()): cid
                     for cid, text in chunks_to_process.items()
                 }
                 
@@ -638,80 +813,192 @@ def process_chapter_concurrent(client, file_path, voice="Kore", max_workers=3, r
                     try:
                         future.result()
                     except Exception:
-                        # Error already printed in thread
+                        # Error already reported by the chunk_failed event
                         pass
         
         # Step 7: Verify all chunks exist before assembly
-        print(f"\n🔍 Verifying chunks for assembly...")
-        missing_chunks = []
-        for i in range(total_chunks):
-            chunk_path = get_chunk_path(output_dir, input_path.stem, i)
-            if not chunk_path.exists():
-                missing_chunks.append(i)
+        # Resumed chunks were validated against the store index, new ones
+        # were written by this run → no per-chunk stat needed here
+        missing_chunks = [i for i in range(total_chunks) if i not in completed_chunks_set]
         
         if missing_chunks:
-            print(f"❌ Missing chunks: {[i+1 for i in missing_chunks]}")
-            print(f"💾 Partial progress is saved in individual chunk files.")
-            print(f"ℹ️  Run again with --resume to finish.")
+            emit(
+                "chapter_done", chapter=input_path.name, ok=False, missing=[i + 1 for i in missing_chunks],
+                store=store.segment_path.name,
+            )
+            journal.close()
+            store.close()
+            if mp3_store is not None:
+                mp3_store.close()
             return False
 
-        # Step 8: Assemble Final Audio
-        print(f"🔗 Assembling {total_chunks} chunks in order...")
-        
-        # Create a new wave file for the final output
-        # We read parameters from the first chunk
-        first_chunk_path = get_chunk_path(output_dir, input_path.stem, 0)
-        if not first_chunk_path.exists():
-             print("❌ Critical error: First chunk missing, cannot determine WAV parameters.")
-             return False
-             
-        with wave.open(str(first_chunk_path), 'rb') as first_wav:
-            params = first_wav.getparams()
-
-        with wave.open(str(output_path_wav), 'wb') as final_wav:
-            final_wav.setparams(params)
-
-            for i in range(total_chunks):
-                chunk_path = get_chunk_path(output_dir, input_path.stem, i)
-                with wave.open(str(chunk_path), 'rb') as chunk_wav:
-                    final_wav.writeframes(chunk_wav.readframes(chunk_wav.getnframes()))
-
-        print(f"✅ WAV assembled: {output_path_wav}")
-
-        # Step 9: Convert WAV to MP3
-        print(f"🔄 Converting to MP3...")
-        if convert_wav_to_mp3(output_path_wav, output_path_mp3):
-            final_output = output_path_mp3
-        else:
-            print(f"⚠️  MP3 conversion failed, keeping WAV file")
-            final_output = output_path_wav
-
-        # Step 10: Cleanup chunk files
-        print(f"🧹 Cleaning up chunk files...")
-        for i in range(total_chunks):
-            chunk_path = get_chunk_path(output_dir, input_path.stem, i)
-            try:
-                chunk_path.unlink()
-            except Exception as e:
-                print(f"⚠️  Failed to delete {chunk_path.name}: {e}")
-                
-        checkpoint_file = output_dir / f".checkpoint_{input_path.stem}.json"
-        if checkpoint_file.exists():
-            checkpoint_file.unlink()
-
-        print(f"\n{'='*60}")
-        print(f"✅ Success! Audio saved to: {final_output}")
-        print(f"{'='*60}\n")
+        # Step 8: Final snapshot; checkpoint + store stay until the output exists
+        journal.close()
+        source_info = source_manifest(fingerprint, file_hash, text_chunks)
+        store.close()
+        if mp3_store is not None:
+            mp3_store.close()
+
+        if encode_pipeline is not None:
+            # Step 9: Encode in a background process → next chapter starts now
+            encode_pipeline.submit(
+                input_path.name, finalize_chapter_audio, str(output_dir), str(input_path), total_chunks, chunk_mp3,
+                target_lufs, chunk_ranges, cue, source_info
+            )
+            emit("chapter_done", chapter=input_path.name, ok=True, background_encode=True)
+            return True
+
+        # Step 9: Encode MP3 straight from the chunk store (no temp WAV), cleanup
+        emit("assembly_start", chapter=input_path.name, chunks=total_chunks)
+        with PROFILER.stage("assembly", local=True):
+            result = finalize_chapter_audio(
+                output_dir, input_path, total_chunks, chunk_mp3, target_lufs, chunk_ranges, cue, source_info
+            )
+        record_assembly(result)
+        emit(
+            "assembly_done", chapter=input_path.name, output=result["output"], mode=result["mode"],
+            seconds=result["seconds"], encode_error=result["encode_error"], encode=result["encode"],
+            master=master_summary(result["master"]), index=result["index"],
+        )
+        final_output = result["output"]
+        emit("chapter_done", chapter=input_path.name, ok=True, output=final_output)
         
         return True
 
     except Exception as e:
-        print(f"\n❌ Error in concurrent processing: {e}")
         import traceback
-        traceback.print_exc()
+
+        emit(
+            "chapter_done", chapter=Path(file_path).name, ok=False, error=str(e), traceback=traceback.format_exc(),
+        )
+        if journal is not None:
+            journal.close()
+        if store is not None:
+            store.close()
+        if mp3_store is not None:
+            mp3_store.close()
         return False
 
 
+def redo_chunk(file_path, chunk_number, voice="Kore", rotation_manager=None, audio_checker=None):
+    """
+    Re-synthesize one chunk of a finished chapter and splice it into the
+    output in place (timing index layout "pcm" or "frames")
+
+    Args:
+        file_path: Source markdown path
+        chunk_number: Chunk to redo (1-based, as printed during processing)
+
+    Returns:
+        bool: True if the chunk was replaced
+    """
+    return redo_chunks(
+        file_path, [chunk_number], voice=voice, rotation_manager=rotation_manager, audio_checker=audio_checker
+    )
+
+
+def redo_chunks(file_path, chunk_numbers, voice="Kore", rotation_manager=None, audio_checker=None):
+    """
+    Re-synthesize some chunks of a finished chapter in place (watch mode:
+    the chunks whose text changed since the chapter was built)
+
+    The text hash of every replaced chunk is refreshed in the timing
+    index; once all chunks match the current source, its fingerprint and
+    hash are stored too → the chapter counts as finished again.
+
+    Args:
+        file_path: Source markdown path
+        chunk_numbers: Chunks to redo (1-based)
+
+    Returns:
+        bool: True if every chunk was replaced
+    """
+    input_path = Path(file_path)
+    output_dir = input_path.parent / "TTS"
+    index_path = get_index_path(output_dir, input_path)
+
+    try:
+        index = load_index(index_path)
+    except (OSError, ValueError) as e:
+        emit("chapter_done", chapter=input_path.name, ok=False, mode="redo", error=f"No usable timing index: {e}")
+        return False
+
+    fingerprint = source_fingerprint(input_path)
+    markdown_text, file_hash = read_source(input_path)
+    clean_text = clean_markdown(markdown_text)
+    if count_tokens(clean_text) > MAX_TOKENS_PER_CHUNK:
+        text_chunks = split_into_chunks(clean_text, max_tokens=MAX_TOKENS_PER_CHUNK)
+    else:
+        text_chunks = [clean_text]
+
+    error = None
+    if len(text_chunks) != len(index["chunks"]):
+        error = (
+            f"changed since the chapter was built "
+            f"({len(text_chunks)} chunks now, {len(index['chunks'])} in the index)"
+        )
+    out_of_range = [n for n in chunk_numbers if not 1 <= n <= len(text_chunks)]
+    if error is None and out_of_range:
+        error = f"Chunk {out_of_range[0]} out of range (1-{len(text_chunks)})"
+    # Checked before any request: synthesizing audio that cannot be spliced wastes quota
+    if error is None and index.get("layout") not in REPLACEABLE_LAYOUTS:
+        error = (
+            f"{index['audio']} ({index.get('layout')} layout) cannot be patched in place "
+            "(build chapters with --chunk-mp3, or as WAV without --normalize)"
+        )
+    if error is not None:
+        emit("chapter_done", chapter=input_path.name, ok=False, mode="redo", error=error)
+        return False
+
+    emit(
+        "chapter_start", chapter=input_path.name, chunks=len(chunk_numbers), tokens=count_tokens(clean_text),
+        mode="redo",
+    )
+    for done, chunk_number in enumerate(chunk_numbers, 1):
+        # Failures below carry the chunk number through the context
+        with event_context(chapter=input_path.name, chunk=chunk_number):
+            chunk_text = text_chunks[chunk_number - 1]
+            emit("chunk_start", total=len(text_chunks), tokens=count_tokens(chunk_text))
+            started = time.perf_counter()
+            try:
+                audio_data = generate_audio_data(
+                    None, chunk_text, voice=voice, rotation_manager=rotation_manager, audio_checker=audio_checker
+                )
+            except Exception as e:
+                emit("chapter_done", chapter=input_path.name, ok=False, error=str(e))
+                return False
+
+            try:
+                result = replace_chunk(index_path, chunk_number - 1, audio_data)
+            except (ValueError, RuntimeError) as e:
+                emit("chapter_done", chapter=input_path.name, ok=False, error=str(e))
+                return False
+
+            # Replaced audio now speaks the current text of this chunk
+            index = load_index(index_path)
+            index["chunks"][chunk_number - 1]["text_hash"] = chunk_text_hash(chunk_text)
+            write_index(index_path, index)
+            emit("chunk_done", total=len(text_chunks), bytes=len(audio_data),
+                 seconds=time.perf_counter() - started, completed=done)
+            emit("chunk_replaced", audio=index["audio"], layout=result["layout"],
+                 delta_seconds=result["delta_seconds"])
+
+    current = [chunk_text_hash(chunk) for chunk in text_chunks]
+    if [entry.get("text_hash") for entry in index["chunks"]] == current:
+        index["source_fingerprint"] = fingerprint
+        index["source_hash"] = file_hash
+        write_index(index_path, index)
+
+    cue_path = output_dir / (Path(index["audio"]).stem + ".cue")
+    if cue_path.exists():
+        write_cue(index, cue_path)
+    emit(
+        "chapter_done", chapter=input_path.name, ok=True, mode="redo",
+        output=str(index_path.parent / index["audio"]),
+    )
+    return True
+
+
 def main():
     import argparse
     import sys
@@ -719,7 +1006,7 @@ def main():
     parser = argparse.ArgumentParser(
         description="Generate audiobook from markdown using Gemini TTS"
     )
-    parser.add_argument("file", nargs="?", help="Markdown file to process")
+    parser.add_argument("files", nargs="*", metavar="file", help="Markdown file(s) to process")
     parser.add_argument("--voice", default="Kore", help="Voice name (default: Kore)")
 
     # Concurrent processing flags
@@ -739,62 +1026,262 @@ def main():
         action="store_true",
         help="Resume from checkpoint if available (skip completed chunks)",
     )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=None,
+        help="Background encoder processes when processing several files "
+        "in concurrent mode (default: half the CPUs, max 4)",
+    )
+    parser.add_argument(
+        "--chunk-mp3",
+        action="store_true",
+        help="Encode each chunk to MP3 as soon as it is synthesized and build "
+        "the chapter by joining MP3 frames (concurrent mode; not gapless: "
+        "short silence at every chunk boundary)",
+    )
+    parser.add_argument(
+        "--normalize",
+        nargs="?",
+        type=float,
+        const=DEFAULT_TARGET_LUFS,
+        default=None,
+        metavar="LUFS",
+        help="Trim chunk-edge silence and normalize chapter loudness during "
+        f"assembly (concurrent mode, needs NumPy; default target: {DEFAULT_TARGET_LUFS} LUFS)",
+    )
+    parser.add_argument(
+        "--audio-retries",
+        type=int,
+        default=2,
+        help="Re-requests for a chunk whose audio looks truncated or mostly "
+        "silent (default: 2, 0 = report only)",
+    )
+    parser.add_argument(
+        "--cue",
+        action="store_true",
+        help="Also write a CUE sheet (one track per chunk) next to each chapter",
+    )
+    parser.add_argument(
+        "--redo-chunk",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Re-synthesize chunk N of a finished chapter and splice it into "
+        "the output in place (WAV, or MP3 built with --chunk-mp3)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Estimate without sending requests: chunk every file (directories: "
+        "their *.md chapters), report requests per chapter, total vs remaining "
+        "key quota, audio minutes and ETA from historical latency",
+    )
+    parser.add_argument(
+        "--no-audio-check",
+        action="store_true",
+        help="Disable chunk audio validation",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall time, CPU time and peak memory per pipeline stage and "
+        "per chunk, print a breakdown at the end",
+    )
+    parser.add_argument(
+        "--profile-dump",
+        default=None,
+        metavar="DIR",
+        help="With --profile: write cProfile stats and tracemalloc snapshots of "
+        "the local stages plus profile.json to DIR (implies --profile)",
+    )
+    parser.add_argument(
+        "--event-log",
+        nargs="?",
+        const="data/events.jsonl",
+        default=None,
+        metavar="PATH",
+        help="Append structured run events (chunk start/done, key rotation, retries, "
+        "checkpoints, assembly) as JSONL to PATH (default: data/events.jsonl)",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        metavar="FILE",
+        help="Record a timeline of key waits, requests, retries, writes and "
+        "assembly per thread to FILE (Chrome Trace JSON: chrome://tracing, ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        metavar="PATH",
+        help="Write Prometheus metrics to PATH (.prom, node_exporter textfile "
+        "collector), refreshed every 15s and at exit",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running",
+    )
 
     args = parser.parse_args()
 
-    # Validate workers
+    # Validate workers (warnings are emitted once the event log is running)
+    warnings = []
     if args.workers > 7:
-        print("⚠️  Warning: Max workers is 7 (number of API keys). Setting to 7.")
+        warnings.append("Max workers is 7 (number of API keys). Setting to 7.")
         args.workers = 7
     if args.workers < 1:
-        print("⚠️  Warning: Min workers is 1. Setting to 1.")
+        warnings.append("Min workers is 1. Setting to 1.")
         args.workers = 1
+    if args.normalize is not None and args.chunk_mp3:
+        # Chapter gain is only known after every chunk → per-chunk MP3 unusable
+        warnings.append("--normalize re-encodes the mastered chapter, ignoring --chunk-mp3.")
+        args.chunk_mp3 = False
+
+    if args.profile or args.profile_dump:
+        PROFILER.enable(dump_dir=args.profile_dump)
+    if args.trace:
+        TRACER.start()
+
+    # Console + JSONL written by one listener thread → workers never block on output
+    start_event_log(args.event_log)
+    run_started = time.perf_counter()
+    emit(
+        "run_start", files=args.files, concurrent=args.concurrent, workers=args.workers,
+        resume=args.resume, voice=args.voice,
+    )
+    for message in warnings:
+        emit("config_warning", message=message)
 
-    # Print header
-    print("\n" + "=" * 60)
-    print("🎙️  Gemini TTS Audiobook Generator")
-    print("=" * 60)
-
-    # Load API keys
-    global api_key_manager
+    # Load API keys (multi-line report → printed directly, after the banner)
+    api_key_manager = get_api_key_manager()
+    flush_events()
     api_key_manager.print_usage_stats()
 
-    # Initialize KeyRotationManager
-    rotation_manager = KeyRotationManager(api_keys=api_key_manager.keys)
-    print(f"🔄 Key Rotation Manager initialized with {len(api_key_manager.keys)} keys\n")
+    # Initialize KeyRotationManager (skips keys exhausted in earlier runs)
+    health_store = KeyHealthStore(path="data/key_health.json")
+    rotation_manager = KeyRotationManager(
+        api_keys=api_key_manager.keys, health_store=health_store
+    )
+    skipped = len(rotation_manager.removed_keys)
+    emit("keys_ready", keys=len(api_key_manager.keys) - skipped, skipped=skipped)
+
+    # Prometheus exposition (metrics are always recorded, exported on request)
+    metrics_exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        metrics_exporter = MetricsExporter(textfile=args.metrics_file, port=args.metrics_port).start()
+        emit("metrics_export", url=metrics_exporter.url, file=args.metrics_file)
+
+    # Validate each chunk's audio as it arrives (metrics in data/audio_checks.json)
+    audio_checker = None
+    if not args.no_audio_check:
+        audio_checker = AudioChecker(path="data/audio_checks.json", max_retries=max(0, args.audio_retries))
 
     # Create client (for synchronous mode)
-    client = genai.Client(api_key=api_key_manager.get_active_key())
+    client = get_client(api_key_manager.get_active_key())
 
-    # Get file to process
-    if args.file:
-        file_path = args.file
+    # Get files to process
+    if args.files:
+        file_paths = args.files
     else:
         # Default test file
-        file_path = "2.DATA/BOOK-2_Learn-Python/B2-CH02.md"
-        print(f"\n📝 No file specified, using default: {file_path}")
+        file_paths = ["2.DATA/BOOK-2_Learn-Python/B2-CH02.md"]
+        emit("default_file", path=file_paths[0])
+
+    if args.dry_run:
+        # Lazy: book_planner imports this module
+        from .book_planner import collect_chapters, estimate_job, print_estimate
+
+        chapters = collect_chapters(file_paths)
+        if not chapters:
+            emit("run_done", ok=False, error="No Markdown chapters found", seconds=time.perf_counter() - run_started)
+            stop_event_log()
+            sys.exit(1)
+        plan = estimate_job(
+            chapters, api_key_manager, health_store, voice=args.voice,
+            workers=args.workers if args.concurrent else 1,
+            audio_checker=audio_checker or AudioChecker(path="data/audio_checks.json"),
+        )
+        flush_events()
+        print_estimate(plan)
+        if metrics_exporter is not None:
+            metrics_exporter.close()
+        emit("run_done", ok=True, dry_run=True, requests=plan["total_requests"], seconds=time.perf_counter() - run_started)
+        stop_event_log()
+        sys.exit(0)
+
+    if args.redo_chunk is not None:
+        results = [
+            redo_chunk(
+                file_path, args.redo_chunk, voice=args.voice, rotation_manager=rotation_manager,
+                audio_checker=audio_checker
+            )
+            for file_path in file_paths
+        ]
+        ok = all(results)
+        health_store.save()
+        if audio_checker is not None:
+            audio_checker.save()
+        if metrics_exporter is not None:
+            metrics_exporter.close()
+        emit("run_done", ok=ok, seconds=time.perf_counter() - run_started)
+        stop_event_log()
+        sys.exit(0 if ok else 1)
+
+    # Several chapters → encode each one in the background while the next
+    # one is being synthesized (keeps the API keys busy)
+    encode_pipeline = None
+    if args.concurrent and len(file_paths) > 1:
+        encode_pipeline = EncodePipeline(max_workers=args.encode_workers)
 
     # Process with concurrent or synchronous mode
-    if args.concurrent:
-        mode_text = "CONCURRENT mode"
-        if args.resume:
-            mode_text += " with RESUME"
-        print(f"\n⚡ Using {mode_text} ({args.workers} workers)\n")
-
-        success = process_chapter_concurrent(
-            client, file_path, voice=args.voice, max_workers=args.workers, resume=args.resume, rotation_manager=rotation_manager
-        )
-    else:
-        print(
-            f"\n📝 Using SYNCHRONOUS mode (use --concurrent for faster processing)\n"
-        )
-        success = process_chapter(client, file_path, voice=args.voice, rotation_manager=rotation_manager)
+    success = True
+    for file_path in file_paths:
+        if args.concurrent:
+            ok = process_chapter_concurrent(
+                client, file_path, voice=args.voice, max_workers=args.workers, resume=args.resume,
+                rotation_manager=rotation_manager, encode_pipeline=encode_pipeline,
+                chunk_mp3=args.chunk_mp3, target_lufs=args.normalize, audio_checker=audio_checker,
+                cue=args.cue
+            )
+        else:
+            ok = process_chapter(
+                client, file_path, voice=args.voice, rotation_manager=rotation_manager,
+                audio_checker=audio_checker, cue=args.cue
+            )
+        success = success and ok
+
+    if encode_pipeline is not None:
+        emit("encode_wait", chapters=len(file_paths))
+        encode_pipeline.close()
+        flush_events()
+        encode_pipeline.print_stats()
+        success = success and not encode_pipeline.failed
+
+    health_store.save()
+    # Multi-line reports are printed directly, after the events before them
+    flush_events()
+    if audio_checker is not None:
+        audio_checker.print_stats()
+    if metrics_exporter is not None:
+        metrics_exporter.close()
+    if PROFILER.enabled:
+        PROFILER.disable()
+        PROFILER.print_report()
+        for path in PROFILER.dump():
+            emit("profile_written", path=str(path))
+    if TRACER.enabled:
+        TRACER.stop()
+        events = TRACER.save(args.trace)
+        emit("trace_written", path=args.trace, events=events)
 
     # Final result
-    if success:
-        print("\n🎉 Processing complete!")
-    else:
-        print("\n❌ Processing failed!")
+    emit("run_done", ok=success, seconds=time.perf_counter() - run_started)
+    stop_event_log()
+    if not success:
         sys.exit(1)
 
 
@@ -0,0 +1,470 @@
+"""
+book_packager.py - Whole-book M4B / Opus Packaging
+
+Features:
+- Collect a finished book's chapter audio (chapter/TTS/*.mp3|wav next to
+  each markdown file, or a folder of chapter audio files)
+- Chapter durations read up front from the audio itself (WAV data size,
+  MP3 Info/LAME tag) → sample-exact chapter markers
+- One streaming encode for the whole book: chapter PCM is piped into a
+  single ffmpeg process, with an ffmetadata file for chapters + tags
+- MP3 chapters are decoded on the fly (no temp WAV, no per-file encode)
+- Output written to a .part file and renamed once ffmpeg succeeds
+
+Replaces scripts/TTS_Copy.sh / TTS_Folder.sh (moving per-chapter MP3s
+into a book folder by hand).
+
+Usage:
+    python -m src.book_packager path/to/book/                  # → book.m4b
+    python -m src.book_packager path/to/book/ --format opus
+    python -m src.book_packager ch1.md ch2.md -o book.m4b --title "B5"
+"""
+
+import os
+import re
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from .audio_io import PcmMap, wav_data_range
+from .encoder import FfmpegPipeEncoder, ffmpeg_available
+from .mp3_frames import mp3_stream_info
+
+# Output formats: file suffix, ffmpeg muxer, codec options, default bitrate,
+# chapter style (ffmpeg [CHAPTER] sections, or Vorbis CHAPTERxxx comments —
+# ffmpeg's Ogg muxer writes wrong chapter times in some releases)
+FORMATS = {
+    "m4b": {
+        "suffix": ".m4b",
+        "muxer": "ipod",
+        "codec": ["-c:a", "aac"],
+        "bitrate": "64k",
+        "chapters": "ffmetadata",
+    },
+    "opus": {
+        "suffix": ".opus",
+        "muxer": "ogg",
+        "codec": ["-c:a", "libopus", "-application", "voip"],  # tuned for speech
+        "bitrate": "32k",
+        "chapters": "vorbis",
+    },
+}
+
+AUDIO_SUFFIXES = (".mp3", ".wav")
+
+# PCM block size piped into the encoder
+BLOCK_SIZE = 1024 * 1024
+
+
+def _natural_key(path):
+    """CH9 before CH10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", Path(path).name)]
+
+
+def chapter_audio(file_path):
+    """Finished audio of a markdown chapter (TTS/{stem}.mp3 or .wav), or None"""
+    file_path = Path(file_path)
+    for suffix in AUDIO_SUFFIXES:
+        output_path = file_path.parent / "TTS" / (file_path.stem + suffix)
+        if output_path.exists():
+            return output_path
+    return None
+
+
+def chapter_title(file_path):
+    """First markdown heading of a chapter, else the file stem"""
+    file_path = Path(file_path)
+    if file_path.suffix == ".md":
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    match = re.match(r"^#{1,6}\s+(.+?)\s*#*\s*$", line)
+                    if match:
+                        return match.group(1).replace("*", "").strip()
+        except OSError:
+            pass
+    return file_path.stem
+
+
+def collect_book(paths):
+    """
+    Expand files / directories into the book's chapters, in playback order
+
+    A directory may hold chapter markdown files (ch.md + TTS/ch.mp3), one
+    folder per chapter (B5-CH30/B5-CH30.md), or the chapter audio itself.
+
+    Returns:
+        List of dicts with title, source (markdown path or None),
+        audio (path or None if the chapter has not been generated yet)
+    """
+    chapters = []
+
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files = sorted(path.glob("*.md"), key=_natural_key)
+            if not files:
+                files = sorted(path.glob("*/*.md"), key=lambda p: _natural_key(p.parent))
+            if not files:
+                files = sorted(
+                    (p for p in path.iterdir() if p.suffix.lower() in AUDIO_SUFFIXES),
+                    key=_natural_key,
+                )
+        elif path.is_file():
+            files = [path]
+        else:
+            print(f"⚠️  Bỏ qua: '{path}' không tồn tại")
+            continue
+
+        for file_path in files:
+            if file_path.suffix.lower() in AUDIO_SUFFIXES:
+                chapters.append({"title": file_path.stem, "source": None, "audio": file_path})
+            else:
+                chapters.append(
+                    {
+                        "title": chapter_title(file_path),
+                        "source": file_path,
+                        "audio": chapter_audio(file_path),
+                    }
+                )
+
+    return chapters
+
+
+def probe_chapter(audio_path):
+    """
+    Read format and exact length of a chapter's audio (no decoding)
+
+    Returns:
+        Dict with kind (wav / mp3), rate, channels, samples, and for WAV
+        data_offset, data_length, sample_width
+    """
+    audio_path = Path(audio_path)
+    if audio_path.suffix.lower() == ".wav":
+        offset, length, params = wav_data_range(audio_path)
+        frame_size = params["channels"] * params["sample_width"]
+        return {
+            "kind": "wav",
+            "rate": params["rate"],
+            "channels": params["channels"],
+            "sample_width": params["sample_width"],
+            "samples": length // frame_size,
+            "data_offset": offset,
+            "data_length": length - length % frame_size,
+        }
+
+    info = mp3_stream_info(audio_path)
+    return {
+        "kind": "mp3",
+        "rate": info["sample_rate"],
+        "channels": info["channels"],
+        "samples": info["samples"],
+    }
+
+
+def _read_wav_pcm(audio_path, probe):
+    """Zero-copy blocks of a WAV payload (header already parsed by probe_chapter)"""
+    params = {"channels": probe["channels"], "sample_width": probe["sample_width"], "rate": probe["rate"]}
+    with PcmMap(audio_path, params, probe["data_offset"], probe["data_length"]) as pcm:
+        yield from pcm.iter_blocks([(0, pcm.length)], BLOCK_SIZE)
+
+
+def _decode_pcm(audio_path, channels, rate):
+    """Decode any audio file to s16le PCM through an ffmpeg pipe"""
+    cmd = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", str(audio_path),
+        "-f", "s16le",
+        "-ac", str(channels),
+        "-ar", str(rate),
+        "pipe:1",
+    ]
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+    stopped_early = False
+    try:
+        while True:
+            block = proc.stdout.read(BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+    except GeneratorExit:
+        stopped_early = True  # exact length reached before EOF
+        raise
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        stderr.seek(0)
+        message = stderr.read().decode(errors="replace").strip()
+        stderr.close()
+    if proc.returncode != 0 and not stopped_early:
+        raise RuntimeError(f"ffmpeg decode error ({audio_path}): {message}")
+
+
+def _exact_length(blocks, length):
+    """Trim / zero-pad a PCM stream to exactly `length` bytes"""
+    remaining = length
+    try:
+        for block in blocks:
+            if remaining <= 0:
+                break
+            if len(block) > remaining:
+                block = block[:remaining]
+            remaining -= len(block)
+            yield block
+    finally:
+        blocks.close()  # stops the decoder if the file is longer
+    if remaining > 0:
+        yield bytes(remaining)
+
+
+def chapter_pcm(chapter, channels, rate):
+    """
+    PCM of one chapter in the book's format, exactly chapter["samples"] long
+
+    WAV payloads already in the book format are read directly; everything
+    else is decoded (and resampled if needed) by ffmpeg.
+    """
+    probe = chapter["probe"]
+    if probe["kind"] == "wav" and (probe["rate"], probe["channels"], probe["sample_width"]) == (
+        rate,
+        channels,
+        2,
+    ):
+        blocks = _read_wav_pcm(chapter["audio"], probe)
+    else:
+        blocks = _decode_pcm(chapter["audio"], channels, rate)
+    return _exact_length(blocks, chapter["samples"] * channels * 2)
+
+
+def _escape_metadata(value):
+    return re.sub(r"([=;#\\\n])", r"\\\1", str(value))
+
+
+def _vorbis_timestamp(samples, rate):
+    ms = (samples * 1000 + rate // 2) // rate  # nearest millisecond
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    return f"{hours:02d}:{minutes:02d}:{ms // 1000:02d}.{ms % 1000:03d}"
+
+
+def build_ffmetadata(chapters, rate, title=None, author=None, chapter_style="ffmetadata"):
+    """
+    ffmetadata text with the book tags and chapter markers
+
+    Args:
+        chapters: Dicts with title, samples (in the book's sample rate)
+        rate: Book sample rate
+        title: Book title
+        author: Author / artist
+        chapter_style: "ffmetadata" (one [CHAPTER] per chapter, timebase =
+                       1 sample) or "vorbis" (CHAPTERxxx / CHAPTERxxxNAME tags)
+    """
+    lines = [";FFMETADATA1"]
+    if title:
+        lines.append(f"title={_escape_metadata(title)}")
+        lines.append(f"album={_escape_metadata(title)}")
+    if author:
+        lines.append(f"artist={_escape_metadata(author)}")
+    lines.append("genre=Audiobook")
+
+    if chapter_style == "vorbis":
+        start = 0
+        for index, chapter in enumerate(chapters):
+            lines.append(f"CHAPTER{index:03d}={_vorbis_timestamp(start, rate)}")
+            lines.append(f"CHAPTER{index:03d}NAME={_escape_metadata(chapter['title'])}")
+            start += chapter["samples"]
+        return "\n".join(lines) + "\n"
+
+    start = 0
+    for chapter in chapters:
+        end = start + chapter["samples"]
+        lines.extend(
+            [
+                "",
+                "[CHAPTER]",
+                f"TIMEBASE=1/{rate}",
+                f"START={start}",
+                f"END={end}",
+                f"title={_escape_metadata(chapter['title'])}",
+            ]
+        )
+        start = end
+
+    return "\n".join(lines) + "\n"
+
+
+def package_book(chapters, output_path, fmt="m4b", bitrate=None, title=None, author=None):
+    """
+    Encode every chapter into one M4B / Opus file with chapter markers
+
+    Args:
+        chapters: From collect_book() (every chapter must have audio)
+        output_path: Output file
+        fmt: "m4b" or "opus"
+        bitrate: Encoder bitrate (default: per format)
+        title: Book title (metadata)
+        author: Author (metadata)
+
+    Returns:
+        Dict with output, format, chapters, duration, rate, channels,
+        bytes, seconds, realtime (x)
+
+    Raises:
+        RuntimeError: If ffmpeg is missing or fails
+        ValueError: If a chapter has no audio or unreadable audio
+    """
+    if not ffmpeg_available():
+        raise RuntimeError("ffmpeg not found on PATH (required for M4B / Opus output)")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    missing = [c["title"] for c in chapters if c["audio"] is None]
+    if missing:
+        raise ValueError(f"Chapters without audio: {', '.join(missing)}")
+    if not chapters:
+        raise ValueError("No chapters to package")
+
+    spec = FORMATS[fmt]
+    output_path = Path(output_path)
+    started = time.perf_counter()
+
+    # Durations up front → chapter markers known before the first byte is encoded
+    for chapter in chapters:
+        chapter["probe"] = probe_chapter(chapter["audio"])
+    rate = chapters[0]["probe"]["rate"]
+    channels = max(c["probe"]["channels"] for c in chapters)
+    for chapter in chapters:
+        probe = chapter["probe"]
+        chapter["samples"] = round(probe["samples"] * rate / probe["rate"])
+
+    metadata = build_ffmetadata(chapters, rate, title, author, spec["chapters"])
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    meta_fd, meta_path = tempfile.mkstemp(suffix=".ffmeta", dir=output_path.parent)
+    with os.fdopen(meta_fd, "w", encoding="utf-8") as f:
+        f.write(metadata)
+
+    part_path = output_path.with_name(output_path.name + ".part")
+    encoder = FfmpegPipeEncoder(
+        part_path,
+        [
+            *spec["codec"],
+            "-b:a", bitrate or spec["bitrate"],
+            "-f", spec["muxer"],
+        ],
+        channels,
+        rate,
+        extra_args=[
+            "-i", meta_path,
+            "-map", "0:a",
+            "-map_metadata", "1",
+            "-map_chapters", "1" if spec["chapters"] == "ffmetadata" else "-1",
+        ],
+    )
+
+    try:
+        for index, chapter in enumerate(chapters, 1):
+            print(
+                f"🎬 [{index}/{len(chapters)}] {chapter['title']} "
+                f"({chapter['samples'] / rate / 60:.1f} min)"
+            )
+            for block in chapter_pcm(chapter, channels, rate):
+                encoder.write(block)
+        encoder.close()
+        os.replace(part_path, output_path)
+    except Exception:
+        if not encoder.closed:
+            try:
+                encoder.close()
+            except Exception:
+                pass
+        part_path.unlink(missing_ok=True)
+        raise
+    finally:
+        os.unlink(meta_path)
+
+    seconds = time.perf_counter() - started
+    duration = sum(c["samples"] for c in chapters) / rate
+    return {
+        "output": str(output_path),
+        "format": fmt,
+        "chapters": len(chapters),
+        "duration": duration,
+        "rate": rate,
+        "channels": channels,
+        "bytes": output_path.stat().st_size,
+        "seconds": seconds,
+        "realtime": duration / seconds if seconds > 0 else 0.0,
+    }
+
+
+def print_package_stats(stats):
+    """Print a packaging summary"""
+    hours, rest = divmod(int(stats["duration"]), 3600)
+    print(f"\n{'='*60}")
+    print(f"📚 Book packaged: {stats['output']}")
+    print(f"{'='*60}")
+    print(f"Format: {stats['format'].upper()} ({stats['rate']} Hz, {stats['channels']} ch)")
+    print(f"Chapters: {stats['chapters']}")
+    print(f"Duration: {hours}h {rest // 60:02d}m {rest % 60:02d}s")
+    print(f"Size: {stats['bytes'] / 1024 / 1024:.1f}MB")
+    print(f"Encode: {stats['seconds']:.1f}s ({stats['realtime']:.0f}x realtime)")
+    print(f"{'='*60}\n")
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Package a finished book into one M4B / Opus file with chapter markers"
+    )
+    parser.add_argument("paths", nargs="+", help="Book directories, markdown chapters or chapter audio")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="m4b", help="Output format (default: m4b)")
+    parser.add_argument("-o", "--output", default=None, help="Output file (default: <book dir>/<name>.<format>)")
+    parser.add_argument("--bitrate", default=None, help="Bitrate (default: 64k for m4b, 32k for opus)")
+    parser.add_argument("--title", default=None, help="Book title (default: book directory name)")
+    parser.add_argument("--author", default=None, help="Author")
+    parser.add_argument(
+        "--skip-missing",
+        action="store_true",
+        help="Package the chapters that have audio instead of failing",
+    )
+
+    args = parser.parse_args()
+
+    chapters = collect_book(args.paths)
+    if not chapters:
+        print("❌ Không tìm thấy chapter nào")
+        sys.exit(1)
+
+    missing = [c for c in chapters if c["audio"] is None]
+    if missing:
+        print(f"⚠️  {len(missing)} chapters have no audio yet:")
+        for chapter in missing:
+            print(f"   • {chapter['source']}")
+        if not args.skip_missing:
+            print("❌ Generate them first, or pass --skip-missing")
+            sys.exit(1)
+        chapters = [c for c in chapters if c["audio"] is not None]
+
+    first = Path(args.paths[0]).resolve()
+    book_dir = first if first.is_dir() else first.parent
+    title = args.title or book_dir.name
+    output = Path(args.output) if args.output else book_dir / (book_dir.name + FORMATS[args.format]["suffix"])
+
+    print(f"📚 Packaging {len(chapters)} chapters → {output}")
+    try:
+        stats = package_book(chapters, output, args.format, args.bitrate, title, args.author)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print_package_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,606 @@
+"""
+book_planner.py - Quota-aware Book Planner & Multi-day Scheduler
+
+Features:
+- Forecast requests needed for a set of chapters (clean + chunk, no network)
+- Subtract chunks already finished (checkpoint) and chapters already encoded
+- Compare against requests available: per-key daily limit minus persisted
+  usage (api_usage.json), minus keys exhausted in key_health.json
+- Request overhead learned from key health history (soft-fails, overloads)
+- Spread work across quota windows (today → after each daily reset)
+- Unattended mode: run the plan, sleep until quota reset, resume
+  (chapters are encoded in the background while the next one synthesizes)
+- Dry-run estimate (audiobook_generator --dry-run): requests per chapter,
+  audio minutes, ETA from historical latency; chapters are cleaned and
+  chunked in parallel processes
+
+Usage:
+    python -m src.book_planner path/to/book/            # Print plan
+    python -m src.book_planner ch1.md ch2.md --run      # Plan + execute
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+from .audio_check import DEFAULT_SECONDS_PER_TOKEN, AudioChecker
+from .audiobook_generator import (
+    MAX_TOKENS_PER_CHUNK,
+    clean_markdown,
+    get_api_key_manager,
+    process_chapter_concurrent,
+)
+from .checkpoint import load_checkpoint, resolve_source_hash
+from .encode_pipeline import EncodePipeline, process_context
+from .key_health import KeyHealthStore, next_quota_reset
+from .key_rotation_manager import KeyRotationManager
+from .text_chunker import count_tokens, split_into_chunks
+
+# Safety margin on top of the learned overhead (requests are the scarce resource)
+DEFAULT_MARGIN = 0.05
+
+
+# ============================================================
+# Forecast
+# ============================================================
+
+
+def collect_chapters(paths):
+    """
+    Expand files / directories into a sorted list of markdown chapters
+
+    Directories are scanned one level deep (same as run_batch.sh).
+    """
+    chapters = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            chapters.extend(sorted(path.glob("*.md")))
+        elif path.is_file():
+            chapters.append(path)
+        else:
+            print(f"⚠️  Bỏ qua: '{path}' không tồn tại")
+    return chapters
+
+
+def chunk_chapter(file_path, max_tokens=MAX_TOKENS_PER_CHUNK):
+    """
+    Clean and chunk a chapter exactly like process_chapter_concurrent
+
+    Returns:
+        List of text chunks
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        clean_text = clean_markdown(f.read())
+
+    if count_tokens(clean_text) > max_tokens:
+        return split_into_chunks(clean_text, max_tokens=max_tokens)
+    return [clean_text]
+
+
+def chapter_output(file_path):
+    """Return the finished audio file of a chapter, or None if not done yet"""
+    file_path = Path(file_path)
+    for suffix in (".mp3", ".wav"):
+        output_path = file_path.parent / "TTS" / (file_path.stem + suffix)
+        if output_path.exists():
+            return output_path
+    return None
+
+
+def forecast_chapter(file_path, max_tokens=MAX_TOKENS_PER_CHUNK):
+    """
+    Forecast remaining work for one chapter
+
+    Returns:
+        Dict with file, total_chunks, done_chunks, remaining_chunks, tokens, status
+    """
+    file_path = Path(file_path)
+    output_dir = file_path.parent / "TTS"
+
+    if chapter_output(file_path) is not None:
+        return {
+            "file": str(file_path),
+            "total_chunks": 0,
+            "done_chunks": 0,
+            "remaining_chunks": 0,
+            "tokens": 0,
+            "status": "done",
+        }
+
+    chunks = chunk_chapter(file_path, max_tokens)
+    total_chunks = len(chunks)
+
+    # Chunks finished in an earlier (interrupted) run
+    done_chunks = 0
+    checkpoint = load_checkpoint(output_dir, file_path)
+    if checkpoint and resolve_source_hash(file_path, checkpoint) == checkpoint.get("file_hash"):
+        done_chunks = len([c for c in checkpoint.get("completed_chunks", []) if c < total_chunks])
+
+    return {
+        "file": str(file_path),
+        "total_chunks": total_chunks,
+        "done_chunks": done_chunks,
+        "remaining_chunks": total_chunks - done_chunks,
+        "tokens": sum(count_tokens(c) for c in chunks),
+        "status": "partial" if done_chunks else "pending",
+    }
+
+
+def forecast_chapters(chapters, max_tokens=MAX_TOKENS_PER_CHUNK, workers=None):
+    """
+    Forecast many chapters, cleaning + chunking them in parallel processes
+
+    Tokenizing is CPU-bound (GIL) → one process per chapter, up to the
+    CPU count; falls back to sequential if a pool cannot be started.
+
+    Args:
+        chapters: List of chapter paths
+        max_tokens: Chunk size used for forecasting
+        workers: Processes (default: min(chapters, CPUs), 1 = sequential)
+
+    Returns:
+        List of forecast_chapter results (same order as chapters)
+    """
+    workers = workers or min(len(chapters), os.cpu_count() or 1)
+    if workers <= 1 or len(chapters) < 2:
+        return [forecast_chapter(path, max_tokens) for path in chapters]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as executor:
+            return list(executor.map(forecast_chapter, chapters, [max_tokens] * len(chapters)))
+    except (OSError, BrokenProcessPool) as e:
+        print(f"⚠️  Parallel forecast unavailable ({e}), chunking sequentially")
+        return [forecast_chapter(path, max_tokens) for path in chapters]
+
+
+def available_requests(key_manager, health_store, requests_per_key=None):
+    """
+    Requests left in the current quota window and per full window
+
+    Args:
+        key_manager: APIKeyManager (persisted per-key usage for today)
+        health_store: KeyHealthStore (keys exhausted until reset)
+        requests_per_key: Daily limit per key (default: threshold + 1)
+
+    Returns:
+        Tuple (remaining_now: int, per_window: int)
+    """
+    limit = requests_per_key or key_manager.threshold + 1
+    remaining_now = 0
+
+    for key in key_manager.keys:
+        if health_store.is_exhausted(key):
+            continue
+        remaining_now += max(0, limit - key_manager.get_key_usage(key))
+
+    return remaining_now, limit * len(key_manager.keys)
+
+
+def build_plan(
+    chapters,
+    key_manager,
+    health_store,
+    requests_per_key=None,
+    margin=DEFAULT_MARGIN,
+    workers=7,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    forecasts=None,
+):
+    """
+    Spread chapters across quota windows
+
+    A chapter that does not fit the rest of a window is started there and
+    resumed after the reset (checkpoint/resume makes the split free).
+
+    Args:
+        chapters: List of chapter paths (processing order)
+        key_manager: APIKeyManager
+        health_store: KeyHealthStore
+        requests_per_key: Daily limit per key (default: threshold + 1)
+        margin: Extra fraction of requests reserved for surprises
+        workers: Concurrent workers (for duration estimate)
+        max_tokens: Chunk size used for forecasting
+        forecasts: Precomputed forecast_chapter results (optional)
+
+    Returns:
+        Plan dict (chapters, windows, totals)
+    """
+    if forecasts is None:
+        forecasts = forecast_chapters(chapters, max_tokens)
+
+    overhead, samples = health_store.request_overhead(key_manager.keys)
+    overhead *= 1 + margin
+    latency = health_store.mean_latency(key_manager.keys)
+    remaining_now, per_window = available_requests(key_manager, health_store, requests_per_key)
+
+    windows = []
+    reset_at = next_quota_reset()
+
+    def new_window(capacity, start):
+        windows.append(
+            {
+                "index": len(windows),
+                "start": start,
+                "capacity": capacity,
+                "planned_requests": 0,
+                "items": [],
+            }
+        )
+        return windows[-1]
+
+    window = new_window(remaining_now, time.time())
+
+    for forecast in forecasts:
+        chunks_left = forecast["remaining_chunks"]
+        if chunks_left == 0:
+            continue
+
+        while chunks_left > 0:
+            free = window["capacity"] - window["planned_requests"]
+            # Chunks that fit in what is left of this window
+            fit = int(free / overhead) if free > 0 else 0
+
+            if fit == 0:
+                if per_window < overhead:
+                    raise ValueError("Daily quota too small to schedule a single chunk")
+                start = reset_at + (len(windows) - 1) * 86400
+                window = new_window(per_window, start)
+                continue
+
+            take = min(fit, chunks_left)
+            requests = math.ceil(take * overhead)
+            window["items"].append(
+                {
+                    "file": forecast["file"],
+                    "chunks": take,
+                    "requests": requests,
+                    "continues": take < chunks_left,
+                }
+            )
+            window["planned_requests"] += requests
+            chunks_left -= take
+
+    total_chunks = sum(f["remaining_chunks"] for f in forecasts)
+    total_requests = sum(w["planned_requests"] for w in windows)
+
+    for w in windows:
+        w["estimated_seconds"] = math.ceil(w["planned_requests"] / max(1, workers)) * latency
+
+    return {
+        "created": datetime.now().isoformat(),
+        "chapters": forecasts,
+        "windows": [w for w in windows if w["items"]],
+        "overhead": overhead,
+        "overhead_samples": samples,
+        "latency": latency,
+        "remaining_now": remaining_now,
+        "per_window": per_window,
+        "total_chunks": total_chunks,
+        "total_requests": total_requests,
+        "fits_today": total_requests <= remaining_now,
+    }
+
+
+def print_plan(plan):
+    """Pretty-print a plan"""
+    print(f"\n{'='*60}")
+    print("📋 Book Plan")
+    print(f"{'='*60}")
+
+    pending = [c for c in plan["chapters"] if c["status"] != "done"]
+    done = len(plan["chapters"]) - len(pending)
+    print(f"📚 Chapters: {len(plan['chapters'])} ({done} already done)")
+    print(f"📦 Chunks remaining: {plan['total_chunks']:,}")
+    print(
+        f"📈 Request overhead: ×{plan['overhead']:.2f}"
+        f" ({plan['overhead_samples']} requests of history)"
+    )
+    print(f"🔢 Requests needed: {plan['total_requests']:,}")
+    print(f"🔑 Available now: {plan['remaining_now']:,} | Per day: {plan['per_window']:,}")
+
+    if plan["fits_today"]:
+        print("✅ Book fits in today's remaining quota")
+    else:
+        print(f"⏳ Needs {len(plan['windows'])} quota windows")
+
+    for w in plan["windows"]:
+        start = datetime.fromtimestamp(w["start"]).strftime("%Y-%m-%d %H:%M")
+        print(
+            f"\n🗓️  Window {w['index'] + 1} (from {start}): "
+            f"{w['planned_requests']}/{w['capacity']} requests, "
+            f"~{w['estimated_seconds'] / 60:.0f} min"
+        )
+        for item in w["items"]:
+            suffix = " → continues next window" if item["continues"] else ""
+            print(f"   • {Path(item['file']).name}: {item['chunks']} chunks ({item['requests']} req){suffix}")
+
+    print()
+
+
+def estimate_job(
+    chapters,
+    key_manager,
+    health_store,
+    voice="Kore",
+    workers=1,
+    requests_per_key=None,
+    audio_checker=None,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+):
+    """
+    Dry-run estimate of a job: no request is sent
+
+    Args:
+        chapters: List of chapter paths (processing order)
+        key_manager: APIKeyManager
+        health_store: KeyHealthStore (overhead + latency history)
+        voice: Voice name (speech rate for audio minutes)
+        workers: Concurrent workers the job will run with
+        requests_per_key: Daily limit per key (default: threshold + 1)
+        audio_checker: AudioChecker with learned seconds per token (optional)
+        max_tokens: Chunk size
+
+    Returns:
+        Plan dict (see build_plan) + per-chapter requests / audio_seconds,
+        audio_seconds, seconds_per_token, latency_source, workers,
+        eta_seconds, finish_at, forecast_seconds
+    """
+    started = time.perf_counter()
+    forecasts = forecast_chapters(chapters, max_tokens)
+    forecast_seconds = time.perf_counter() - started
+
+    plan = build_plan(
+        chapters, key_manager, health_store, requests_per_key=requests_per_key,
+        workers=workers, max_tokens=max_tokens, forecasts=forecasts,
+    )
+
+    seconds_per_token = (
+        audio_checker.seconds_per_token(voice) if audio_checker is not None else DEFAULT_SECONDS_PER_TOKEN
+    )
+    for forecast in forecasts:
+        forecast["requests"] = math.ceil(forecast["remaining_chunks"] * plan["overhead"])
+        forecast["audio_seconds"] = forecast["tokens"] * seconds_per_token
+
+    # Synthesis time only; quota windows after today start at the reset
+    eta = sum(w["estimated_seconds"] for w in plan["windows"])
+    finish_at = time.time() + eta
+    if plan["windows"] and not plan["fits_today"]:
+        last = plan["windows"][-1]
+        finish_at = max(last["start"], time.time()) + last["estimated_seconds"]
+
+    plan.update(
+        {
+            "audio_seconds": sum(f["audio_seconds"] for f in forecasts),
+            "seconds_per_token": seconds_per_token,
+            "latency_source": "history" if health_store.mean_latency(key_manager.keys, default=None) else "default",
+            "workers": workers,
+            "eta_seconds": eta,
+            "finish_at": finish_at,
+            "forecast_seconds": forecast_seconds,
+        }
+    )
+    return plan
+
+
+def print_estimate(plan):
+    """Pretty-print a dry-run estimate"""
+    print(f"\n{'='*60}")
+    print("🧮 Dry Run Estimate (no requests sent)")
+    print(f"{'='*60}")
+    print(f"{'Chapter':<28}{'Chunks':>7}{'Done':>6}{'Req':>6}{'Tokens':>9}{'Audio':>9}")
+    for c in plan["chapters"]:
+        name = Path(c["file"]).name
+        name = name if len(name) <= 27 else name[:24] + "..."
+        if c["status"] == "done":
+            print(f"{name:<28}{'✅ already encoded':>37}")
+            continue
+        print(
+            f"{name:<28}{c['total_chunks']:>7}{c['done_chunks']:>6}{c['requests']:>6}"
+            f"{c['tokens']:>9,}{c['audio_seconds'] / 60:>8.1f}m"
+        )
+
+    print(f"\n📦 Chunks remaining: {plan['total_chunks']:,} (chunked in {plan['forecast_seconds']:.1f}s)")
+    print(
+        f"🔢 Requests needed: {plan['total_requests']:,} "
+        f"(overhead ×{plan['overhead']:.2f}, {plan['overhead_samples']} requests of history)"
+    )
+    print(f"🔑 Available now: {plan['remaining_now']:,} | Per day: {plan['per_window']:,}")
+    if plan["fits_today"]:
+        print("✅ Fits in today's remaining quota")
+    else:
+        print(f"⏳ Needs {len(plan['windows'])} quota windows (run with python -m src.book_planner --run)")
+    print(
+        f"🔊 Audio: ~{plan['audio_seconds'] / 60:.0f} min "
+        f"({plan['seconds_per_token'] * 1000:.0f} ms/token)"
+    )
+    finish = datetime.fromtimestamp(plan["finish_at"]).strftime("%Y-%m-%d %H:%M")
+    print(
+        f"⏱️  ETA: ~{plan['eta_seconds'] / 60:.1f} min of synthesis at {plan['workers']} workers "
+        f"({plan['latency']:.1f}s/request, {plan['latency_source']}) → done ~{finish}"
+    )
+    print()
+
+
+# ============================================================
+# Unattended execution
+# ============================================================
+
+
+def _sleep_until(timestamp):
+    """Sleep until timestamp, printing a heartbeat every 30 minutes"""
+    while True:
+        remaining = timestamp - time.time()
+        if remaining <= 0:
+            return
+        wake = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+        print(f"😴 Quota exhausted, sleeping until {wake} ({remaining / 3600:.1f}h left)")
+        time.sleep(min(remaining, 1800))
+
+
+def run_plan(
+    chapters,
+    voice="Kore",
+    workers=7,
+    health_store=None,
+    max_windows=7,
+    max_attempts=3,
+    encode_workers=None,
+    audio_checker=None,
+):
+    """
+    Process chapters unattended, waiting for quota resets as needed
+
+    Args:
+        chapters: List of chapter paths (processing order)
+        voice: Voice name
+        workers: Concurrent workers
+        health_store: KeyHealthStore (created if None)
+        max_windows: Give up after this many quota resets
+        max_attempts: Non-quota failures tolerated per chapter
+        encode_workers: Background encoder processes (default: auto)
+        audio_checker: AudioChecker for chunk audio validation (created if None)
+
+    Returns:
+        List of chapters that could not be completed
+    """
+    health_store = health_store or KeyHealthStore(path="data/key_health.json")
+    audio_checker = audio_checker or AudioChecker(path="data/audio_checks.json")
+    api_key_manager = get_api_key_manager()
+    windows_used = 1
+    failed = []
+
+    def new_rotation_manager():
+        return KeyRotationManager(api_keys=api_key_manager.keys, health_store=health_store)
+
+    rotation_manager = new_rotation_manager()
+    encode_pipeline = EncodePipeline(max_workers=encode_workers)
+
+    try:
+        for position, chapter in enumerate(chapters):
+            attempts = 0
+
+            while True:
+                if chapter_output(chapter) is not None:
+                    break
+
+                # Synthesis only; encoding overlaps with the next chapter
+                ok = process_chapter_concurrent(
+                    None,
+                    chapter,
+                    voice=voice,
+                    max_workers=workers,
+                    resume=True,
+                    rotation_manager=rotation_manager,
+                    encode_pipeline=encode_pipeline,
+                    audio_checker=audio_checker,
+                )
+                health_store.save()
+                audio_checker.save()
+                if ok:
+                    break
+
+                stats = rotation_manager.get_stats()
+                if stats["available"] + stats["cooldown"] == 0:
+                    # Every key exhausted → wait for the next window
+                    if windows_used >= max_windows:
+                        print(f"❌ Reached max quota windows ({max_windows}), stopping")
+                        failed += [str(c) for c in chapters[position:]]
+                        return failed
+
+                    _sleep_until(next_quota_reset() + 60)
+                    windows_used += 1
+
+                    # Fresh window: provider quota reset → reset usage, rebuild key queue
+                    api_key_manager.reset_usage()
+                    rotation_manager = new_rotation_manager()
+                    continue
+
+                attempts += 1
+                if attempts >= max_attempts:
+                    print(f"❌ Giving up on {Path(chapter).name} after {attempts} attempts")
+                    failed.append(str(chapter))
+                    break
+    finally:
+        print(f"\n⏳ Waiting for background encoding to finish...")
+        encode_pipeline.close()
+        encode_pipeline.print_stats()
+        audio_checker.print_stats()
+
+        # Synthesized but not encoded → checkpoint kept, next --run finishes it
+        failed += [str(c) for c in chapters if Path(c).name in encode_pipeline.failed]
+
+    return failed
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description="Plan (and optionally run) a book against remaining API quota"
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files or book directories")
+    parser.add_argument("--voice", default="Kore", help="Voice name (default: Kore)")
+    parser.add_argument("--workers", type=int, default=7, help="Concurrent workers (default: 7)")
+    parser.add_argument(
+        "--requests-per-key",
+        type=int,
+        default=None,
+        help="Daily request limit per key (default: APIKeyManager threshold + 1)",
+    )
+    parser.add_argument(
+        "--run",
+        action="store_true",
+        help="Execute the plan unattended, sleeping until quota reset when needed",
+    )
+    parser.add_argument(
+        "--max-days", type=int, default=7, help="Max quota windows to run (default: 7)"
+    )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=None,
+        help="Background encoder processes (default: half the CPUs, max 4)",
+    )
+
+    args = parser.parse_args()
+
+    chapters = collect_chapters(args.paths)
+    if not chapters:
+        print("❌ Không tìm thấy file .md nào")
+        sys.exit(1)
+
+    health_store = KeyHealthStore(path="data/key_health.json")
+    plan = build_plan(
+        chapters,
+        get_api_key_manager(),
+        health_store,
+        requests_per_key=args.requests_per_key,
+        workers=args.workers,
+    )
+    print_plan(plan)
+
+    if args.run:
+        failed = run_plan(
+            chapters,
+            voice=args.voice,
+            workers=args.workers,
+            health_store=health_store,
+            max_windows=args.max_days,
+            encode_workers=args.encode_workers,
+        )
+        if failed:
+            print(f"\n❌ {len(failed)} chapters not completed:")
+            for path in failed:
+                print(f"   • {path}")
+            sys.exit(1)
+        print("\n🎉 Book complete!")
+
+
+if __name__ == "__main__":
+    main()
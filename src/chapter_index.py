@@ -0,0 +1,405 @@
+"""
+chapter_index.py - Chapter Timing Index, Cue Sheet & In-place Chunk Replacement
+
+Features:
+- Timing index written next to every finished chapter ({stem}.index.json):
+  chunk ID, sample offset, duration, source character range (cleaned
+  text), and the chunk's byte range in the output file when it has one
+- Optional CUE sheet ({stem}.cue): one track per chunk
+- Source manifest in the index: stat fingerprint + SHA256 of the markdown
+  and a text hash per chunk → watch mode skips finished chapters with one
+  stat and knows which chunks an edit touched
+- replace_chunk(): splice new audio for one chunk into the finished file
+  - WAV (unprocessed): head / tail copied in the kernel, header patched
+  - MP3 joined from per-chunk frames (--chunk-mp3): frames re-joined
+    around the new chunk's frames, Xing/LAME tag rebuilt
+  No other chunk is re-synthesized, re-assembled from the store or
+  re-encoded; later chunks' offsets are shifted in the index.
+
+Layouts (how the chapter was built, decides what replace_chunk can do):
+    pcm      - WAV, chunks back to back (replaceable)
+    frames   - MP3 joined from per-chunk frames (replaceable)
+    stream   - MP3 from one continuous encode (index only)
+    mastered - --normalize output, trimmed + gain (index only)
+
+Usage:
+    python -m src.chapter_index TTS/ch1.index.json          # Show index
+    python -m src.chapter_index TTS/ch1.index.json --cue    # Write CUE sheet
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .audio_io import WAV_HEADER_SIZE, PcmMap, build_wav_header, copy_range, wav_data_range
+
+INDEX_VERSION = 1
+
+REPLACEABLE_LAYOUTS = ("pcm", "frames")
+
+# CUE sheets address time in CD frames (75 per second), max 99 tracks
+CUE_FRAMES_PER_SECOND = 75
+CUE_MAX_TRACKS = 99
+
+
+def mp3_samples_per_frame(rate):
+    """Layer III frame size: 1152 samples for MPEG-1 rates, 576 below 32 kHz"""
+    return 1152 if rate >= 32000 else 576
+
+
+def get_index_path(output_dir, file_path):
+    """Get path of a chapter's timing index"""
+    return Path(output_dir) / f"{Path(file_path).stem}.index.json"
+
+
+def chunk_text_hash(text):
+    """Short SHA256 of a chunk's text (which chunks did an edit touch?)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def source_manifest(fingerprint, file_hash, chunks):
+    """
+    Source identity recorded in the timing index
+
+    Args:
+        fingerprint: checkpoint.source_fingerprint() of the markdown
+        file_hash: SHA256 of the markdown
+        chunks: Text chunks the chapter was synthesized from
+
+    Returns:
+        Dict with fingerprint, hash, chunk_hashes (picklable → encode workers)
+    """
+    return {
+        "fingerprint": fingerprint,
+        "hash": file_hash,
+        "chunk_hashes": [chunk_text_hash(chunk) for chunk in chunks],
+    }
+
+
+def chunk_char_ranges(clean_text, chunks, probe=64):
+    """
+    Character range of every chunk in the cleaned chapter text
+
+    Chunks are re-joined paragraphs / sentences / words, so each one is
+    located by its first and last `probe` characters, searching forward.
+
+    Returns:
+        List of [start, end] (end exclusive)
+    """
+    ranges = []
+    cursor = 0
+
+    for chunk in chunks:
+        head = chunk[:probe]
+        tail = chunk[-probe:]
+        start = clean_text.find(head, cursor)
+        if start < 0:
+            start = cursor  # not found verbatim (normalized whitespace)
+        end = clean_text.find(tail, start)
+        end = end + len(tail) if end >= 0 else min(len(clean_text), start + len(chunk))
+        ranges.append([start, end])
+        cursor = end
+
+    return ranges
+
+
+def layout_chunks(samples, chunk_ranges=None, starts=None, byte_ranges=None):
+    """
+    Per-chunk index entries
+
+    Args:
+        samples: Frames of audio per chunk (playback order = chunk order)
+        chunk_ranges: Source character range per chunk
+        starts: Start frame per chunk in the output (default: back to back)
+        byte_ranges: (byte_offset, byte_length[, mp3 frames]) per chunk
+
+    Returns:
+        List of dicts for build_index
+    """
+    chunks = []
+    position = 0
+    for chunk_id, count in enumerate(samples):
+        entry = {
+            "chunk": chunk_id,
+            "offset": starts[chunk_id] if starts is not None else position,
+            "samples": count,
+            "chars": chunk_ranges[chunk_id] if chunk_ranges else None,
+        }
+        if byte_ranges is not None:
+            entry["byte_offset"], entry["byte_length"] = byte_ranges[chunk_id][:2]
+            if len(byte_ranges[chunk_id]) > 2:
+                entry["frames"] = byte_ranges[chunk_id][2]
+        chunks.append(entry)
+        position += count
+    return chunks
+
+
+def build_index(audio_path, layout, params, chunks, source=None, extra=None):
+    """
+    Assemble the index dict
+
+    Args:
+        audio_path: Chapter output file
+        layout: pcm / frames / stream / mastered
+        params: Dict with channels, sample_width, rate
+        chunks: List of dicts with chunk, offset (frames), samples, and
+                optionally chars, byte_offset, byte_length, frames
+        source: Source markdown path
+        extra: Additional top-level fields
+    """
+    rate = params["rate"]
+    for entry in chunks:
+        entry["start"] = round(entry["offset"] / rate, 3)
+        entry["duration"] = round(entry["samples"] / rate, 3)
+
+    index = {
+        "version": INDEX_VERSION,
+        "audio": Path(audio_path).name,
+        "format": Path(audio_path).suffix.lstrip(".").lower(),
+        "layout": layout,
+        "source": str(source) if source is not None else None,
+        **{k: params[k] for k in ("channels", "sample_width", "rate")},
+        "chunks": chunks,
+    }
+    index.update(extra or {})
+    return index
+
+
+def write_index(index_path, index):
+    """Atomic write (tmp + rename)"""
+    index_path = Path(index_path)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+
+def load_index(index_path):
+    """
+    Load a timing index
+
+    Raises:
+        ValueError: If the file is not a timing index this version understands
+    """
+    with open(index_path, "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported timing index version: {index.get('version')}")
+    return index
+
+
+def _cue_time(seconds):
+    frames = int(round(seconds * CUE_FRAMES_PER_SECOND))
+    minutes, frames = divmod(frames, 60 * CUE_FRAMES_PER_SECOND)
+    secs, frames = divmod(frames, CUE_FRAMES_PER_SECOND)
+    return f"{minutes:02d}:{secs:02d}:{frames:02d}"
+
+
+def write_cue(index, cue_path, title=None):
+    """
+    Write a CUE sheet with one track per chunk
+
+    Returns:
+        Number of tracks written (chunks past track 99 are merged into it)
+    """
+    file_type = "WAVE" if index["format"] == "wav" else "MP3"
+    title = title or Path(index["audio"]).stem
+    lines = [f'TITLE "{title}"', f'FILE "{index["audio"]}" {file_type}']
+
+    chunks = index["chunks"][:CUE_MAX_TRACKS]
+    for track, entry in enumerate(chunks, 1):
+        lines.extend(
+            [
+                f"  TRACK {track:02d} AUDIO",
+                f'    TITLE "{title} - chunk {entry["chunk"] + 1}"',
+                f"    INDEX 01 {_cue_time(entry['start'])}",
+            ]
+        )
+
+    with open(cue_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return len(chunks)
+
+
+# ============================================================
+# In-place chunk replacement
+# ============================================================
+
+
+def _shift_following(index, position, delta_samples, delta_bytes):
+    rate = index["rate"]
+    for entry in index["chunks"][position + 1:]:
+        entry["offset"] += delta_samples
+        entry["start"] = round(entry["offset"] / rate, 3)
+        if entry.get("byte_offset") is not None:
+            entry["byte_offset"] += delta_bytes
+
+
+def _replace_pcm(audio_path, index, position, pcm_data):
+    entry = index["chunks"][position]
+    frame_size = index["channels"] * index["sample_width"]
+    pcm_data = memoryview(pcm_data)[: len(pcm_data) - len(pcm_data) % frame_size]
+
+    data_offset, data_length, _ = wav_data_range(audio_path)
+    if data_offset != WAV_HEADER_SIZE:
+        raise ValueError(f"{audio_path.name} does not have a canonical WAV header")
+
+    old_start = entry["byte_offset"]
+    old_end = old_start + entry["byte_length"]
+    file_end = data_offset + data_length
+    tmp_path = audio_path.with_name(audio_path.name + ".replace")
+
+    src_fd = os.open(audio_path, os.O_RDONLY)
+    dst_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # Head and tail never enter Python; only the new chunk is written
+        copy_range(src_fd, dst_fd, data_offset, data_offset, old_start - data_offset)
+        written = 0
+        while written < len(pcm_data):
+            written += os.pwrite(dst_fd, pcm_data[written:], old_start + written)
+        copy_range(src_fd, dst_fd, old_end, old_start + len(pcm_data), file_end - old_end)
+
+        new_data_length = data_length - entry["byte_length"] + len(pcm_data)
+        os.pwrite(
+            dst_fd,
+            build_wav_header(new_data_length, index["channels"], index["rate"], index["sample_width"]),
+            0,
+        )
+        os.fsync(dst_fd)
+    except Exception:
+        os.close(dst_fd)
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        os.close(src_fd)
+    os.close(dst_fd)
+    os.replace(tmp_path, audio_path)
+
+    samples = len(pcm_data) // frame_size
+    delta_bytes = len(pcm_data) - entry["byte_length"]
+    _shift_following(index, position, samples - entry["samples"], delta_bytes)
+    entry["samples"] = samples
+    entry["duration"] = round(samples / index["rate"], 3)
+    entry["byte_length"] = len(pcm_data)
+    return {"bytes_written": len(pcm_data), "delta_seconds": delta_bytes / frame_size / index["rate"]}
+
+
+def _replace_frames(audio_path, index, position, pcm_data):
+    from .encoder import LAME_ENCODER_DELAY, encode_chunk_mp3
+    from .mp3_frames import concat_mp3
+
+    params = {k: index[k] for k in ("channels", "sample_width", "rate")}
+    frame_size = params["channels"] * params["sample_width"]
+    new_frames = encode_chunk_mp3(pcm_data, params)
+    if new_frames is None:
+        raise RuntimeError("No MP3 encoder available (install ffmpeg or lameenc)")
+
+    chunks = index["chunks"]
+    new_samples = len(pcm_data) // frame_size
+    tmp_path = audio_path.with_name(audio_path.name + ".replace")
+
+    with PcmMap(audio_path, params) as mp3:
+        def parts():
+            for i, entry in enumerate(chunks):
+                if i == position:
+                    yield new_frames
+                else:
+                    yield bytes(mp3.view(entry["byte_offset"], entry["byte_length"]))
+
+        last_samples = new_samples if position == len(chunks) - 1 else chunks[-1]["samples"]
+        joined = concat_mp3(parts(), tmp_path, LAME_ENCODER_DELAY, last_samples)
+    os.replace(tmp_path, audio_path)
+
+    # Frame layout: chunk k starts after every earlier part's frames
+    samples_per_frame = mp3_samples_per_frame(params["rate"])
+    position_samples = 0
+    for entry, part in zip(chunks, joined["parts"]):
+        entry["offset"] = position_samples
+        entry["start"] = round(position_samples / params["rate"], 3)
+        entry["byte_offset"] = part["offset"]
+        entry["byte_length"] = part["length"]
+        entry["frames"] = part["frames"]
+        position_samples += part["frames"] * samples_per_frame
+    entry = chunks[position]
+    delta = new_samples - entry["samples"]
+    entry["samples"] = new_samples
+    entry["duration"] = round(new_samples / params["rate"], 3)
+    return {"bytes_written": joined["bytes"], "delta_seconds": delta / params["rate"]}
+
+
+def replace_chunk(index_path, chunk_id, pcm_data):
+    """
+    Replace one chunk's audio in a finished chapter and update its index
+
+    Args:
+        index_path: Timing index of the chapter
+        chunk_id: Chunk to replace (0-based)
+        pcm_data: New raw PCM for the chunk (index params)
+
+    Returns:
+        Dict with layout, bytes_written, delta_seconds
+
+    Raises:
+        ValueError: If the chapter layout does not allow in-place replacement
+        KeyError: If the chunk is not in the index
+    """
+    index_path = Path(index_path)
+    index = load_index(index_path)
+
+    if index["layout"] not in REPLACEABLE_LAYOUTS:
+        raise ValueError(
+            f"Chapter layout '{index['layout']}' cannot be patched in place "
+            "(build chapters with --chunk-mp3, or as WAV without --normalize)"
+        )
+
+    positions = {entry["chunk"]: i for i, entry in enumerate(index["chunks"])}
+    if chunk_id not in positions:
+        raise KeyError(f"Chunk {chunk_id + 1} is not in {index_path.name}")
+
+    audio_path = index_path.parent / index["audio"]
+    if index["layout"] == "pcm":
+        result = _replace_pcm(audio_path, index, positions[chunk_id], pcm_data)
+    else:
+        result = _replace_frames(audio_path, index, positions[chunk_id], pcm_data)
+
+    write_index(index_path, index)
+    return {"layout": index["layout"], **result}
+
+
+def print_index(index):
+    """Print the chunk table of an index"""
+    print(f"\n{'='*60}")
+    print(f"🗂️  {index['audio']} ({index['layout']}, {index['rate']} Hz)")
+    print(f"{'='*60}")
+    for entry in index["chunks"]:
+        chars = entry.get("chars")
+        char_text = f"chars {chars[0]:,}-{chars[1]:,}" if chars else ""
+        print(f"Chunk {entry['chunk'] + 1:3d}: {entry['start']:9.3f}s  {entry['duration']:7.2f}s  {char_text}")
+    print(f"{'='*60}\n")
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Show a chapter timing index / write its CUE sheet")
+    parser.add_argument("index", help="Chapter timing index ({stem}.index.json)")
+    parser.add_argument("--cue", action="store_true", help="Write {stem}.cue next to the audio")
+    args = parser.parse_args()
+
+    try:
+        index = load_index(args.index)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print_index(index)
+    if args.cue:
+        cue_path = Path(args.index).parent / (Path(index["audio"]).stem + ".cue")
+        tracks = write_cue(index, cue_path)
+        print(f"✅ Đã lưu: {cue_path} ({tracks} tracks)")
+
+
+if __name__ == "__main__":
+    main()
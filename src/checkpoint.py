@@ -0,0 +1,529 @@
+"""
+checkpoint.py - Checkpoint Persistence for Resume (Phase 8)
+
+Features:
+- Source file hashed once per run (not once per finished chunk)
+- Chunk completions recorded as O(1) appends to a journal file
+- Coalesced fsync + periodic snapshot compaction
+- Snapshots written with atomic rename (never a half-written JSON)
+- Resume replays snapshot + journal, tolerating a torn last line
+- Fast resume: trust (size, mtime, inode) fingerprint before re-hashing
+- Chunk discovery with one os.scandir pass + cheap WAV header checks
+
+Files per chapter (inside the TTS output directory):
+    .checkpoint_{stem}.json     # Snapshot (compacted state)
+    .checkpoint_{stem}.journal  # Append-only completions since last snapshot
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+CHECKPOINT_VERSION = "3.0"
+
+
+# ============================================================
+# Paths & Hashing
+# ============================================================
+
+
+def calculate_file_hash(file_path):
+    """Calculate SHA256 hash of file content to detect modifications"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def read_source(file_path):
+    """
+    Read a chapter once: its text and the SHA256 of exactly those bytes
+
+    The hash then always describes the text that was synthesized, even if
+    the file is edited while the run is reading it (calculate_file_hash
+    afterwards would describe the edited file).
+
+    Returns:
+        Tuple (text: str decoded as UTF-8 with universal newlines, sha256 hex)
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8").read()
+    return text, hashlib.sha256(data).hexdigest()
+
+
+def get_chunk_path(output_dir, file_stem, chunk_id):
+    """Get path for an individual chunk file"""
+    return output_dir / f".chunk_{chunk_id}_{file_stem}.wav"
+
+
+def get_checkpoint_path(output_dir, file_path):
+    """Get path for the checkpoint snapshot of a chapter"""
+    return Path(output_dir) / f".checkpoint_{Path(file_path).stem}.json"
+
+
+def get_journal_path(output_dir, file_path):
+    """Get path for the checkpoint journal of a chapter"""
+    return Path(output_dir) / f".checkpoint_{Path(file_path).stem}.journal"
+
+
+def source_fingerprint(file_path):
+    """
+    Cheap identity of the source file (1 stat syscall)
+
+    Returns:
+        Dict with size, mtime_ns, inode
+    """
+    st = os.stat(file_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+
+def resolve_source_hash(file_path, checkpoint=None, fingerprint=None):
+    """
+    Return the source SHA256, skipping the hash when the fingerprint matches
+
+    If the checkpoint was written for a file with the same size, mtime and
+    inode, its stored hash is trusted. Otherwise the file is hashed.
+    """
+    if fingerprint is None:
+        fingerprint = source_fingerprint(file_path)
+
+    if (
+        checkpoint
+        and checkpoint.get("file_hash")
+        and checkpoint.get("source_fingerprint") == fingerprint
+    ):
+        return checkpoint["file_hash"]
+
+    return calculate_file_hash(file_path)
+
+
+def _atomic_write_json(path, data):
+    """Write JSON to a temp file, fsync, then rename over the target"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# ============================================================
+# Snapshot API
+# ============================================================
+
+
+def save_checkpoint(
+    output_dir,
+    file_path,
+    total_chunks,
+    completed_chunks,
+    voice="Kore",
+    file_hash=None,
+    fingerprint=None,
+):
+    """
+    Save checkpoint snapshot (atomic rename)
+
+    Args:
+        output_dir: Output directory path
+        file_path: Source markdown file path
+        total_chunks: Total number of chunks
+        completed_chunks: List of completed chunk IDs
+        voice: Voice name used
+        file_hash: Precomputed source hash (computed here if None)
+        fingerprint: Source stat fingerprint (taken here if None)
+
+    Returns:
+        Path to checkpoint file
+    """
+    if file_hash is None:
+        file_hash = calculate_file_hash(file_path)
+    if fingerprint is None:
+        fingerprint = source_fingerprint(file_path)
+
+    checkpoint_data = {
+        "file": Path(file_path).name,
+        "file_path": str(Path(file_path).absolute()),
+        "file_hash": file_hash,
+        "source_fingerprint": fingerprint,
+        "total_chunks": total_chunks,
+        "completed_chunks": sorted(completed_chunks),
+        "timestamp": datetime.now().isoformat(),
+        "voice": voice,
+        "version": CHECKPOINT_VERSION,
+    }
+
+    checkpoint_file = get_checkpoint_path(output_dir, file_path)
+    _atomic_write_json(checkpoint_file, checkpoint_data)
+
+    return checkpoint_file
+
+
+def _replay_journal(journal_file, checkpoint):
+    """
+    Apply journal records on top of a snapshot dict (in place)
+
+    A torn trailing line (process killed mid-write) is ignored.
+    """
+    completed = set(checkpoint.get("completed_chunks") or [])
+
+    with open(journal_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Torn write at the tail
+
+            if record.get("type") == "header":
+                # Journal without snapshot (should not happen, but be robust)
+                for field in (
+                    "file",
+                    "file_path",
+                    "file_hash",
+                    "source_fingerprint",
+                    "total_chunks",
+                    "voice",
+                ):
+                    checkpoint.setdefault(field, record.get(field))
+            elif record.get("type") == "done":
+                completed.add(record["chunk"])
+
+    checkpoint["completed_chunks"] = sorted(completed)
+    return checkpoint
+
+
+def load_checkpoint(output_dir, file_path):
+    """
+    Load existing checkpoint if available (snapshot + journal replay)
+
+    Args:
+        output_dir: Output directory path
+        file_path: Source markdown file path
+
+    Returns:
+        Checkpoint data dict or None if not found
+    """
+    checkpoint_file = get_checkpoint_path(output_dir, file_path)
+    journal_file = get_journal_path(output_dir, file_path)
+
+    if not checkpoint_file.exists() and not journal_file.exists():
+        return None
+
+    try:
+        checkpoint = {}
+        if checkpoint_file.exists():
+            with open(checkpoint_file, "r") as f:
+                checkpoint = json.load(f)
+
+        if journal_file.exists():
+            checkpoint = _replay_journal(journal_file, checkpoint)
+
+        return checkpoint
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"⚠️  Warning: Failed to load checkpoint: {e}")
+        return None
+
+
+def _wav_header_ok(path, size):
+    """
+    Cheap WAV sanity check: read the header only (1 open + 1 pread)
+
+    Valid when the RIFF/WAVE magic is present and the declared data chunk
+    fits inside the file (a truncated write declares more than it has).
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+
+    try:
+        header = os.pread(fd, 512, 0)
+    finally:
+        os.close(fd)
+
+    if len(header) < 12 or header[0:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return False
+
+    # Walk sub-chunks until "data" (wave module writes it at offset 36)
+    pos = 12
+    while pos + 8 <= len(header):
+        chunk_tag, chunk_size = struct.unpack_from("<4sI", header, pos)
+        if chunk_tag == b"data":
+            return chunk_size > 0 and pos + 8 + chunk_size <= size
+        pos += 8 + chunk_size + (chunk_size & 1)
+
+    return False
+
+
+def scan_chunk_files(output_dir, file_stem, validate=True):
+    """
+    Discover chunk files of a chapter with a single os.scandir pass
+
+    Args:
+        output_dir: Output directory path
+        file_stem: Source file stem
+        validate: Check WAV headers (drops truncated / empty chunk files)
+
+    Returns:
+        Dict {chunk_id: file_size} of usable chunk files
+    """
+    pattern = re.compile(r"\.chunk_(\d+)_" + re.escape(file_stem) + r"\.wav$")
+    found = {}
+
+    try:
+        entries = os.scandir(output_dir)
+    except FileNotFoundError:
+        return found
+
+    with entries:
+        for entry in entries:
+            match = pattern.match(entry.name)
+            if not match:
+                continue
+
+            size = entry.stat().st_size
+            if size <= 44:
+                continue
+            if validate and not _wav_header_ok(entry.path, size):
+                continue
+
+            found[int(match.group(1))] = size
+
+    return found
+
+
+def verify_checkpoint(
+    checkpoint, file_path, output_dir, file_hash=None, chunk_files=None
+):
+    """
+    Verify checkpoint is valid and all claimed chunk files exist
+
+    Args:
+        checkpoint: Checkpoint data dict
+        file_path: Source markdown file path
+        output_dir: Output directory path
+        file_hash: Precomputed source hash (see resolve_source_hash)
+        chunk_files: Result of scan_chunk_files (scanned here if None)
+
+    Returns:
+        Tuple (is_valid: bool, valid_chunks: list, message: str)
+    """
+    if not checkpoint:
+        return False, [], "No checkpoint found"
+
+    # Check if source file still exists
+    if not Path(file_path).exists():
+        return False, [], "Source file no longer exists"
+
+    # Check if file hash matches (fingerprint fast path inside resolve)
+    current_hash = file_hash or resolve_source_hash(file_path, checkpoint)
+    if current_hash != checkpoint.get("file_hash"):
+        return False, [], "Source file has been modified since checkpoint"
+
+    # Check if completed_chunks list is valid
+    completed_chunks = checkpoint.get("completed_chunks")
+    if not isinstance(completed_chunks, list):
+        return False, [], "Invalid checkpoint format"
+
+    if chunk_files is None:
+        chunk_files = scan_chunk_files(output_dir, Path(file_path).stem)
+
+    total_chunks = checkpoint.get("total_chunks")
+    claimed = set(completed_chunks)
+    valid_chunks = sorted(
+        chunk_id
+        for chunk_id in chunk_files
+        if total_chunks is None or chunk_id < total_chunks
+    )
+    missing_chunks = claimed.difference(chunk_files)
+    # Chunk written but process killed before its journal record → adopt it
+    adopted_chunks = set(valid_chunks).difference(claimed)
+
+    if missing_chunks:
+        print(f"⚠️  Warning: {len(missing_chunks)} chunk files missing from checkpoint")
+    if adopted_chunks:
+        print(f"ℹ️  Adopted {len(adopted_chunks)} complete chunk files not yet in checkpoint")
+
+    if not valid_chunks:
+        return False, [], "No valid chunk files found"
+
+    return True, valid_chunks, f"Checkpoint valid ({len(valid_chunks)} chunks)"
+
+
+# ============================================================
+# Journal (per-run writer)
+# ============================================================
+
+
+class CheckpointJournal:
+    """
+    Append-only checkpoint writer cho một lần chạy
+
+    Workflow:
+    1. Mở journal → ghi snapshot ban đầu (atomic) + header
+    2. Mỗi chunk xong → 1 dòng JSON append (O(1), 1 syscall write)
+    3. fsync gộp theo flush_interval, compact snapshot mỗi snapshot_every records
+    4. close() → snapshot cuối; discard() → xoá cả snapshot và journal
+
+    Mỗi record được ghi bằng os.write trên fd O_APPEND, nên dữ liệu đã nằm
+    trong page cache của kernel ngay khi mark_completed() trả về → kill -9
+    không làm mất chunk đã xong.
+    """
+
+    def __init__(
+        self,
+        output_dir,
+        file_path,
+        total_chunks,
+        completed_chunks=(),
+        voice="Kore",
+        file_hash=None,
+        fingerprint=None,
+        flush_interval=2.0,
+        snapshot_every=64,
+    ):
+        """
+        Args:
+            output_dir: Output directory path
+            file_path: Source markdown file path
+            total_chunks: Total number of chunks
+            completed_chunks: Chunk IDs already done (e.g. from resume)
+            voice: Voice name used
+            file_hash: Precomputed source hash (computed once here if None)
+            fingerprint: Source stat fingerprint (taken once here if None)
+            flush_interval: Min seconds between fsync calls
+            snapshot_every: Compact journal into snapshot every N records
+        """
+        self.output_dir = Path(output_dir)
+        self.file_path = Path(file_path)
+        self.total_chunks = total_chunks
+        self.voice = voice
+        self.file_hash = file_hash or calculate_file_hash(file_path)
+        self.fingerprint = fingerprint or source_fingerprint(file_path)
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        self.completed = set(completed_chunks)
+        self.lock = threading.Lock()
+        self.journal_path = get_journal_path(self.output_dir, self.file_path)
+        self.checkpoint_path = get_checkpoint_path(self.output_dir, self.file_path)
+
+        self._fd = None
+        self._records_since_snapshot = 0
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+        with self.lock:
+            self._compact()
+
+    # ------------------------------------------------------------
+    # Internal helpers (caller holds self.lock)
+    # ------------------------------------------------------------
+
+    def _write_record(self, record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        os.write(self._fd, line)
+        self._dirty = True
+
+    def _fsync_if_due(self, force=False):
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if force or now - self._last_fsync >= self.flush_interval:
+            os.fsync(self._fd)
+            self._last_fsync = now
+            self._dirty = False
+
+    def _compact(self):
+        """
+        Snapshot current state, then start a fresh journal.
+
+        Order matters: snapshot is renamed into place BEFORE the journal is
+        truncated, so a crash in between only leaves duplicate records.
+        """
+        save_checkpoint(
+            self.output_dir,
+            self.file_path,
+            self.total_chunks,
+            list(self.completed),
+            self.voice,
+            file_hash=self.file_hash,
+            fingerprint=self.fingerprint,
+        )
+
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(
+            self.journal_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644
+        )
+        self._write_record(
+            {
+                "type": "header",
+                "file": self.file_path.name,
+                "file_path": str(self.file_path.absolute()),
+                "file_hash": self.file_hash,
+                "source_fingerprint": self.fingerprint,
+                "total_chunks": self.total_chunks,
+                "voice": self.voice,
+            }
+        )
+        self._fsync_if_due(force=True)
+        self._records_since_snapshot = 0
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+
+    def mark_completed(self, chunk_id):
+        """Record a finished chunk (O(1) append, thread-safe)"""
+        with self.lock:
+            if self._fd is None:
+                raise ValueError("Checkpoint journal is closed")
+            if chunk_id in self.completed:
+                return
+
+            self.completed.add(chunk_id)
+            self._write_record({"type": "done", "chunk": chunk_id})
+            self._records_since_snapshot += 1
+
+            if self._records_since_snapshot >= self.snapshot_every:
+                self._compact()
+            else:
+                self._fsync_if_due()
+
+    def close(self):
+        """Flush remaining records and compact into a final snapshot"""
+        with self.lock:
+            if self._fd is None:
+                return
+            save_checkpoint(
+                self.output_dir,
+                self.file_path,
+                self.total_chunks,
+                list(self.completed),
+                self.voice,
+                file_hash=self.file_hash,
+                fingerprint=self.fingerprint,
+            )
+            os.close(self._fd)
+            self._fd = None
+            self.journal_path.unlink(missing_ok=True)
+
+    def discard(self):
+        """Remove snapshot and journal (chapter finished successfully)"""
+        with self.lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self.journal_path.unlink(missing_ok=True)
+            self.checkpoint_path.unlink(missing_ok=True)
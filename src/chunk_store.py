@@ -0,0 +1,366 @@
+"""
+chunk_store.py - Single-container Chunk Store per Chapter
+
+Features:
+- One append-only segment file per chapter (raw PCM of all chunks)
+- Offset index (JSONL) recording chunk_id → (offset, length, crc32)
+- Safe for concurrent writers: offsets reserved under a lock, payloads
+  written with os.pwrite outside the lock
+- Index record appended only after its payload is written → a killed
+  process never leaves an index entry pointing at missing data
+- Resume, assembly and cleanup all read the same two files
+- discard() appends a tombstone record: a chunk synthesized again never
+  keeps a stale derived entry (its MP3 frames)
+- WAV export / legacy import copy payloads in the kernel (copy_range),
+  coalescing chunks that sit next to each other in the segment
+- Reads go through a memory map of the segment (PcmMap): view() / array()
+  / iter_pcm() hand out zero-copy memoryview / NumPy views
+
+Files per chapter (inside the TTS output directory):
+    .chunks_{stem}.seg   # Concatenated PCM payloads (append-only)
+    .chunks_{stem}.idx   # Header + one JSON line per stored chunk
+    .mp3_{stem}.seg/.idx # Per-chunk MP3 frames (--chunk-mp3 mode)
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from .audio_io import WAV_HEADER_SIZE, PcmMap, build_wav_header, copy_range, wav_data_range
+
+# Default PCM format returned by Gemini TTS (see save_wav_file)
+DEFAULT_PARAMS = {"channels": 1, "sample_width": 2, "rate": 24000}
+
+
+def get_store_paths(output_dir, file_stem, kind="chunks"):
+    """Get (segment_path, index_path) for a chapter ("chunks" = PCM, "mp3" = frames)"""
+    output_dir = Path(output_dir)
+    return (
+        output_dir / f".{kind}_{file_stem}.seg",
+        output_dir / f".{kind}_{file_stem}.idx",
+    )
+
+
+class ChunkStore:
+    """
+    Append-only PCM container cho một chapter
+
+    Workflow:
+    1. put(chunk_id, pcm) → reserve offset (lock) → pwrite → append index
+    2. Resume: mở lại store → index đã có sẵn các chunk hoàn thành
+    3. Assembly / phân tích đọc qua memory map (view / array / iter_pcm)
+    4. Xong chapter → remove() xoá cả segment và index
+    """
+
+    def __init__(self, output_dir, file_stem, params=None, kind="chunks"):
+        """
+        Args:
+            output_dir: Output directory path
+            file_stem: Source file stem
+            params: PCM params dict (channels, sample_width, rate) for a new store
+            kind: Store name prefix ("chunks" for PCM, "mp3" for encoded frames)
+        """
+        self.segment_path, self.index_path = get_store_paths(output_dir, file_stem, kind)
+        self.lock = threading.Lock()
+        self.index = {}  # {chunk_id: (offset, length, crc)}
+        self.params = dict(params or DEFAULT_PARAMS)
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        self._seg_fd = os.open(self.segment_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._load_index()
+        self._idx_fd = os.open(
+            self.index_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        if os.fstat(self._idx_fd).st_size == 0:
+            self._append_index({"type": "header", **self.params})
+
+        # New payloads go after everything already in the segment (including
+        # orphan bytes of a write that never got its index record)
+        self._end = os.fstat(self._seg_fd).st_size
+        self._map = None  # PcmMap of the segment, remapped when it grows
+
+    # ------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------
+
+    def _load_index(self):
+        """
+        Replay index file, dropping records that point past the segment end
+
+        A torn last line (killed mid-append) is cut off the file, otherwise
+        the next record would be glued onto it and lost on the next open.
+        """
+        if not self.index_path.exists():
+            return
+
+        segment_size = os.fstat(self._seg_fd).st_size
+        position = valid_end = 0
+
+        with open(self.index_path, "rb") as f:
+            for line in f:
+                position += len(line)
+                if not line.endswith(b"\n"):
+                    break  # Torn write at the tail
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                valid_end = position
+
+                if record.get("type") == "header":
+                    self.params = {k: record[k] for k in DEFAULT_PARAMS if k in record}
+                elif record.get("type") == "chunk":
+                    offset, length = record["offset"], record["length"]
+                    if offset + length <= segment_size:
+                        # Later records win (chunk re-synthesized)
+                        self.index[record["chunk"]] = (offset, length, record.get("crc"))
+                elif record.get("type") == "drop":
+                    self.index.pop(record["chunk"], None)
+
+        if valid_end < position:
+            os.truncate(self.index_path, valid_end)
+
+    def _append_index(self, record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        os.write(self._idx_fd, line)
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+
+    @property
+    def frame_size(self):
+        """Bytes per PCM frame"""
+        return self.params["channels"] * self.params["sample_width"]
+
+    def put(self, chunk_id, data):
+        """
+        Store PCM payload for a chunk (thread-safe)
+
+        Args:
+            chunk_id: Chunk index (0-based)
+            data: Raw PCM bytes
+
+        Returns:
+            Offset of the payload inside the segment file
+        """
+        length = len(data)
+
+        with self.lock:
+            offset = self._end
+            self._end += length
+
+        # Disjoint regions → concurrent pwrite không cần giữ lock
+        view = memoryview(data)
+        written = 0
+        while written < length:
+            written += os.pwrite(self._seg_fd, view[written:], offset + written)
+
+        crc = zlib.crc32(data)
+        with self.lock:
+            self._append_index(
+                {"type": "chunk", "chunk": chunk_id, "offset": offset, "length": length, "crc": crc}
+            )
+            self.index[chunk_id] = (offset, length, crc)
+
+        return offset
+
+    def discard(self, chunk_id):
+        """
+        Forget a chunk (tombstone record; its bytes stay in the segment)
+
+        Used before the chunk is synthesized again, so a derived entry
+        (e.g. its MP3 frames) can never outlive the PCM it was made from.
+        """
+        with self.lock:
+            if chunk_id in self.index:
+                self._append_index({"type": "drop", "chunk": chunk_id})
+                del self.index[chunk_id]
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.index
+
+    def chunk_ids(self):
+        """Sorted list of stored chunk IDs"""
+        with self.lock:
+            return sorted(self.index)
+
+    def chunk_sizes(self):
+        """Dict {chunk_id: payload_length} (same shape as scan_chunk_files)"""
+        with self.lock:
+            return {chunk_id: entry[1] for chunk_id, entry in self.index.items()}
+
+    def locate(self, chunk_id):
+        """Return (offset, length) of a chunk payload in the segment file"""
+        offset, length, _ = self.index[chunk_id]
+        return offset, length
+
+    def read(self, chunk_id, verify=False):
+        """
+        Read a chunk payload
+
+        Args:
+            chunk_id: Chunk index
+            verify: Check CRC32 of the payload
+
+        Returns:
+            bytes: Raw PCM
+        """
+        offset, length, crc = self.index[chunk_id]
+        data = os.pread(self._seg_fd, length, offset)
+
+        if len(data) != length or (verify and crc is not None and zlib.crc32(data) != crc):
+            raise IOError(f"Chunk {chunk_id} is corrupted in {self.segment_path.name}")
+
+        return data
+
+    def pcm_map(self, end=0):
+        """
+        Memory map of the segment covering at least `end` bytes
+
+        The map is shared and only replaced when the segment has grown past
+        it (chunks appended after the last mapping).
+        """
+        with self.lock:
+            if self._map is None or self._map.length < max(end, 1):
+                # Old map is not closed: views handed out earlier stay valid
+                # and it is unmapped once they are released
+                self._map = PcmMap(self.segment_path, self.params)
+            return self._map
+
+    def view(self, chunk_id):
+        """Zero-copy memoryview of a chunk payload"""
+        offset, length = self.locate(chunk_id)
+        view = self.pcm_map(offset + length).view(offset, length)
+        if len(view) != length:
+            raise IOError(f"Chunk {chunk_id} is truncated in {self.segment_path.name}")
+        return view
+
+    def array(self, chunk_id=None):
+        """
+        Zero-copy NumPy int16 view shaped (frames, channels)
+
+        Args:
+            chunk_id: Chunk to view (None = the whole segment)
+        """
+        if chunk_id is None:
+            return self.pcm_map().array()
+        offset, length = self.locate(chunk_id)
+        return self.pcm_map(offset + length).array(offset, length)
+
+    def iter_pcm(self, chunk_ids, block_size=1024 * 1024):
+        """
+        Yield zero-copy PCM blocks (memoryview) for chunks in the given order
+
+        Args:
+            chunk_ids: Chunk IDs in playback order
+            block_size: Max bytes per yielded block
+        """
+        chunk_ids = list(chunk_ids)
+        ranges = [self.locate(chunk_id) for chunk_id in chunk_ids]
+        end = max((offset + length for offset, length in ranges), default=0)
+        yield from self.pcm_map(end).iter_blocks(ranges, block_size)
+
+    def import_wav(self, chunk_id, wav_path):
+        """Copy a legacy .chunk_N WAV file into the store (kernel copy, no CRC)"""
+        data_offset, length, _ = wav_data_range(wav_path)
+        length -= length % self.frame_size
+
+        with self.lock:
+            offset = self._end
+            self._end += length
+
+        src_fd = os.open(wav_path, os.O_RDONLY)
+        try:
+            copy_range(src_fd, self._seg_fd, data_offset, offset, length)
+        finally:
+            os.close(src_fd)
+
+        with self.lock:
+            self._append_index(
+                {"type": "chunk", "chunk": chunk_id, "offset": offset, "length": length, "crc": None}
+            )
+            self.index[chunk_id] = (offset, length, None)
+
+    def _ranges(self, chunk_ids):
+        """Segment ranges for chunk_ids, merging runs that are contiguous on disk"""
+        ranges = []
+        for chunk_id in chunk_ids:
+            offset, length = self.locate(chunk_id)
+            if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+                ranges[-1][1] += length
+            else:
+                ranges.append([offset, length])
+        return ranges
+
+    def export_wav(self, wav_path, chunk_ids):
+        """
+        Write chunks (in the given order) to a WAV file without passing the
+        payload through Python
+
+        The header is written with a zero data size first and patched once
+        every payload is in place.
+
+        Returns:
+            Dict with bytes, seconds, copies (copy calls after coalescing),
+            method (copy primitive used)
+        """
+        started = time.perf_counter()
+        ranges = self._ranges(chunk_ids)
+        fd = os.open(wav_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        try:
+            os.pwrite(fd, build_wav_header(0, **self.params), 0)
+            position = WAV_HEADER_SIZE
+            method = None
+
+            for offset, length in ranges:
+                method = copy_range(self._seg_fd, fd, offset, position, length)
+                position += length
+
+            data_size = position - WAV_HEADER_SIZE
+            os.pwrite(fd, build_wav_header(data_size, **self.params), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        return {
+            "bytes": data_size,
+            "seconds": time.perf_counter() - started,
+            "copies": len(ranges),
+            "method": method or "none",
+        }
+
+    def _unmap_locked(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        """Flush and close file descriptors (store stays on disk)"""
+        with self.lock:
+            self._unmap_locked()
+            if self._seg_fd is not None:
+                os.fsync(self._seg_fd)
+                os.close(self._seg_fd)
+                self._seg_fd = None
+            if self._idx_fd is not None:
+                os.fsync(self._idx_fd)
+                os.close(self._idx_fd)
+                self._idx_fd = None
+
+    def remove(self):
+        """Close and delete segment + index (chapter finished)"""
+        with self.lock:
+            self._unmap_locked()
+            for fd in (self._seg_fd, self._idx_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._seg_fd = self._idx_fd = None
+
+        self.segment_path.unlink(missing_ok=True)
+        self.index_path.unlink(missing_ok=True)
@@ -0,0 +1,487 @@
+"""
+encode_pipeline.py - Background Encoding Stage
+
+Features:
+- finalize_chapter_audio(): encode a finished chapter from its chunk store
+  (or join per-chunk MP3 frames), write its timing index (+ CUE sheet),
+  then delete the stores + checkpoint (inline or in a worker process)
+- EncodePipeline: bounded process pool so the next chapter's synthesis
+  keeps the API keys busy while the previous chapter is being encoded
+- Backpressure: submit() blocks once `max_pending` encodes are in flight
+- Workers start via forkserver (spawn fallback), never fork: the parent
+  already runs threads whose locks a forked child could inherit held
+- Run stats: queue depth (current / max / mean), worker utilization,
+  time spent blocked on backpressure
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .chapter_index import (
+    build_index,
+    get_index_path,
+    layout_chunks,
+    mp3_samples_per_frame,
+    write_cue,
+    write_index,
+)
+from .checkpoint import get_checkpoint_path, get_journal_path
+from .chunk_store import ChunkStore
+from .encoder import (
+    DISK_BANDWIDTH_BYTES_PER_S,
+    LAME_ENCODER_DELAY,
+    WAV_HEADER_SIZE,
+    encode_chunk_mp3,
+    encode_pcm_stream,
+)
+from .audio_io import StreamingWavWriter
+from .events import emit
+from .metrics import ENCODE_QUEUE_DEPTH, record_assembly
+from .profiler import PROFILER
+from .tracer import TRACER
+from .mp3_frames import concat_mp3
+from .post_process import master_chapter, master_summary, numpy_available
+
+
+def join_chunk_mp3(store, mp3_store, total_chunks, mp3_path):
+    """
+    Build the chapter MP3 from per-chunk MP3 frames (no re-encode)
+
+    Chunks that have PCM but no MP3 yet (e.g. killed between the two
+    writes) are encoded here; chunks already in `mp3_store` never are.
+
+    Returns:
+        Stats dict (same keys as encode_stats + joined_frames,
+        encoded_chunks, parts), or None if no encoder is available
+    """
+    started = time.perf_counter()
+    encoded = 0
+
+    for chunk_id in range(total_chunks):
+        if chunk_id not in mp3_store:
+            frames = encode_chunk_mp3(store.view(chunk_id), store.params)
+            if frames is None:
+                return None
+            mp3_store.put(chunk_id, frames)
+            encoded += 1
+
+    last_samples = store.locate(total_chunks - 1)[1] // store.frame_size
+    joined = concat_mp3(
+        (mp3_store.read(chunk_id) for chunk_id in range(total_chunks)),
+        mp3_path,
+        LAME_ENCODER_DELAY,
+        last_samples,
+    )
+
+    pcm_bytes = sum(store.locate(chunk_id)[1] for chunk_id in range(total_chunks))
+    io_avoided = 2 * (pcm_bytes + WAV_HEADER_SIZE)
+    return {
+        "backend": "frames",
+        "pcm_bytes": pcm_bytes,
+        "mp3_bytes": joined["bytes"],
+        "seconds": time.perf_counter() - started,
+        "io_avoided_bytes": io_avoided,
+        "time_saved_estimate_seconds": io_avoided / DISK_BANDWIDTH_BYTES_PER_S,
+        "joined_frames": joined["frames"],
+        "encoded_chunks": encoded,
+        "parts": joined["parts"],
+    }
+
+
+def write_chapter_index(output, file_path, params, samples, chunk_ranges=None, join=None, master=None, cue=False,
+                        source_info=None):
+    """
+    Write the timing index (and optionally a CUE sheet) of a finished chapter
+
+    Args:
+        output: Chapter output path
+        file_path: Source markdown path
+        params: PCM params of the chapter
+        samples: Frames per chunk as stored (playback order)
+        chunk_ranges: Source character range per chunk
+        join: join_chunk_mp3 stats (frames layout)
+        master: master_chapter report (mastered layout)
+        cue: Also write {stem}.cue
+        source_info: chapter_index.source_manifest() of the markdown
+
+    Returns:
+        Index path
+    """
+    output = Path(output)
+    frame_size = params["channels"] * params["sample_width"]
+
+    if master is not None:
+        layout = "mastered"
+        starts = [start for start, _ in master["layout"]]
+        samples = [count for _, count in master["layout"]]
+        chunks = layout_chunks(samples, chunk_ranges, starts=starts)
+    elif join is not None:
+        # Each part decodes to frames × samples_per_frame; the first part's
+        # priming is trimmed by the player → chunk k starts at the sum of
+        # the earlier parts' frames
+        layout = "frames"
+        samples_per_frame = mp3_samples_per_frame(params["rate"])
+        starts, position = [], 0
+        for part in join["parts"]:
+            starts.append(position)
+            position += part["frames"] * samples_per_frame
+        byte_ranges = [(p["offset"], p["length"], p["frames"]) for p in join["parts"]]
+        chunks = layout_chunks(samples, chunk_ranges, starts=starts, byte_ranges=byte_ranges)
+    elif output.suffix == ".wav":
+        layout = "pcm"
+        byte_ranges, position = [], WAV_HEADER_SIZE
+        for count in samples:
+            byte_ranges.append((position, count * frame_size))
+            position += count * frame_size
+        chunks = layout_chunks(samples, chunk_ranges, byte_ranges=byte_ranges)
+    else:
+        layout = "stream"
+        chunks = layout_chunks(samples, chunk_ranges)
+
+    extra = None
+    if source_info is not None:
+        for entry in chunks:
+            entry["text_hash"] = source_info["chunk_hashes"][entry["chunk"]]
+        extra = {"source_fingerprint": source_info["fingerprint"], "source_hash": source_info["hash"]}
+
+    index_path = get_index_path(output.parent, file_path)
+    index = build_index(output, layout, params, chunks, source=Path(file_path).name, extra=extra)
+    write_index(index_path, index)
+    if cue:
+        write_cue(index, output.with_suffix(".cue"))
+    return index_path
+
+
+def finalize_chapter_audio(output_dir, file_path, total_chunks, chunk_mp3=False, target_lufs=None,
+                           chunk_ranges=None, cue=False, source_info=None):
+    """
+    Encode a fully synthesized chapter and clean up its chunk store
+
+    MP3 is joined from per-chunk frames (chunk_mp3) or encoded straight
+    from the store; if no encoder is available (or it fails) the chapter
+    is assembled as WAV instead. With target_lufs, chunk edges are
+    trimmed and the chapter is loudness-normalized on the way into the
+    encoder (post_process). The store and checkpoint are only removed
+    once the output file exists, so a failed encode can be finished
+    later with --resume.
+
+    Args:
+        output_dir: TTS output directory
+        file_path: Source markdown path
+        total_chunks: Number of chunks in the chapter
+        chunk_mp3: Join the per-chunk MP3 store instead of re-encoding
+        target_lufs: Integrated loudness target (None = no mastering)
+        chunk_ranges: Source character range per chunk (timing index)
+        cue: Also write a CUE sheet next to the output
+        source_info: Source manifest for the timing index (watch mode)
+
+    Returns:
+        Dict with output (path str), encode (stats dict or None),
+        encode_error (str or None), master (report dict or None),
+        index (path str or None), mode (stream / frames / mastered / wav),
+        seconds (assembly wall time)
+
+    Raises:
+        IOError: If the chunk store does not hold every chunk
+    """
+    started = time.perf_counter()
+    output_dir = Path(output_dir)
+    stem = Path(file_path).stem
+    output_path_mp3 = output_dir / f"{stem}.mp3"
+    output_path_wav = output_dir / f"{stem}.wav"
+
+    store = ChunkStore(output_dir, stem)
+    mp3_store = ChunkStore(output_dir, stem, kind="mp3") if chunk_mp3 else None
+    encode_result = None
+    encode_error = None
+    master_report = None
+    index_path = None
+
+    if target_lufs is not None and not numpy_available():
+        encode_error = "NumPy not installed, loudness normalization skipped"
+        target_lufs = None
+
+    def pcm_source():
+        nonlocal master_report
+        if target_lufs is None:
+            return store.iter_pcm(range(total_chunks))
+        blocks, master_report = master_chapter(store, range(total_chunks), target_lufs)
+        return blocks
+
+    try:
+        missing = [i for i in range(total_chunks) if i not in store]
+        if missing:
+            raise IOError(f"Chunk store is missing chunks {[i + 1 for i in missing]}")
+        samples = [store.locate(i)[1] // store.frame_size for i in range(total_chunks)]
+        joined = None
+
+        # Per-chunk frames predate the chapter gain → only usable unmastered
+        if mp3_store is not None and target_lufs is None:
+            try:
+                encode_result = join_chunk_mp3(store, mp3_store, total_chunks, output_path_mp3)
+                joined = encode_result
+            except Exception as e:
+                encode_error = f"frame join failed ({e}), re-encoding"
+
+        if encode_result is None:
+            try:
+                encode_result = encode_pcm_stream(pcm_source(), output_path_mp3, store.params)
+            except Exception as e:
+                encode_error = str(e)
+
+        if encode_result is not None:
+            output = output_path_mp3
+        elif target_lufs is not None:
+            # No encoder (or it failed) → mastered WAV of the chapter
+            with StreamingWavWriter(output_path_wav, fsync=False, **store.params) as writer:
+                for block in pcm_source():
+                    writer.write(block)
+            output = output_path_wav
+        else:
+            # No encoder (or it failed) → keep a WAV of the chapter,
+            # payloads copied segment → WAV inside the kernel
+            store.export_wav(output_path_wav, range(total_chunks))
+            output = output_path_wav
+    except Exception:
+        store.close()
+        if mp3_store is not None:
+            mp3_store.close()
+        raise
+
+    # Timing index is a side product: a failure here never fails the chapter
+    try:
+        index_path = write_chapter_index(
+            output, file_path, store.params, samples, chunk_ranges, joined, master_report, cue, source_info
+        )
+    except Exception as e:
+        encode_error = f"{encode_error + '; ' if encode_error else ''}timing index not written ({e})"
+
+    # Output is on disk → chunk stores and checkpoint are no longer needed
+    store.remove()
+    if mp3_store is not None:
+        mp3_store.remove()
+    get_journal_path(output_dir, file_path).unlink(missing_ok=True)
+    get_checkpoint_path(output_dir, file_path).unlink(missing_ok=True)
+
+    if joined is not None:
+        mode = "frames"
+    elif output == output_path_wav:
+        mode = "wav"
+    else:
+        mode = "mastered" if master_report is not None else "stream"
+
+    return {
+        "output": str(output),
+        "encode": encode_result,
+        "encode_error": encode_error,
+        "master": master_report,
+        "index": str(index_path) if index_path is not None else None,
+        "mode": mode,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _timed_call(fn, *args):
+    """Run fn in the worker and report how long (wall, CPU) it kept the worker busy"""
+    started = time.perf_counter()
+    cpu_started = time.process_time()  # one job per worker process at a time
+    result = fn(*args)
+    return result, time.perf_counter() - started, time.process_time() - cpu_started
+
+
+def process_context():
+    """
+    Start method for worker pools: forkserver (spawn where unavailable)
+
+    The parent runs threads (event listener, synthesis workers) by the time
+    a pool starts; fork would copy whatever locks they hold into the child
+    and can deadlock it.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+class EncodePipeline:
+    """
+    Hàng đợi encode chạy nền (process pool có giới hạn)
+
+    Workflow:
+    1. Chapter synthesize xong → submit(label, fn, ...) → trả về ngay
+    2. Đủ `max_pending` job đang chờ/chạy → submit() block (backpressure)
+    3. Worker encode + cleanup → callback ghi kết quả và thống kê
+    4. close() → chờ mọi job xong, trả về danh sách kết quả
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        """
+        Args:
+            max_workers: Encoder processes (default: half the CPUs, 1-4)
+            max_pending: Max jobs queued + running before submit() blocks
+                         (default: 2 × max_workers)
+        """
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self.max_pending = max_pending or self.max_workers * 2
+
+        self.lock = threading.Lock()
+        self.results = []  # [{label, ok, result, error, seconds}]
+
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=process_context())
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._started = time.perf_counter()
+        self._finished = None
+
+        # Stats
+        self.submitted = 0
+        self.depth = 0
+        self.max_depth = 0
+        self._depth_samples = 0
+        self._depth_total = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def submit(self, label, fn, *args):
+        """
+        Queue fn(*args) for a worker process (blocks while the queue is full)
+
+        Args:
+            label: Display name (e.g. chapter file name)
+            fn: Picklable module-level function
+        """
+        wait_started = time.perf_counter()
+        self._slots.acquire()
+        blocked = time.perf_counter() - wait_started
+
+        with self.lock:
+            self.blocked_seconds += blocked
+            self.submitted += 1
+            self.depth += 1
+            self.max_depth = max(self.max_depth, self.depth)
+            self._depth_samples += 1
+            self._depth_total += self.depth
+            depth = self.depth
+        ENCODE_QUEUE_DEPTH.set(depth)
+
+        emit("assembly_queued", chapter=label, depth=depth, max_pending=self.max_pending, blocked=blocked)
+
+        try:
+            future = self._executor.submit(_timed_call, fn, *args)
+        except Exception:
+            with self.lock:
+                self.depth -= 1
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda f: self._on_done(label, f))
+        return future
+
+    def _on_done(self, label, future):
+        try:
+            result, seconds, cpu = future.result()
+            PROFILER.record("encode_background", seconds, cpu, chapter=label)
+            TRACER.complete(
+                "encode_background", time.perf_counter() - seconds, seconds, row="encoder", chapter=label
+            )
+            entry = {"label": label, "ok": True, "result": result, "error": None, "seconds": seconds}
+        except Exception as e:
+            seconds = 0.0
+            entry = {"label": label, "ok": False, "result": None, "error": str(e), "seconds": seconds}
+
+        with self.lock:
+            self.depth -= 1
+            self.busy_seconds += seconds
+            self.results.append(entry)
+            ENCODE_QUEUE_DEPTH.set(self.depth)
+        self._slots.release()
+
+        # Worker-process metrics never reach this registry → record here
+        if entry["ok"]:
+            record_assembly(entry["result"])
+
+        if entry["ok"]:
+            result = entry["result"] if isinstance(entry["result"], dict) else {"output": entry["result"]}
+            emit(
+                "assembly_done", chapter=label, output=result["output"], mode=result.get("mode"),
+                seconds=seconds, encode_error=result.get("encode_error"), background=True,
+                master=master_summary(result.get("master")),
+            )
+        else:
+            emit("assembly_failed", chapter=label, error=entry["error"], background=True)
+
+    def close(self):
+        """
+        Wait for every queued encode to finish
+
+        Returns:
+            List of result dicts (label, ok, result, error, seconds)
+        """
+        self._executor.shutdown(wait=True)
+        if self._finished is None:
+            self._finished = time.perf_counter()
+        return list(self.results)
+
+    @property
+    def failed(self):
+        """Labels of encodes that raised"""
+        with self.lock:
+            return [r["label"] for r in self.results if not r["ok"]]
+
+    def get_stats(self):
+        """
+        Pipeline statistics
+
+        Returns:
+            Dict with workers, submitted, completed, failed, queue_depth,
+            max_queue_depth, mean_queue_depth, utilization (0-1),
+            busy_seconds, blocked_seconds, wall_seconds
+        """
+        with self.lock:
+            wall = (self._finished or time.perf_counter()) - self._started
+            capacity = wall * self.max_workers
+            return {
+                "workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": sum(1 for r in self.results if r["ok"]),
+                "failed": sum(1 for r in self.results if not r["ok"]),
+                "queue_depth": self.depth,
+                "max_queue_depth": self.max_depth,
+                "mean_queue_depth": (
+                    self._depth_total / self._depth_samples if self._depth_samples else 0.0
+                ),
+                "utilization": min(1.0, self.busy_seconds / capacity) if capacity > 0 else 0.0,
+                "busy_seconds": self.busy_seconds,
+                "blocked_seconds": self.blocked_seconds,
+                "wall_seconds": wall,
+            }
+
+    def print_stats(self):
+        """Print pipeline statistics"""
+        stats = self.get_stats()
+        print(f"\n{'='*60}")
+        print(f"🎛️  Encoding Pipeline Stats")
+        print(f"{'='*60}")
+        print(f"Workers: {stats['workers']} processes (max {self.max_pending} in flight)")
+        print(
+            f"Jobs: {stats['submitted']} submitted, {stats['completed']} done, "
+            f"{stats['failed']} failed"
+        )
+        print(
+            f"Queue depth: max {stats['max_queue_depth']}, "
+            f"mean {stats['mean_queue_depth']:.1f}"
+        )
+        print(
+            f"Utilization: {stats['utilization']:.0%} "
+            f"({stats['busy_seconds']:.1f}s busy / {stats['wall_seconds']:.1f}s wall)"
+        )
+        print(f"Backpressure wait: {stats['blocked_seconds']:.1f}s")
+        print(f"{'='*60}\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
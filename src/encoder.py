@@ -0,0 +1,337 @@
+"""
+encoder.py - Streaming MP3 Encoding (no intermediate WAV)
+
+Features:
+- Pipe raw PCM straight into ffmpeg's stdin (libmp3lame)
+- In-process fallback via `lameenc` when ffmpeg is not installed
+- Same encoder settings as convert_wav_to_mp3 (128k, -q:a 2)
+- Reports disk I/O avoided vs the old "write temp WAV → read it back" path
+- encode_chunk_mp3(): one chunk → standalone MP3 frames (--chunk-mp3 mode)
+"""
+
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+# Assumed sequential throughput for the time-saved estimate (HDD ~ 120 MB/s;
+# not measured → reported as an estimate)
+DISK_BANDWIDTH_BYTES_PER_S = 120 * 1024 * 1024
+
+# Temp WAV path = 44-byte header + PCM written once, then read once by ffmpeg
+WAV_HEADER_SIZE = 44
+
+# Priming samples LAME (>= 3.99) puts before the audio of every stream
+LAME_ENCODER_DELAY = 576
+
+
+def ffmpeg_available():
+    """True if an ffmpeg binary is on PATH"""
+    return shutil.which("ffmpeg") is not None
+
+
+def lameenc_available():
+    """True if the optional in-process `lameenc` encoder is installed"""
+    try:
+        import lameenc  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _bitrate_kbps(bitrate):
+    return int(str(bitrate).lower().rstrip("k"))
+
+
+class FfmpegPipeEncoder:
+    """ffmpeg subprocess reading s16le PCM from stdin"""
+
+    backend = "ffmpeg"
+
+    def __init__(self, output_path, output_args, channels=1, rate=24000, sample_width=2, extra_args=()):
+        """
+        Args:
+            output_path: Output file path
+            output_args: ffmpeg output options (codec, bitrate, muxer...)
+            channels: Number of channels
+            rate: Sample rate in Hz
+            sample_width: Bytes per sample (must be 2)
+            extra_args: Extra inputs / mapping placed after the PCM input
+        """
+        if sample_width != 2:
+            raise ValueError("Only 16-bit PCM is supported")
+
+        self.path = Path(output_path)
+        self.data_bytes = 0
+        self.busy_seconds = 0.0
+        self.closed = False
+        self._stderr = tempfile.TemporaryFile()
+
+        cmd = [
+            "ffmpeg", "-y",  # overwrite without asking
+            "-loglevel", "error",
+            "-f", "s16le",  # raw PCM input
+            "-ar", str(rate),
+            "-ac", str(channels),
+            "-i", "pipe:0",  # input from stdin
+            *extra_args,
+            *output_args,
+            str(self.path),
+        ]
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr
+        )
+
+    def write(self, pcm_data):
+        started = time.perf_counter()
+        self._proc.stdin.write(pcm_data)
+        self.data_bytes += len(pcm_data)
+        self.busy_seconds += time.perf_counter() - started
+
+    def close(self, timeout=300):
+        """Finish the stream; raises RuntimeError if ffmpeg failed"""
+        if self.closed:
+            return
+        self.closed = True
+        started = time.perf_counter()
+
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        try:
+            returncode = self._proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            raise RuntimeError("ffmpeg timeout")
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+
+        if returncode != 0:
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg error: {message}")
+        self._stderr.close()
+
+
+class FfmpegMp3Encoder(FfmpegPipeEncoder):
+    """ffmpeg libmp3lame encoder (same settings as convert_wav_to_mp3)"""
+
+    def __init__(self, mp3_path, channels=1, rate=24000, sample_width=2, bitrate="128k"):
+        super().__init__(
+            mp3_path,
+            [
+                "-codec:a", "libmp3lame",  # MP3 encoder
+                "-b:a", bitrate,  # bitrate
+                "-q:a", "2",  # quality (0-9, lower is better)
+            ],
+            channels,
+            rate,
+            sample_width,
+        )
+
+
+class LameMp3Encoder:
+    """In-process libmp3lame encoder (optional `lameenc` package)"""
+
+    backend = "lameenc"
+
+    def __init__(self, mp3_path, channels=1, rate=24000, sample_width=2, bitrate="128k"):
+        import lameenc
+
+        if sample_width != 2:
+            raise ValueError("Only 16-bit PCM is supported")
+
+        self.path = Path(mp3_path)
+        self.data_bytes = 0
+        self.busy_seconds = 0.0
+        self.closed = False
+
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_bit_rate(_bitrate_kbps(bitrate))
+        self._encoder.set_in_sample_rate(rate)
+        self._encoder.set_channels(channels)
+        self._encoder.set_quality(2)
+        self._file = open(self.path, "wb")
+
+    def write(self, pcm_data):
+        started = time.perf_counter()
+        self._file.write(self._encoder.encode(bytes(pcm_data)))
+        self._file.flush()  # MP3 frames on disk as they are produced
+        self.data_bytes += len(pcm_data)
+        self.busy_seconds += time.perf_counter() - started
+
+    def close(self, timeout=None):
+        if self.closed:
+            return
+        self.closed = True
+        started = time.perf_counter()
+        self._file.write(self._encoder.flush())
+        self._file.close()
+        self.busy_seconds += time.perf_counter() - started
+
+
+def open_mp3_encoder(mp3_path, channels=1, rate=24000, sample_width=2, bitrate="128k"):
+    """
+    Open a streaming MP3 encoder (ffmpeg preferred, lameenc fallback)
+
+    Returns:
+        Encoder with write(pcm) / close() / path / data_bytes, or None if
+        no encoder backend is available
+    """
+    if ffmpeg_available():
+        return FfmpegMp3Encoder(mp3_path, channels, rate, sample_width, bitrate)
+    if lameenc_available():
+        return LameMp3Encoder(mp3_path, channels, rate, sample_width, bitrate)
+    return None
+
+
+def encode_chunk_mp3(pcm_data, params, bitrate="128k"):
+    """
+    Encode one chunk to a standalone MP3 stream (flushed, no tag frames)
+
+    Args:
+        pcm_data: Raw PCM bytes
+        params: Dict with channels, sample_width, rate
+        bitrate: MP3 bitrate
+
+    Returns:
+        bytes of MP3 audio frames, or None if no encoder is available
+
+    Raises:
+        RuntimeError: If ffmpeg fails
+    """
+    from .mp3_frames import audio_frames
+
+    if params["sample_width"] != 2:
+        raise ValueError("Only 16-bit PCM is supported")
+
+    # In-process first: a process spawn per chunk costs more than the encode
+    if lameenc_available():
+        import lameenc
+
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(_bitrate_kbps(bitrate))
+        encoder.set_in_sample_rate(params["rate"])
+        encoder.set_channels(params["channels"])
+        encoder.set_quality(2)
+        data = bytes(encoder.encode(bytes(pcm_data))) + bytes(encoder.flush())
+    elif ffmpeg_available():
+        cmd = [
+            "ffmpeg", "-y",
+            "-loglevel", "error",
+            "-f", "s16le",
+            "-ar", str(params["rate"]),
+            "-ac", str(params["channels"]),
+            "-i", "pipe:0",
+            "-codec:a", "libmp3lame",
+            "-b:a", bitrate,
+            "-q:a", "2",
+            "-write_xing", "0",  # tag frame is written once for the chapter
+            "-id3v2_version", "0",
+            "-f", "mp3", "pipe:1",
+        ]
+        result = subprocess.run(cmd, input=bytes(pcm_data), capture_output=True, timeout=300)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg error: {result.stderr.decode(errors='replace').strip()}")
+        data = result.stdout
+    else:
+        return None
+
+    return audio_frames(data)
+
+
+def encode_stats(encoder, elapsed=None):
+    """
+    Build a stats dict for a finished encode
+
+    Args:
+        encoder: Closed encoder
+        elapsed: Wall time of the whole encode (default: time spent inside
+                 the encoder's write/close calls)
+
+    Returns:
+        Dict with backend, pcm_bytes, mp3_bytes, seconds, io_avoided_bytes,
+        time_saved_estimate_seconds (io_avoided_bytes at the assumed
+        DISK_BANDWIDTH_BYTES_PER_S, not a measurement)
+    """
+    wav_bytes = encoder.data_bytes + WAV_HEADER_SIZE
+    io_avoided = 2 * wav_bytes  # temp WAV written once + read back once
+    mp3_bytes = encoder.path.stat().st_size if encoder.path.exists() else 0
+
+    return {
+        "backend": encoder.backend,
+        "pcm_bytes": encoder.data_bytes,
+        "mp3_bytes": mp3_bytes,
+        "seconds": encoder.busy_seconds if elapsed is None else elapsed,
+        "io_avoided_bytes": io_avoided,
+        "time_saved_estimate_seconds": io_avoided / DISK_BANDWIDTH_BYTES_PER_S,
+    }
+
+
+def encode_pcm_stream(pcm_blocks, mp3_path, params, bitrate="128k"):
+    """
+    Encode an iterable of PCM blocks straight to MP3
+
+    Args:
+        pcm_blocks: Iterable of bytes (e.g. ChunkStore.iter_pcm(...))
+        mp3_path: Output MP3 path
+        params: Dict with channels, sample_width, rate
+        bitrate: MP3 bitrate
+
+    Returns:
+        Stats dict (see encode_stats), or None if no encoder is available
+
+    Raises:
+        RuntimeError: If the encoder fails (partial MP3 is removed)
+    """
+    started = time.perf_counter()
+    encoder = open_mp3_encoder(
+        mp3_path, params["channels"], params["rate"], params["sample_width"], bitrate
+    )
+    if encoder is None:
+        return None
+
+    try:
+        for block in pcm_blocks:
+            encoder.write(block)
+        encoder.close()
+    except Exception:
+        if not encoder.closed:
+            try:
+                encoder.close()
+            except Exception:
+                pass
+        Path(mp3_path).unlink(missing_ok=True)
+        raise
+
+    return encode_stats(encoder, time.perf_counter() - started)
+
+
+def format_encode_stats(stats):
+    """Summary lines of a streaming encode"""
+    pcm_mb = stats["pcm_bytes"] / 1024 / 1024
+    mp3_mb = stats["mp3_bytes"] / 1024 / 1024
+    avoided_mb = stats["io_avoided_bytes"] / 1024 / 1024
+    disk_mb = DISK_BANDWIDTH_BYTES_PER_S / 1024 / 1024
+    lines = [
+        f"📦 Encoded ({stats['backend']}): {pcm_mb:.2f}MB PCM → {mp3_mb:.2f}MB MP3 "
+        f"in {stats['seconds']:.1f}s"
+    ]
+    if stats.get("joined_frames") is not None:
+        lines.append(
+            f"🧩 Joined {stats['joined_frames']:,} MP3 frames "
+            f"({stats['encoded_chunks']} chunks encoded at finalize)"
+        )
+    lines.append(
+        f"💽 Disk I/O avoided: {avoided_mb:.2f}MB (no temp WAV; "
+        f"est. ~{stats['time_saved_estimate_seconds']:.1f}s saved at an assumed {disk_mb:.0f}MB/s disk)"
+    )
+    return "\n".join(lines)
+
+
+def print_encode_stats(stats):
+    """Print the streaming-encode summary"""
+    print(format_encode_stats(stats))
@@ -0,0 +1,430 @@
+"""
+events.py - Structured Run Events (JSONL log + console view)
+
+Features:
+- emit(event, **fields): one typed event per pipeline step (chunk start /
+  done / failed, key assignment, retries, cooldown waits, checkpoint,
+  assembly) instead of ad-hoc prints
+- Queue-backed logging: workers only enqueue (logging QueueHandler on an
+  unbounded SimpleQueue → never blocks); a single listener thread writes
+  the JSONL file and renders the console line
+- Console text is rendered from the same event (CONSOLE templates, or a
+  render function for events whose view depends on their fields), so the
+  terminal and the JSONL file never disagree
+- Every event carries ts, run id, thread and elapsed seconds → batches of
+  many chapters can be aggregated with jq / pandas
+- Without start_event_log() (TUI, library use) events are rendered to the
+  console synchronously, exactly like the old prints
+- Subscribers (job server progress, dashboards) get every event dict on the
+  listener thread
+
+Event types: run_start, config_warning, keys_ready, metrics_export,
+default_file, chapter_open, text_ready, resume_import, resume_checked,
+chapter_start, chunk_start, request_start, key_assigned, key_rerouted,
+retry, audio_part_skipped, suspect_audio, suspect_retry, suspect_kept,
+key_removed, request_error, cooldown_wait, chunk_done, chunk_failed,
+chunk_mp3_failed, chunk_replaced, checkpoint, assembly_start,
+assembly_queued, assembly_done, assembly_failed, chapter_done, encode_wait,
+profile_written, trace_written, run_done; job server: jobs_requeued,
+job_queued, job_start, job_done, job_requeued, quota_wait
+
+event_context(chapter=..., chunk=...) tags every event emitted by the
+current thread inside the block (e.g. key events raised deep inside
+generate_audio_data).
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+LOGGER_NAME = "tts.events"
+
+RULE = "=" * 60
+
+
+# ------------------------------------------------------------
+# Console views that depend on the event's fields
+# ------------------------------------------------------------
+
+
+def _run_start(f):
+    return f"\n{RULE}\n🎙️  Gemini TTS Audiobook Generator\n{RULE}"
+
+
+def _keys_ready(f):
+    skipped = f" ({f['skipped']} skipped: quota exhausted until reset)" if f.get("skipped") else ""
+    return f"🔄 Key Rotation Manager initialized with {f['keys']} keys{skipped}\n"
+
+
+def _metrics_export(f):
+    lines = []
+    if f.get("url"):
+        lines.append(f"📈 Metrics endpoint: {f['url']}")
+    if f.get("file"):
+        lines.append(f"📈 Metrics file: {f['file']}")
+    return "\n".join(lines) or None
+
+
+def _chapter_open(f):
+    if f.get("mode") != "concurrent":
+        return (
+            f"\n📖 Đang xử lý: {f['chapter']} (synchronous mode, use --concurrent for faster processing)\n"
+            f"📁 Output directory: {f['output_dir']}"
+        )
+    lines = [f"\n{RULE}", f"🎯 Processing Chapter: {f['chapter']}", f"⚡ Concurrent Mode: {f['workers']} workers"]
+    if f.get("resume"):
+        lines.append("🔄 Resume Mode: Enabled")
+    lines.append(f"{RULE}\n")
+    return "\n".join(lines)
+
+
+def _text_ready(f):
+    lines = [
+        f"🧼 Đã làm sạch Markdown: {f['raw_chars']:,} → {f['chars']:,} ký tự",
+        f"📊 Tổng số tokens: {f['tokens']:,}",
+    ]
+    if f["tokens"] > f["max_tokens"]:
+        lines.append(f"📦 File vượt {f['max_tokens']} tokens, đã chia thành {f['chunks']} chunks")
+    else:
+        lines.append(f"✅ File nhỏ hơn {f['max_tokens']} tokens, xử lý một lần")
+    return "\n".join(lines)
+
+
+def _resume_checked(f):
+    if f["ok"]:
+        return f"✅ Resuming from checkpoint: {f['completed']} chunks already done."
+    return f"ℹ️  Resume info: {f['message']}. Starting fresh or reprocessing invalid chunks."
+
+
+def _chapter_start(f):
+    if f.get("mode") != "concurrent":
+        return None  # sequential: text_ready; redo: one chunk_start per chunk
+    lines = [
+        "📊 Chapter Info:",
+        f"   Total chunks: {f['chunks']}",
+        f"   Already completed: {f['resumed']}",
+        f"   Remaining to process: {f['remaining']}",
+    ]
+    if not f["remaining"]:
+        lines.append("\n✨ All chunks already completed! Proceeding to assembly.")
+    else:
+        lines += [
+            f"   Expected API calls: {f['remaining']}",
+            f"   Estimated time: {f['estimate_seconds']:.0f}s ⚡ ({f['latency']:.1f}s/request)",
+            "",
+            f"⏳ Starting processing with {f['workers']} workers...\n",
+        ]
+    return "\n".join(lines)
+
+
+def _assembly_queued(f):
+    line = f"📤 Queued for encoding: {f['chapter']} (queue depth {f['depth']}/{f['max_pending']})"
+    if f.get("blocked", 0) >= 0.1:
+        line = f"⏳ Encoder queue full, waited {f['blocked']:.1f}s (backpressure)\n" + line
+    return line
+
+
+def _assembly_done(f):
+    lines = []
+    if f.get("bytes") is not None:
+        lines += [
+            f"\n✅ Đã tạo xong {f['chunks']} phần audio",
+            f"📊 Tổng dung lượng: {f['bytes']:,} bytes ({f['bytes'] / 1024 / 1024:.2f} MB)",
+        ]
+    lines.append(f"🎧 Encoded {f['chapter']} in {f['seconds']:.1f}s → {f['output']}")
+    if f.get("master"):
+        from .post_process import format_master_report
+
+        lines.append(format_master_report(f["master"]))
+    if f.get("encode_error"):
+        lines.append(f"⚠️  Encode failed: {f['encode_error']}")
+    if f.get("encode"):
+        from .encoder import format_encode_stats
+
+        lines.append(format_encode_stats(f["encode"]))
+    elif "encode" in f:
+        lines.append("⚠️  MP3 encoder unavailable, kept WAV instead")
+    if f.get("index"):
+        lines.append(f"🗂️  Timing index: {f['index']}")
+    return "\n".join(lines)
+
+
+def _chapter_done(f):
+    if f.get("ok"):
+        if f.get("background_encode"):
+            return f"\n✅ Synthesis complete: {f['chapter']} (encoding in background)\n"
+        if f.get("mode") == "redo":
+            return None  # one chunk_replaced line per chunk
+        return f"\n{RULE}\n✅ Success! Audio saved to: {f['output']}\n{RULE}\n"
+
+    lines = []
+    if f.get("missing"):
+        lines += [
+            f"❌ Missing chunks: {f['missing']}",
+            f"💾 Partial progress is saved in chunk store: {f['store']}",
+            "ℹ️  Run again with --resume to finish.",
+        ]
+    if f.get("partial"):
+        size = f["partial_bytes"]
+        lines += [
+            f"\n💾 Saved partial progress ({f['partial_chunks']}/{f['chunks']} chunks):",
+            f"   File: {f['partial']}",
+            f"   Size: {size:,} bytes ({size / 1024 / 1024:.2f} MB)",
+            "   ℹ️  You can listen to completed chunks while investigating the error.",
+        ]
+    if f.get("partial_error"):
+        lines.append(f"⚠️  Warning: Failed to save partial progress: {f['partial_error']}")
+    if f.get("error"):
+        where = f"{f['chapter']}, chunk {f['chunk']}" if f.get("chunk") else f["chapter"]
+        lines.append(f"\n❌ {where}: {f['error']}")
+    if f.get("traceback"):
+        lines.append(f["traceback"].rstrip())
+    return "\n".join(lines) or None
+
+
+def _run_done(f):
+    if f.get("dry_run"):
+        return None
+    if f.get("ok"):
+        return "\n🎉 Processing complete!"
+    return "\n❌ Processing failed!" + (f" {f['error']}" if f.get("error") else "")
+
+
+def _quota_wait(f):
+    return f"😴 All keys exhausted, jobs wait until {datetime.fromtimestamp(f['until']):%Y-%m-%d %H:%M}"
+
+
+# Console view per event type: format template, render function, or None (JSONL only)
+CONSOLE = {
+    "run_start": _run_start,
+    "config_warning": "⚠️  Warning: {message}",
+    "keys_ready": _keys_ready,
+    "metrics_export": _metrics_export,
+    "default_file": "\n📝 No file specified, using default: {path}",
+    "chapter_open": _chapter_open,
+    "text_ready": _text_ready,
+    "resume_import": "📦 Importing {files} legacy chunk files into chunk store...",
+    "resume_checked": _resume_checked,
+    "chapter_start": _chapter_start,
+    "chunk_start": "🎙️  Chunk {chunk}/{total}: {tokens:,} tokens",
+    "request_start": "      ▶️  Thực thi: {key_display}",
+    "key_assigned": "   🔑 Chunk {chunk}: Using {key_display}: {usage}/{limit} requests",
+    "key_rerouted": "   🔄 Chunk {chunk}: Re-routed to {key_display}: {usage}/{limit} requests",
+    "retry": "   ⚠️  {key_display}: {reason}, cooldown {cooldown}s",
+    "audio_part_skipped": "      Part {part}: No audio data (skipped)",
+    "suspect_audio": (
+        "   🔎 {key_display}: suspect audio ({reason}: {speech_seconds:.1f}s speech, "
+        "expected ~{expected_seconds:.0f}s, {voiced_fraction:.0%} voiced)"
+    ),
+    "suspect_retry": "   🔁 Re-requesting chunk ({attempt}/{max_retries})",
+    "suspect_kept": "   ⚠️  Keeping best of {attempts} suspect attempts",
+    "key_removed": "   ❌ {key_display}: Quota exhausted, removed permanently",
+    "request_error": "   ❌ Unknown error: {error}",
+    "cooldown_wait": "⏳ All keys in cooldown, waiting {seconds:.1f}s for next available key...",
+    "chunk_done": "✅ Chunk {chunk}/{total} saved ({bytes:,} bytes, {seconds:.1f}s)",
+    "chunk_failed": "❌ Error processing chunk {chunk}: {error}",
+    "chunk_mp3_failed": "⚠️  MP3 encode of chunk {chunk} failed (retried at finalize): {error}",
+    "chunk_replaced": "✅ Chunk {chunk} replaced in {audio} ({layout} layout, {delta_seconds:+.1f}s)",
+    "checkpoint": None,
+    "assembly_start": "🔗 Encoding {chunks} chunks in order...",
+    "assembly_queued": _assembly_queued,
+    "assembly_done": _assembly_done,
+    "assembly_failed": "❌ Encoding failed for {chapter}: {error}",
+    "chapter_done": _chapter_done,
+    "encode_wait": "\n⏳ Waiting for background encoding to finish...",
+    "profile_written": "🧪 Profile written: {path}",
+    "trace_written": "🧵 Trace written: {path} ({events:,} events)",
+    "run_done": _run_done,
+    # Job server (job_server.py)
+    "jobs_requeued": "🔄 Re-queued {jobs} jobs interrupted by the last shutdown",
+    "job_queued": "📥 {submitter}: queued jobs {jobs}",
+    "job_start": "▶️  Job {job} ({submitter}): {path}",
+    "job_done": "🏁 Job {job} finished (ok={ok})",
+    "job_requeued": "⏸️  Job {job} re-queued ({reason})",
+    "quota_wait": _quota_wait,
+}
+
+RUN_ID = uuid.uuid4().hex[:8]
+_STARTED = time.monotonic()
+
+_logger = logging.getLogger(LOGGER_NAME)
+_logger.propagate = False  # never reaches the root logger / basicConfig handlers
+_logger.setLevel(logging.INFO)
+
+_listener = None
+_queue = None
+_local = threading.local()
+
+
+def render(event, fields):
+    """Human console line(s) of an event (None if it is JSONL-only)"""
+    template = CONSOLE.get(event, "{event} {fields}")
+    if template is None:
+        return None
+    try:
+        if callable(template):
+            return template(fields)
+        return template.format(event=event, fields=fields, **fields)
+    except (KeyError, ValueError, IndexError, TypeError):
+        return f"{event} {fields}"
+
+
+def emit(event, **fields):
+    """
+    Record one event (non-blocking once start_event_log() has run)
+
+    Args:
+        event: Event type (see CONSOLE)
+        **fields: JSON-serializable payload (chapter, chunk, key hash...)
+    """
+    context = getattr(_local, "context", None)
+    if context:
+        fields = {**context, **fields}
+    payload = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "elapsed": round(time.monotonic() - _STARTED, 4),
+        "run": RUN_ID,
+        "event": event,
+        "thread": threading.current_thread().name,
+        **fields,
+    }
+    if _listener is None:
+        line = render(event, fields)
+        if line is not None:
+            print(line)
+        return
+    _logger.info(event, extra={"event_payload": payload})
+
+
+@contextmanager
+def event_context(**fields):
+    """Add fields (chapter, chunk...) to every event this thread emits in the block"""
+    previous = getattr(_local, "context", None)
+    _local.context = {**(previous or {}), **fields}
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+
+def current_context():
+    """Fields of the enclosing event_context() (pass them on to worker threads)"""
+    return dict(getattr(_local, "context", None) or {})
+
+
+class _EventFilter(logging.Filter):
+    """Only event records (flush markers carry no payload)"""
+
+    def filter(self, record):
+        return hasattr(record, "event_payload")
+
+
+class JsonlHandler(logging.FileHandler):
+    """One JSON object per line (appends; one file can hold many runs)"""
+
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(path, mode="a", encoding="utf-8")
+        self.addFilter(_EventFilter())
+
+    def format(self, record):
+        return json.dumps(record.event_payload, ensure_ascii=False, default=str)
+
+
+class ConsoleHandler(logging.Handler):
+    """Render events as the familiar emoji lines on stdout"""
+
+    def __init__(self):
+        super().__init__()
+        self.addFilter(_EventFilter())
+
+    def emit(self, record):
+        payload = dict(record.event_payload)
+        event = payload.pop("event")
+        for key in ("ts", "elapsed", "run", "thread"):
+            payload.pop(key, None)
+        line = render(event, payload)
+        if line is not None:
+            print(line, flush=True)
+
+
+class SubscriberHandler(logging.Handler):
+    """Call fn(payload) for every event (on the listener thread; errors are swallowed)"""
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.addFilter(_EventFilter())
+
+    def emit(self, record):
+        try:
+            self.fn(dict(record.event_payload))
+        except Exception:
+            self.handleError(record)
+
+
+class _FlushHandler(logging.Handler):
+    """Last handler: wakes flush_events() once everything before it is written"""
+
+    def emit(self, record):
+        done = getattr(record, "flush_done", None)
+        if done is not None:
+            done.set()
+
+
+def start_event_log(jsonl_path=None, console=True, subscribers=()):
+    """
+    Route events through a background listener thread
+
+    Args:
+        jsonl_path: Append events to this JSONL file (None = console only)
+        console: Render events to stdout
+        subscribers: Callables fn(payload) called for every event
+    """
+    global _listener, _queue
+    if _listener is not None:
+        stop_event_log()
+
+    handlers = []
+    if jsonl_path:
+        handlers.append(JsonlHandler(jsonl_path))
+    if console:
+        handlers.append(ConsoleHandler())
+    handlers += [SubscriberHandler(fn) for fn in subscribers]
+    handlers.append(_FlushHandler())
+
+    _queue = queue.SimpleQueue()  # unbounded: put() never blocks a worker
+    queue_handler = logging.handlers.QueueHandler(_queue)
+    _logger.handlers = [queue_handler]
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+
+
+def flush_events(timeout=5.0):
+    """Block until every event emitted so far has been written (before direct prints)"""
+    if _listener is None:
+        return
+    done = threading.Event()
+    _logger.info("flush", extra={"flush_done": done})
+    done.wait(timeout)
+
+
+def stop_event_log():
+    """Drain the queue, close the JSONL file, fall back to synchronous output"""
+    global _listener, _queue
+    if _listener is None:
+        return
+    listener = _listener
+    listener.stop()  # processes everything still queued
+    for handler in listener.handlers:
+        handler.close()
+    _logger.handlers = []
+    _listener = None
+    _queue = None
@@ -0,0 +1,239 @@
+"""
+job_queue.py - Persistent Job Queue for the Job Server (SQLite)
+
+Features:
+- One row per chapter job: submitter, path, options (voice, workers...),
+  status (queued → running → done / failed, or cancelled), progress, output
+- Survives restarts: jobs left "running" by a crashed server are queued
+  again on open (the chapter resumes from its checkpoint)
+- Fair sharing: claim_next() picks the submitter with the fewest running
+  jobs, then the one served least recently, then the oldest job (FIFO
+  inside a submitter) → one person's 40-chapter book cannot starve others
+- One chapter, one job at a time: a submit for a path that is already
+  queued merges into that job, and claim_next() skips paths with a
+  running job (two jobs resuming the same checkpoint would corrupt it)
+- Thread-safe (one connection, serialized by a lock; WAL journal)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submitter TEXT NOT NULL,
+    path TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    chunks_total INTEGER NOT NULL DEFAULT 0,
+    output TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitter);
+CREATE INDEX IF NOT EXISTS jobs_path ON jobs (path, status);
+"""
+
+
+def _row_to_job(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    return job
+
+
+class JobQueue:
+    """
+    Hàng đợi job lưu trong SQLite (chia sẻ công bằng giữa người gửi)
+
+    Workflow:
+    1. submit(submitter, path, options) → job "queued" (path đã có job queued → gộp vào job đó)
+    2. Server: claim_next() → job "running" (submitter ít job đang chạy nhất trước,
+       bỏ qua chapter đang có job running)
+    3. update_progress() theo từng chunk; finish(ok, output, error) → "done" / "failed"
+    4. Server restart → job "running" dang dở quay về "queued" (resume từ checkpoint)
+    """
+
+    def __init__(self, path="data/jobs.sqlite3"):
+        """
+        Args:
+            path: SQLite database file (":memory:" for tests)
+        """
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self.requeued = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'"
+            ).rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ------------------------------------------------------------
+    # Submitting / querying
+    # ------------------------------------------------------------
+
+    def submit(self, submitter, path, options=None):
+        """
+        Queue one chapter
+
+        A chapter that already has a queued job is not queued twice: the
+        new options replace that job's options. A chapter that is only
+        running gets one queued follow-up, claimed once the run ends.
+
+        Returns:
+            Job dict (the existing job if merged)
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE path = ? AND status = 'queued' ORDER BY id LIMIT 1", (str(path),)
+                ).fetchone()
+                if row is not None:
+                    job_id = row["id"]
+                    self.conn.execute(
+                        "UPDATE jobs SET options = ? WHERE id = ?", (json.dumps(options or {}), job_id)
+                    )
+                else:
+                    job_id = self.conn.execute(
+                        "INSERT INTO jobs (submitter, path, options, created) VALUES (?, ?, ?, ?)",
+                        (submitter, str(path), json.dumps(options or {}), time.time()),
+                    ).lastrowid
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Job dict (None if unknown)"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list(self, status=None, submitter=None, limit=200):
+        """
+        Jobs, newest first
+
+        Args:
+            status: Only this status (optional)
+            submitter: Only this submitter (optional)
+            limit: Max rows
+        """
+        query = "SELECT * FROM jobs WHERE 1 = 1"
+        params = []
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if submitter:
+            query += " AND submitter = ?"
+            params.append(submitter)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self):
+        """Jobs per status"""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued job (running jobs finish their chapter)
+
+        Returns:
+            True if the job was cancelled
+        """
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    # ------------------------------------------------------------
+    # Server side
+    # ------------------------------------------------------------
+
+    def claim_next(self):
+        """
+        Mark the next job (fair share across submitters) as running
+
+        Chapters with a running job are skipped: never two runs on one
+        chunk store / checkpoint journal.
+
+        Returns:
+            Job dict, or None if nothing is claimable
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    """
+                    SELECT j.id FROM jobs j
+                    WHERE j.status = 'queued'
+                      AND NOT EXISTS (SELECT 1 FROM jobs p WHERE p.path = j.path AND p.status = 'running')
+                    ORDER BY
+                        (SELECT COUNT(*) FROM jobs r WHERE r.submitter = j.submitter AND r.status = 'running'),
+                        COALESCE((SELECT MAX(s.started) FROM jobs s WHERE s.submitter = j.submitter), 0),
+                        j.id
+                    LIMIT 1
+                    """
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, error = NULL WHERE id = ?",
+                    (time.time(), row["id"]),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def update_progress(self, job_id, done=None, total=None):
+        """Record chunks finished / total of a running job"""
+        with self.lock:
+            if total is not None:
+                self.conn.execute("UPDATE jobs SET chunks_total = ? WHERE id = ?", (total, job_id))
+            if done is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET chunks_done = MAX(chunks_done, ?) WHERE id = ?", (done, job_id)
+                )
+
+    def requeue(self, job_id, error=None):
+        """Put a running job back in the queue (e.g. quota ran out mid-chapter)"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, error = ? WHERE id = ?", (error, job_id)
+            )
+
+    def finish(self, job_id, ok, output=None, error=None):
+        """Mark a running job done / failed"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, output = ?, error = ? WHERE id = ?",
+                ("done" if ok else "failed", time.time(), output, error, job_id),
+            )
@@ -0,0 +1,648 @@
+"""
+job_server.py - Long-running Job Server (local HTTP / Unix-socket API)
+
+Features:
+- One warm engine for many books: a single APIKeyManager, key rotation
+  pool, key health store, audio checker and cached Gemini clients shared
+  by every job (nothing is re-read or re-created per chapter)
+- Persistent queue in SQLite (job_queue.py): jobs survive a restart and
+  resume from their chapter checkpoint
+- Several jobs run at once (--max-jobs), fair-shared across submitters;
+  all of them draw keys from the same rotation pool
+- Live progress per job (chunks done / total) from the run's events
+- Quota aware: when every key is exhausted, queued jobs wait for the
+  daily reset instead of failing one after another
+- Same API for the CLI, scripts and the TUI dashboard (JobClient)
+
+API (JSON):
+    GET    /status          engine: running jobs, queue counts, keys (pool + per key), uptime
+    GET    /jobs            ?status=queued&submitter=alice
+    GET    /jobs/<id>       one job (status, chunks_done / chunks_total, output)
+    POST   /jobs            {"paths": [...], "submitter": "...", "options": {...}}
+                            options: voice, workers, chunk_mp3, normalize, cue,
+                            chunks (redo only these chunks of one finished chapter)
+    DELETE /jobs/<id>       cancel a queued job
+    GET    /metrics         Prometheus exposition (metrics.py)
+
+Usage:
+    python -m src.job_server serve --max-jobs 2 --workers 3
+    python -m src.job_server serve --socket /tmp/tts.sock
+    python -m src.job_server submit book/ --submitter alice --voice Puck
+    python -m src.job_server jobs
+    python -m src.job_server status
+    python -m src.job_server cancel 12
+"""
+
+import getpass
+import http.client
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+
+from .audio_check import AudioChecker
+from .audiobook_generator import get_api_key_manager, process_chapter_concurrent, redo_chunks
+from .book_planner import collect_chapters
+from .events import emit, event_context, flush_events, start_event_log, stop_event_log
+from .job_queue import STATUSES, JobQueue
+from .key_health import KeyHealthStore, next_quota_reset
+from .key_rotation_manager import KeyRotationManager
+from .metrics import CONTENT_TYPE, REGISTRY
+
+DEFAULT_PORT = 8765
+
+# options accepted by POST /jobs → type check
+JOB_OPTIONS = {
+    "voice": str,
+    "workers": int,
+    "chunk_mp3": bool,
+    "normalize": (int, float, type(None)),
+    "cue": bool,
+    "chunks": list,  # 1-based chunk numbers to redo in place (watch mode)
+}
+
+
+class JobServerError(Exception):
+    """API error (HTTP status + message)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobServer:
+    """
+    Engine chạy nền: nhận job qua API, chạy nhiều chapter cùng lúc
+
+    Workflow:
+    1. start() → mở queue SQLite, event log + dispatcher thread
+    2. POST /jobs → job "queued" (thư mục → một job mỗi chapter)
+    3. Dispatcher: còn slot (max_jobs) → claim_next() (công bằng giữa submitter)
+       → thread chạy process_chapter_concurrent với key pool dùng chung
+    4. Event chunk_done / chapter_done → cập nhật tiến độ + output của job
+    5. Hết quota mọi key → job chờ đến lần reset quota kế tiếp
+    """
+
+    def __init__(
+        self,
+        db_path="data/jobs.sqlite3",
+        max_jobs=2,
+        workers=3,
+        voice="Kore",
+        audio_check=True,
+        event_log="data/events.jsonl",
+        console=True,
+        subscribers=(),
+    ):
+        """
+        Args:
+            db_path: SQLite queue file
+            max_jobs: Chapters synthesized at the same time
+            workers: Default concurrent workers per job
+            voice: Default voice
+            audio_check: Validate every chunk (AudioChecker)
+            event_log: Append run events as JSONL (None = off)
+            console: Render events to stdout
+            subscribers: Extra event subscribers fn(payload) (e.g. the TUI dashboard)
+        """
+        self.queue = JobQueue(db_path)
+        self.max_jobs = max(1, max_jobs)
+        self.workers = workers
+        self.voice = voice
+        self.event_log = event_log
+        self.console = console
+        self.subscribers = list(subscribers)
+
+        self.api_key_manager = get_api_key_manager()
+        self.health_store = KeyHealthStore(path="data/key_health.json")
+        self.rotation_manager = self._new_rotation_manager()
+        self.audio_checker = AudioChecker(path="data/audio_checks.json") if audio_check else None
+
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._running = {}  # job id → job dict (with live progress)
+        self._results = {}  # job id → chapter_done payload
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._exhausted_until = None
+        self._dispatcher = None
+
+    def _new_rotation_manager(self):
+        return KeyRotationManager(api_keys=self.api_key_manager.keys, health_store=self.health_store)
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+
+    def start(self):
+        """Start the event log and the dispatcher"""
+        start_event_log(self.event_log, console=self.console, subscribers=[self._on_event, *self.subscribers])
+        if self.queue.requeued:
+            emit("jobs_requeued", jobs=self.queue.requeued)
+        self._dispatcher = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+        self._dispatcher.start()
+        self._wakeup.set()
+        return self
+
+    def stop(self):
+        """
+        Stop claiming jobs and persist engine state
+
+        Running chapters are abandoned; they are re-queued (and resume from
+        their checkpoint) the next time the server starts.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        self.health_store.save()
+        if self.audio_checker is not None:
+            self.audio_checker.save()
+        stop_event_log()
+        self.queue.close()
+
+    # ------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------
+
+    def submit(self, paths, submitter, options=None):
+        """
+        Queue chapters (directories expand to their *.md files)
+
+        Returns:
+            List of job dicts
+
+        Raises:
+            JobServerError: Bad path or option
+        """
+        options = dict(options or {})
+        for name, value in options.items():
+            expected = JOB_OPTIONS.get(name)
+            if expected is None:
+                raise JobServerError(400, f"Unknown option: {name}")
+            if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+                raise JobServerError(400, f"Invalid value for {name}: {value!r}")
+        if "workers" in options and not 1 <= options["workers"] <= 7:
+            raise JobServerError(400, "workers must be between 1 and 7")
+        if "chunks" in options:
+            chunks = options["chunks"]
+            if not chunks or not all(isinstance(c, int) and not isinstance(c, bool) and c >= 1 for c in chunks):
+                raise JobServerError(400, f"Invalid value for chunks: {chunks!r}")
+            if len(paths) != 1 or not Path(paths[0]).is_file():
+                raise JobServerError(400, "chunks needs exactly one chapter file")
+
+        missing = [p for p in paths if not Path(p).exists()]
+        if missing:
+            raise JobServerError(400, f"Not found: {', '.join(missing)}")
+        chapters = collect_chapters(paths)
+        if not chapters:
+            raise JobServerError(400, "No Markdown chapters found")
+
+        jobs = [self.queue.submit(submitter, Path(c).resolve(), options) for c in chapters]
+        emit("job_queued", submitter=submitter, jobs=[j["id"] for j in jobs])
+        self._wakeup.set()
+        return jobs
+
+    def job(self, job_id):
+        """Job dict with live progress (None if unknown)"""
+        job = self.queue.get(job_id)
+        if job is not None:
+            with self.lock:
+                live = self._running.get(job_id)
+                if live is not None:
+                    job.update(chunks_done=live["chunks_done"], chunks_total=live["chunks_total"])
+        return job
+
+    def status(self):
+        """Engine status for GET /status"""
+        with self.lock:
+            running = [dict(job) for job in self._running.values()]
+        return {
+            "uptime": time.time() - self.started,
+            "max_jobs": self.max_jobs,
+            "workers": self.workers,
+            "running": running,
+            "queue": self.queue.counts(),
+            "keys": self.rotation_manager.get_stats(per_key=True),
+            "quota_wait_until": self._exhausted_until,
+        }
+
+    # ------------------------------------------------------------
+    # Dispatching
+    # ------------------------------------------------------------
+
+    def _keys_left(self):
+        stats = self.rotation_manager.get_stats()
+        return stats["total"] - stats["removed"]
+
+    def _check_quota(self):
+        """
+        New quota day → fresh usage + key pool
+
+        Returns:
+            False while every key is exhausted (don't start jobs)
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        if self.api_key_manager.usage_data.get("date") != today and not self._running:
+            self.api_key_manager.reset_usage()
+            self.rotation_manager = self._new_rotation_manager()
+
+        if self._keys_left() > 0:
+            return True
+        if self._exhausted_until is None:
+            self._exhausted_until = next_quota_reset() + 60
+            emit("quota_wait", until=self._exhausted_until)
+        if time.time() < self._exhausted_until or self._running:
+            return False
+
+        self._exhausted_until = None
+        self.api_key_manager.reset_usage()
+        self.rotation_manager = self._new_rotation_manager()
+        return self._keys_left() > 0
+
+    def _dispatch(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(timeout=30)
+            self._wakeup.clear()
+            if self._stopping.is_set() or not self._check_quota():
+                continue
+
+            while len(self._running) < self.max_jobs and not self._stopping.is_set():
+                job = self.queue.claim_next()
+                if job is None:
+                    break
+                job.update(chunks_done=0, chunks_total=0)
+                with self.lock:
+                    self._running[job["id"]] = job
+                threading.Thread(target=self._run_job, args=(job,), name=f"job-{job['id']}", daemon=True).start()
+
+    def _run_job(self, job):
+        job_id = job["id"]
+        options = job["options"]
+        error = None
+        ok = False
+        try:
+            with event_context(job=job_id, submitter=job["submitter"]):
+                emit("job_start", path=job["path"], options=options)
+                if options.get("chunks"):
+                    # Only the chunks whose text changed → spliced into the finished chapter
+                    ok = redo_chunks(
+                        job["path"],
+                        options["chunks"],
+                        voice=options.get("voice", self.voice),
+                        rotation_manager=self.rotation_manager,
+                        audio_checker=self.audio_checker,
+                    )
+                else:
+                    ok = process_chapter_concurrent(
+                        None,
+                        job["path"],
+                        voice=options.get("voice", self.voice),
+                        max_workers=options.get("workers", self.workers),
+                        resume=True,  # re-queued jobs continue from their checkpoint
+                        rotation_manager=self.rotation_manager,
+                        chunk_mp3=options.get("chunk_mp3", False),
+                        target_lufs=options.get("normalize"),
+                        audio_checker=self.audio_checker,
+                        cue=options.get("cue", False),
+                    )
+        except Exception as e:
+            error = str(e)
+
+        flush_events()  # chapter_done of this job has been seen by _on_event
+        with self.lock:
+            result = self._results.pop(job_id, {})
+            self._running.pop(job_id, None)
+        if not ok and error is None:
+            error = result.get("error") or (
+                f"missing chunks {result['missing']}" if result.get("missing") else "chapter failed"
+            )
+
+        if not ok and self._keys_left() == 0 and not self._stopping.is_set():
+            # Quota ran out mid-chapter → not the job's fault, wait for the reset
+            self.queue.requeue(job_id, error="waiting for quota reset")
+            emit("job_requeued", job=job_id, reason="quota")
+        elif not self._stopping.is_set():
+            self.queue.finish(job_id, ok, output=result.get("output"), error=error)
+            emit("job_done", job=job_id, ok=ok, output=result.get("output"), error=error)
+        self.health_store.save()
+        self._wakeup.set()
+
+    def _on_event(self, payload):
+        """Event subscriber (listener thread): live progress per job"""
+        job_id = payload.get("job")
+        if job_id is None:
+            return
+        event = payload["event"]
+        with self.lock:
+            job = self._running.get(job_id)
+            if job is None:
+                return
+            if event == "chapter_start":
+                job["chunks_total"] = payload.get("chunks", 0)
+                job["chunks_done"] = payload.get("resumed", 0)
+            elif event == "chunk_done":
+                job["chunks_done"] = max(job["chunks_done"], payload.get("completed", job["chunks_done"] + 1))
+            elif event == "chapter_done":
+                self._results[job_id] = payload
+                if payload.get("ok"):
+                    job["chunks_done"] = job["chunks_total"]
+            else:
+                return
+            done, total = job["chunks_done"], job["chunks_total"]
+        self.queue.update_progress(job_id, done=done, total=total)
+
+
+# ============================================================
+# HTTP API
+# ============================================================
+
+
+def _handler_for(server):
+    from http.server import BaseHTTPRequestHandler
+
+    class JobAPIHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="application/json"):
+            data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            job_id = None
+            if len(parts) == 2 and parts[0] == "jobs":
+                if not parts[1].isdigit():
+                    raise JobServerError(404, f"Unknown job: {parts[1]}")
+                job_id = int(parts[1])
+            return parts, job_id, {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        def _handle(self, method):
+            try:
+                parts, job_id, query = self._route()
+                if method == "GET" and parts == ["status"]:
+                    return self._send(200, server.status())
+                if method == "GET" and parts == ["metrics"]:
+                    return self._send(200, REGISTRY.expose(), CONTENT_TYPE)
+                if method == "GET" and parts == ["jobs"]:
+                    status = query.get("status")
+                    if status and status not in STATUSES:
+                        raise JobServerError(400, f"Unknown status: {status}")
+                    jobs = server.queue.list(status=status, submitter=query.get("submitter"))
+                    return self._send(200, {"jobs": [server.job(j["id"]) or j for j in jobs]})
+                if method == "POST" and parts == ["jobs"]:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    try:
+                        body = json.loads(self.rfile.read(length) or b"{}")
+                    except ValueError:
+                        raise JobServerError(400, "Body must be JSON")
+                    paths = body.get("paths")
+                    if not isinstance(paths, list) or not paths:
+                        raise JobServerError(400, "paths must be a non-empty list")
+                    submitter = str(body.get("submitter") or "anonymous")
+                    jobs = server.submit([str(p) for p in paths], submitter, body.get("options"))
+                    return self._send(201, {"jobs": jobs})
+                if job_id is not None and method == "GET":
+                    job = server.job(job_id)
+                    if job is None:
+                        raise JobServerError(404, f"Unknown job: {job_id}")
+                    return self._send(200, job)
+                if job_id is not None and method == "DELETE":
+                    if server.queue.get(job_id) is None:
+                        raise JobServerError(404, f"Unknown job: {job_id}")
+                    if not server.queue.cancel(job_id):
+                        raise JobServerError(409, f"Job {job_id} is not queued")
+                    return self._send(200, server.queue.get(job_id))
+                raise JobServerError(404, f"No route: {method} {self.path}")
+            except JobServerError as e:
+                self._send(e.status, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def do_DELETE(self):
+            self._handle("DELETE")
+
+        def log_message(self, format, *args):
+            pass  # polling clients (TUI) would flood the console
+
+    return JobAPIHandler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)  # BaseHTTPRequestHandler expects (host, port)
+
+
+def serve_api(server, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    """
+    Bind the HTTP API (TCP or Unix socket)
+
+    Returns:
+        socketserver instance (call serve_forever())
+    """
+    handler = _handler_for(server)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = _UnixHTTPServer(socket_path, handler)
+        os.chmod(socket_path, 0o660)
+        return httpd
+
+    from http.server import ThreadingHTTPServer
+
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+# ============================================================
+# Client
+# ============================================================
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=10):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class JobClient:
+    """Client of the job server API (CLI, scripts, TUI)"""
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", socket_path=None, timeout=10):
+        """
+        Args:
+            url: Server base URL (TCP)
+            socket_path: Unix socket path (overrides url)
+            timeout: Seconds per request
+        """
+        self.url = urlparse(url)
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.socket_path:
+            return _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            data = json.dumps(body).encode("utf-8") if body is not None else None
+            headers = {"Content-Type": "application/json"} if data is not None else {}
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException) as e:
+            raise JobServerError(503, f"Job server unreachable: {e}")
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise JobServerError(response.status, payload.get("error", response.reason))
+        return payload
+
+    def submit(self, paths, submitter=None, **options):
+        """Queue files / directories (paths resolved here, not on the server)"""
+        body = {
+            "paths": [str(Path(p).resolve()) for p in paths],
+            "submitter": submitter or getpass.getuser(),
+            "options": {k: v for k, v in options.items() if v is not None},
+        }
+        return self._request("POST", "/jobs", body)["jobs"]
+
+    def jobs(self, status=None, submitter=None):
+        query = urlencode({k: v for k, v in {"status": status, "submitter": submitter}.items() if v})
+        return self._request("GET", "/jobs" + (f"?{query}" if query else ""))["jobs"]
+
+    def job(self, job_id):
+        return self._request("GET", f"/jobs/{quote(str(job_id))}")
+
+    def cancel(self, job_id):
+        return self._request("DELETE", f"/jobs/{quote(str(job_id))}")
+
+    def status(self):
+        return self._request("GET", "/status")
+
+
+def _print_jobs(jobs):
+    print(f"{'ID':>5}  {'Status':<10}{'Submitter':<14}{'Progress':>10}  Chapter")
+    for job in jobs:
+        progress = f"{job['chunks_done']}/{job['chunks_total']}" if job["chunks_total"] else "-"
+        print(f"{job['id']:>5}  {job['status']:<10}{job['submitter'][:13]:<14}{progress:>10}  {Path(job['path']).name}")
+        if job.get("error") and job["status"] in ("failed", "queued"):
+            print(f"{'':>7}⚠️  {job['error']}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Audiobook job server (daemon + client)")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}", help="Server URL (client commands)")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="Unix socket instead of TCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the job server")
+    serve.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    serve.add_argument("--db", default="data/jobs.sqlite3", help="Queue database (default: data/jobs.sqlite3)")
+    serve.add_argument("--max-jobs", type=int, default=2, help="Chapters synthesized at once (default: 2)")
+    serve.add_argument("--workers", type=int, default=3, help="Default workers per job (default: 3)")
+    serve.add_argument("--voice", default="Kore", help="Default voice (default: Kore)")
+    serve.add_argument("--no-audio-check", action="store_true", help="Disable chunk audio validation")
+    serve.add_argument("--event-log", default="data/events.jsonl", metavar="PATH", help="JSONL event log")
+    serve.add_argument("--quiet", action="store_true", help="Don't print run events")
+
+    submit = commands.add_parser("submit", help="Queue Markdown files / book directories")
+    submit.add_argument("paths", nargs="+", help="Files or directories")
+    submit.add_argument("--submitter", default=None, help="Name for fair sharing (default: login name)")
+    submit.add_argument("--voice", default=None, help="Voice name")
+    submit.add_argument("--workers", type=int, default=None, help="Concurrent workers for these jobs")
+    submit.add_argument("--chunk-mp3", action="store_true", default=None, help="Per-chunk MP3 (see audiobook_generator)")
+    submit.add_argument("--normalize", type=float, default=None, metavar="LUFS", help="Loudness target")
+    submit.add_argument("--cue", action="store_true", default=None, help="Also write CUE sheets")
+
+    jobs = commands.add_parser("jobs", help="List jobs")
+    jobs.add_argument("--status", choices=STATUSES, default=None)
+    jobs.add_argument("--submitter", default=None)
+
+    commands.add_parser("status", help="Engine status")
+    cancel = commands.add_parser("cancel", help="Cancel a queued job")
+    cancel.add_argument("job_id", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = JobServer(
+            db_path=args.db, max_jobs=args.max_jobs, workers=args.workers, voice=args.voice,
+            audio_check=not args.no_audio_check, event_log=args.event_log, console=not args.quiet,
+        ).start()
+        httpd = serve_api(server, host=args.host, port=args.port, socket_path=args.socket)
+        where = args.socket or f"http://{args.host}:{args.port}"
+        print(f"🖥️  Job server listening on {where} ({args.max_jobs} jobs × {args.workers} workers)")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping (running chapters resume on next start)")
+        finally:
+            httpd.server_close()
+            server.stop()
+            if args.socket and os.path.exists(args.socket):
+                os.unlink(args.socket)
+        return
+
+    client = JobClient(url=args.url, socket_path=args.socket)
+    try:
+        if args.command == "submit":
+            queued = client.submit(
+                args.paths, submitter=args.submitter, voice=args.voice, workers=args.workers,
+                chunk_mp3=args.chunk_mp3, normalize=args.normalize, cue=args.cue,
+            )
+            print(f"📥 Queued {len(queued)} jobs")
+            _print_jobs(queued)
+        elif args.command == "jobs":
+            _print_jobs(client.jobs(status=args.status, submitter=args.submitter))
+        elif args.command == "status":
+            status = client.status()
+            queue = ", ".join(f"{k} {v}" for k, v in status["queue"].items())
+            keys = status["keys"]
+            print(f"⏱️  Uptime: {status['uptime'] / 60:.0f} min | Slots: {len(status['running'])}/{status['max_jobs']}")
+            print(f"📋 Queue: {queue}")
+            print(
+                f"🔑 Keys: {keys['available']} available, {keys['in_use']} in use, "
+                f"{keys['cooldown']} cooldown, {keys['removed']} removed"
+            )
+            if status["quota_wait_until"]:
+                print(f"😴 Waiting for quota reset: {datetime.fromtimestamp(status['quota_wait_until']):%H:%M}")
+            if status["running"]:
+                _print_jobs(status["running"])
+        elif args.command == "cancel":
+            job = client.cancel(args.job_id)
+            print(f"🚫 Cancelled job {job['id']}: {Path(job['path']).name}")
+    except JobServerError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+key_health.py - Persistent Cross-run API Key Health
+
+Features:
+- Remembers QUOTA_EXHAUSTED keys until the provider's daily quota reset
+- Tracks recent soft-fail rate and request latency per key (EWMA)
+- Persists to JSON (atomic rename) so the next run / next chapter
+  starts with only healthy keys, ordered by expected success
+- Thread-safe, with coalesced writes for the hot success path
+
+Keys are stored by short SHA256 hash (same as APIKeyManager.hash_key),
+never in plain text.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Gemini API daily quotas reset at midnight Pacific Time
+QUOTA_RESET_TZ = "America/Los_Angeles"
+
+
+def hash_key(key):
+    """Generate short hash for key identification"""
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+
+def next_quota_reset(now=None):
+    """
+    Next daily quota reset (midnight Pacific Time) as a UNIX timestamp
+
+    Args:
+        now: Current UNIX timestamp (default: time.time())
+    """
+    now = time.time() if now is None else now
+
+    try:
+        from zoneinfo import ZoneInfo
+
+        tz = ZoneInfo(QUOTA_RESET_TZ)
+    except Exception:
+        # No tz database → fixed PST offset (reset may be 1h early in summer)
+        tz = timezone(timedelta(hours=-8))
+
+    local_now = datetime.fromtimestamp(now, tz)
+    next_midnight = (local_now + timedelta(days=1)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return next_midnight.timestamp()
+
+
+class KeyHealthStore:
+    """
+    Lưu sức khoẻ của từng API key qua nhiều lần chạy
+
+    Workflow:
+    1. Key QUOTA_EXHAUSTED → exhausted_until = lần reset quota kế tiếp (ghi ngay)
+    2. Soft-fail / overload → tăng soft_fail_rate (EWMA)
+    3. Success → giảm soft_fail_rate, cập nhật latency EWMA
+    4. Run mới → healthy_keys() bỏ key còn exhausted, sắp xếp theo khả năng thành công
+    """
+
+    def __init__(self, path="data/key_health.json", alpha=0.2, save_interval=5.0):
+        """
+        Args:
+            path: JSON file path
+            alpha: EWMA smoothing factor (higher = react faster)
+            save_interval: Min seconds between non-critical writes
+        """
+        self.path = Path(path)
+        self.alpha = alpha
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.data = self._load()
+        self._last_save = 0.0
+        self._dirty = False
+
+    # ------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------
+
+    def _load(self):
+        if not self.path.exists():
+            return {"keys": {}}
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Warning: Failed to load key health: {e}")
+            return {"keys": {}}
+
+        data.setdefault("keys", {})
+        return data
+
+    def _save_locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+    def _maybe_save_locked(self, force=False):
+        self._dirty = True
+        if force or time.monotonic() - self._last_save >= self.save_interval:
+            self._save_locked()
+
+    def save(self):
+        """Flush pending changes to disk"""
+        with self.lock:
+            if self._dirty:
+                self._save_locked()
+
+    def _entry(self, key):
+        return self.data["keys"].setdefault(
+            hash_key(key),
+            {
+                "exhausted_until": None,
+                "soft_fail_rate": 0.0,
+                "latency_ewma": None,
+                "successes": 0,
+                "failures": 0,
+                "last_update": None,
+            },
+        )
+
+    # ------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------
+
+    def record_success(self, key, latency=None):
+        """Record a successful request (latency in seconds)"""
+        with self.lock:
+            entry = self._entry(key)
+            entry["successes"] += 1
+            entry["soft_fail_rate"] *= 1 - self.alpha
+            if latency is not None:
+                previous = entry["latency_ewma"]
+                entry["latency_ewma"] = (
+                    latency
+                    if previous is None
+                    else (1 - self.alpha) * previous + self.alpha * latency
+                )
+            entry["last_update"] = datetime.now().isoformat()
+            self._maybe_save_locked()
+
+    def record_soft_fail(self, key):
+        """Record a soft-fail / rate limit / overload outcome"""
+        with self.lock:
+            entry = self._entry(key)
+            entry["failures"] += 1
+            entry["soft_fail_rate"] = (1 - self.alpha) * entry["soft_fail_rate"] + self.alpha
+            entry["last_update"] = datetime.now().isoformat()
+            self._maybe_save_locked()
+
+    def record_exhausted(self, key, until=None):
+        """Mark key quota-exhausted until the next reset (saved immediately)"""
+        with self.lock:
+            entry = self._entry(key)
+            entry["exhausted_until"] = until or next_quota_reset()
+            entry["failures"] += 1
+            entry["last_update"] = datetime.now().isoformat()
+            self._maybe_save_locked(force=True)
+
+    # ------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------
+
+    def get(self, key):
+        """Health entry dict for a key (empty dict if never seen)"""
+        with self.lock:
+            return dict(self.data["keys"].get(hash_key(key), {}))
+
+    def is_exhausted(self, key, now=None):
+        """True if key is still within a persisted exhaustion window"""
+        until = self.get(key).get("exhausted_until")
+        return until is not None and (time.time() if now is None else now) < until
+
+    def expected_success(self, key):
+        """Probability that the next request on this key succeeds"""
+        return 1.0 - self.get(key).get("soft_fail_rate", 0.0)
+
+    def healthy_keys(self, keys, now=None):
+        """
+        Filter out exhausted keys and order the rest by expected success
+
+        Args:
+            keys: List of API keys
+
+        Returns:
+            Tuple (healthy_keys: list, exhausted_keys: list)
+        """
+        healthy = []
+        exhausted = []
+
+        for key in keys:
+            if self.is_exhausted(key, now):
+                exhausted.append(key)
+            else:
+                healthy.append(key)
+
+        def sort_key(key):
+            entry = self.get(key)
+            latency = entry.get("latency_ewma")
+            return (
+                round(entry.get("soft_fail_rate", 0.0), 2),
+                latency if latency is not None else 0.0,
+            )
+
+        # Stable sort → keys with equal health keep their .env order
+        healthy.sort(key=sort_key)
+        return healthy, exhausted
+
+    def request_overhead(self, keys=None, min_samples=20, default=1.1):
+        """
+        Observed requests spent per successful chunk (≥ 1.0)
+
+        Uses cumulative success/failure counts when there is enough history,
+        otherwise falls back to `default`.
+
+        Returns:
+            Tuple (overhead_factor: float, samples: int)
+        """
+        with self.lock:
+            entries = (
+                [self.data["keys"].get(hash_key(k), {}) for k in keys]
+                if keys is not None
+                else list(self.data["keys"].values())
+            )
+
+        successes = sum(e.get("successes", 0) for e in entries)
+        failures = sum(e.get("failures", 0) for e in entries)
+        samples = successes + failures
+
+        if samples < min_samples or successes == 0:
+            return default, samples
+        return samples / successes, samples
+
+    def mean_latency(self, keys=None, default=20.0):
+        """Average observed request latency in seconds (default if no history)"""
+        with self.lock:
+            entries = (
+                [self.data["keys"].get(hash_key(k), {}) for k in keys]
+                if keys is not None
+                else list(self.data["keys"].values())
+            )
+
+        latencies = [e["latency_ewma"] for e in entries if e.get("latency_ewma")]
+        return sum(latencies) / len(latencies) if latencies else default
@@ -7,13 +7,22 @@ Features:
 - Thread-safe for concurrent processing
 - Auto-refresh cooldown keys
 - Remove quota-exhausted keys
+- More requesters than keys: get_next_key() blocks until a key is returned
+- Optional persistent key health (skip keys exhausted in earlier runs)
+- Prometheus metrics: key wait time, cooldowns, removals, keys per state
 """
 
 import time
-from queue import Queue
+from queue import Empty, Queue
 from threading import Lock
 from typing import List, Optional
 
+from .events import emit
+from .key_health import hash_key
+from .metrics import KEY_COOLDOWNS, KEY_REMOVALS, KEY_WAIT, KEYS
+from .profiler import PROFILER
+from .tracer import TRACER
+
 
 class KeyRotationManager:
     """
@@ -24,22 +33,35 @@ class KeyRotationManager:
     2. Khi key fail → cooldown_dict (30s)
     3. Keys hết cooldown tự động quay về available_queue
     4. Quota exhausted keys bị remove hẳn
+    5. Có health_store → key exhausted từ run trước bị bỏ qua đến lần reset quota
+    6. Mọi key đang được dùng → get_next_key() chờ key được trả về
     """
 
-    def __init__(self, api_keys: List[str]):
+    def __init__(self, api_keys: List[str], health_store=None):
         """
         Args:
             api_keys: List các API keys
+            health_store: Optional KeyHealthStore (persisted across runs)
         """
         self.available_queue = Queue()
         self.cooldown_dict = {}  # {key: cooldown_until_timestamp}
         self.removed_keys = set()  # Keys đã bị remove (quota exhausted)
         self.lock = Lock()
+        self.health_store = health_store
+        self.total_keys = len(api_keys)
+        self.api_keys = list(api_keys)  # configured order (per-key stats)
+
+        # Healthy keys first (best expected success), exhausted keys removed
+        if health_store is not None:
+            api_keys, exhausted_keys = health_store.healthy_keys(api_keys)
+            self.removed_keys.update(exhausted_keys)
 
         # Initialize: All keys vào available queue
         for key in api_keys:
             self.available_queue.put(key)
 
+        KEYS.set_function(self._state_counts)
+
     def get_next_key(self) -> Optional[str]:
         """
         Lấy key tiếp theo từ available queue
@@ -47,17 +69,37 @@ class KeyRotationManager:
         Returns:
             API key string, hoặc None nếu tất cả keys đều cooldown
         """
-        with self.lock:
-            # Refresh cooldown keys trước
-            self._refresh_cooldown_keys()
+        started = time.perf_counter()
+        with PROFILER.stage("key_wait"):
+            while True:
+                with self.lock:
+                    # Refresh cooldown keys trước
+                    self._refresh_cooldown_keys()
 
-            # Lấy key từ queue
-            if not self.available_queue.empty():
-                return self.available_queue.get()
+                    # Lấy key từ queue
+                    if not self.available_queue.empty():
+                        key = self.available_queue.get()
+                        break
+                    if self.cooldown_dict:
+                        # Edge case: Tất cả keys cooldown
+                        # → Tìm key có cooldown time ngắn nhất
+                        key = self._wait_for_shortest_cooldown()
+                        break
+                    if self._in_use() == 0:
+                        key = None  # Không còn key nào (tất cả bị remove)
+                        break
 
-            # Edge case: Tất cả keys cooldown
-            # → Tìm key có cooldown time ngắn nhất
-            return self._wait_for_shortest_cooldown()
+                # Every key is held by another request (more workers / jobs
+                # than keys) → wait outside the lock for one to come back
+                try:
+                    key = self.available_queue.get(timeout=1.0)
+                    break
+                except Empty:
+                    continue
+
+        # Includes time blocked behind another thread's cooldown wait
+        KEY_WAIT.observe(time.perf_counter() - started)
+        return key
 
     def mark_key_failed(self, key: str, cooldown_seconds: int = 30):
         """
@@ -74,12 +116,18 @@ class KeyRotationManager:
             cooldown_until = time.time() + cooldown_seconds
             self.cooldown_dict[key] = cooldown_until
 
-    def remove_key(self, key: str):
+        KEY_COOLDOWNS.inc(key=hash_key(key))
+        if self.health_store is not None:
+            self.health_store.record_soft_fail(key)
+
+    def remove_key(self, key: str, persist: bool = False):
         """
         Remove key vĩnh viễn (quota exhausted)
 
         Args:
             key: API key cần remove
+            persist: Daily quota confirmed → also skip the key in later runs
+                     until the quota reset (health store)
         """
         with self.lock:
             self.removed_keys.add(key)
@@ -88,12 +136,18 @@ class KeyRotationManager:
             if key in self.cooldown_dict:
                 del self.cooldown_dict[key]
 
-    def return_key(self, key: str):
+        KEY_REMOVALS.inc(key=hash_key(key))
+        # Persist → run sau không gửi request tới key này trước khi reset quota
+        if persist and self.health_store is not None:
+            self.health_store.record_exhausted(key)
+
+    def return_key(self, key: str, latency: Optional[float] = None):
         """
         Trả key về available queue (khi success)
 
         Args:
             key: API key cần return
+            latency: Request latency in seconds (recorded as success if given)
         """
         with self.lock:
             if key in self.removed_keys:
@@ -101,6 +155,9 @@ class KeyRotationManager:
 
             self.available_queue.put(key)
 
+        if latency is not None and self.health_store is not None:
+            self.health_store.record_success(key, latency)
+
     def _refresh_cooldown_keys(self):
         """
         Internal: Move keys hết cooldown về available queue
@@ -139,28 +196,73 @@ class KeyRotationManager:
         wait_time = max(0, cooldown_until - current_time)
 
         if wait_time > 0:
-            print(
-                f"⏳ All keys in cooldown, waiting {wait_time:.1f}s for next available key..."
-            )
-            time.sleep(wait_time)
+            emit("cooldown_wait", seconds=wait_time, key=hash_key(key))
+            with TRACER.span("cooldown_sleep", key=hash_key(key), seconds=round(wait_time, 2)):
+                time.sleep(wait_time)
 
         # Move key về available
         del self.cooldown_dict[key]
         return key
 
-    def get_stats(self) -> dict:
+    def _in_use(self) -> int:
+        """Keys handed out and not yet returned / cooled down / removed (caller holds lock)"""
+        return max(
+            0, self.total_keys - self.available_queue.qsize() - len(self.cooldown_dict) - len(self.removed_keys)
+        )
+
+    def _state_counts(self) -> dict:
+        """Keys per rotation state (read by the tts_keys gauge on export)"""
+        stats = self.get_stats()
+        return {(state,): stats[state] for state in ("available", "in_use", "cooldown", "removed")}
+
+    def get_stats(self, per_key: bool = False) -> dict:
         """
         Get statistics về key rotation
 
+        Args:
+            per_key: Also list every key (hash, state, cooldown left, health)
+
         Returns:
             Dict with stats
         """
         with self.lock:
-            return {
+            stats = {
                 "available": self.available_queue.qsize(),
+                "in_use": self._in_use(),
                 "cooldown": len(self.cooldown_dict),
                 "removed": len(self.removed_keys),
-                "total": self.available_queue.qsize()
-                + len(self.cooldown_dict)
-                + len(self.removed_keys),
+                "total": self.total_keys,
             }
+            if not per_key:
+                return stats
+
+            now = time.time()
+            with self.available_queue.mutex:
+                available = set(self.available_queue.queue)
+            keys = []
+            for index, key in enumerate(self.api_keys, 1):
+                if key in self.removed_keys:
+                    state = "removed"
+                elif key in self.cooldown_dict:
+                    state = "cooldown"
+                elif key in available:
+                    state = "available"
+                else:
+                    state = "in_use"
+                keys.append({
+                    "index": index,
+                    "key": hash_key(key),
+                    "state": state,
+                    "cooldown_left": max(0.0, self.cooldown_dict.get(key, now) - now),
+                })
+
+        # Health store has its own lock → read outside ours
+        if self.health_store is not None:
+            for entry, key in zip(keys, self.api_keys):
+                health = self.health_store.get(key)
+                entry.update({
+                    field: health.get(field)
+                    for field in ("successes", "failures", "soft_fail_rate", "latency_ewma", "exhausted_until")
+                })
+        stats["keys"] = keys
+        return stats
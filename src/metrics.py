@@ -0,0 +1,467 @@
+"""
+metrics.py - Prometheus-compatible Run Metrics
+
+Features:
+- Counter / Gauge / Histogram with labels (thread-safe, stdlib only)
+- Prometheus text exposition format (version 0.0.4)
+- write_textfile(): atomic .prom file for node_exporter's textfile collector
+- MetricsExporter: periodic textfile writes and/or a local HTTP /metrics
+  endpoint served from a daemon thread
+- Module-level REGISTRY with the TTS pipeline metrics: request latency,
+  bytes / audio seconds per request, per-key outcomes (success, soft-fail,
+  429, overload), queue waits, assembly and encode durations
+
+Keys are labelled by short SHA256 hash (same as KeyHealthStore), never in
+plain text. Recording is a dict update under a lock, so metrics are always
+collected; exporting is opt-in (--metrics-file / --metrics-port).
+"""
+
+import math
+import os
+import threading
+from pathlib import Path
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds (+Inf is implicit)
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120)
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2 ** n * 1024 for n in range(5, 14))  # 32 KB → 8 MB
+AUDIO_SECONDS_BUCKETS = (5, 15, 30, 45, 60, 90, 120, 180, 240, 300)
+DURATION_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+# classify_error() result → request outcome label
+ERROR_OUTCOMES = {
+    "QUOTA_EXHAUSTED": "quota",
+    "RATE_LIMIT": "rate_limit",
+    "MODEL_OVERLOAD": "overload",
+    "UNKNOWN": "error",
+}
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape_label(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base: one metric family, values keyed by label tuple"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames) or any(n not in labels for n in self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self):
+        with self.lock:
+            self._values.clear()
+
+    def samples(self):
+        """Yield (suffix, label_values, extra_labels, value)"""
+        raise NotImplementedError
+
+    def expose(self):
+        """Text exposition lines of this family"""
+        documentation = self.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [f"# HELP {self.name} {documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            yield "", values, (), value
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (set directly or read from a callback)"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, function):
+        """
+        Read the gauge from function() at exposition time
+
+        Args:
+            function: Returns a number (no labels) or {label_values_tuple: value}
+        """
+        with self.lock:
+            self._function = function
+
+    def samples(self):
+        with self.lock:
+            function = self._function
+            items = dict(self._values)
+
+        if function is not None:
+            try:
+                current = function()
+            except Exception:
+                current = {}
+            items.update(current if isinstance(current, dict) else {(): current})
+
+        for values, value in sorted(items.items()):
+            yield "", tuple(str(v) for v in values), (), value
+
+
+class Histogram(_Metric):
+    """Bucketed observations (cumulative buckets + _sum + _count on export)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+
+        with self.lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        with self.lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def samples(self):
+        with self.lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield "_bucket", values, (("le", _format_value(bound)),), cumulative
+            yield "_sum", values, (), total
+            yield "_count", values, (), count
+
+
+class MetricsRegistry:
+    """Tập hợp metric families, xuất theo Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self.lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        with self.lock:
+            return self._metrics.get(name)
+
+    def clear(self):
+        """Reset every value (families stay registered)"""
+        with self.lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def expose(self):
+        """
+        Render every family in Prometheus text exposition format
+
+        Returns:
+            str (ends with a newline)
+        """
+        with self.lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ------------------------------------------------------------
+# TTS pipeline metrics
+# ------------------------------------------------------------
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "tts_request_duration_seconds", "Gemini TTS request latency by outcome", ("outcome",),
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = REGISTRY.counter(
+    "tts_requests_total",
+    "TTS requests by key hash and outcome (success, soft_fail, rate_limit, overload, quota, error)",
+    ("key", "outcome"),
+)
+RESPONSE_BYTES = REGISTRY.histogram(
+    "tts_response_bytes", "PCM bytes returned per successful request", buckets=BYTES_BUCKETS
+)
+RESPONSE_AUDIO_SECONDS = REGISTRY.histogram(
+    "tts_response_audio_seconds", "Audio seconds returned per successful request",
+    buckets=AUDIO_SECONDS_BUCKETS,
+)
+SUSPECT_AUDIO = REGISTRY.counter(
+    "tts_suspect_audio_total", "Responses rejected by the chunk audio check", ("reason",)
+)
+CHUNKS = REGISTRY.counter("tts_chunks_total", "Chunks finished by status (done, failed)", ("status",))
+CHUNK_QUEUE_WAIT = REGISTRY.histogram(
+    "tts_chunk_queue_wait_seconds", "Time a chunk waited for a worker thread", buckets=WAIT_BUCKETS
+)
+KEY_WAIT = REGISTRY.histogram(
+    "tts_key_wait_seconds", "Time spent waiting for an available API key", buckets=WAIT_BUCKETS
+)
+KEY_COOLDOWNS = REGISTRY.counter(
+    "tts_key_cooldowns_total", "Keys put into cooldown (soft-fail, 429, overload)", ("key",)
+)
+KEY_REMOVALS = REGISTRY.counter(
+    "tts_key_removals_total", "Keys removed for the day (quota exhausted)", ("key",)
+)
+KEYS = REGISTRY.gauge("tts_keys", "API keys by rotation state (available, in_use, cooldown, removed)", ("state",))
+KEY_REQUESTS_TODAY = REGISTRY.gauge(
+    "tts_key_requests_today", "Requests logged per key since the last daily reset", ("key",)
+)
+ASSEMBLY_SECONDS = REGISTRY.histogram(
+    "tts_assembly_duration_seconds",
+    "Chapter assembly wall time by mode (stream, frames, mastered, wav)", ("mode",),
+    buckets=DURATION_BUCKETS,
+)
+ENCODE_SECONDS = REGISTRY.histogram(
+    "tts_encode_duration_seconds", "Time spent encoding a chapter by backend", ("backend",),
+    buckets=DURATION_BUCKETS,
+)
+ENCODE_QUEUE_DEPTH = REGISTRY.gauge(
+    "tts_encode_queue_depth", "Chapters queued or running in the background encoder"
+)
+
+
+def record_request(key_hash, outcome, seconds, pcm_bytes=0, audio_seconds=0.0):
+    """
+    Record one TTS request
+
+    Args:
+        key_hash: Short hash of the key used
+        outcome: success / soft_fail / rate_limit / overload / quota / error
+        seconds: Request latency
+        pcm_bytes: PCM bytes returned (success only)
+        audio_seconds: Audio duration returned (success only)
+    """
+    REQUEST_SECONDS.observe(seconds, outcome=outcome)
+    REQUESTS.inc(key=key_hash, outcome=outcome)
+    if outcome == "success":
+        RESPONSE_BYTES.observe(pcm_bytes)
+        RESPONSE_AUDIO_SECONDS.observe(audio_seconds)
+
+
+def record_assembly(result):
+    """
+    Record a finished chapter assembly (finalize_chapter_audio result)
+
+    Runs in the parent process: finalize may run in an encoder worker,
+    whose registry is never exported.
+    """
+    if not isinstance(result, dict) or result.get("seconds") is None:
+        return
+    ASSEMBLY_SECONDS.observe(result["seconds"], mode=result["mode"])
+    if result.get("encode") is not None:
+        ENCODE_SECONDS.observe(result["encode"]["seconds"], backend=result["encode"]["backend"])
+
+
+# ------------------------------------------------------------
+# Export
+# ------------------------------------------------------------
+
+def write_textfile(path, registry=REGISTRY):
+    """
+    Write the registry to a .prom file atomically (node_exporter textfile
+    collector reads it at any moment, so never a half-written file)
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.expose())
+    os.replace(tmp_path, path)
+
+
+def _handler_for(registry):
+    from http.server import BaseHTTPRequestHandler  # only with --metrics-port
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.expose().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would flood the console
+
+    return MetricsHandler
+
+
+class MetricsExporter:
+    """
+    Xuất metrics ra textfile và/hoặc HTTP endpoint
+
+    Workflow:
+    1. start() → HTTP server (daemon thread) + thread ghi textfile mỗi `interval` giây
+    2. Prometheus scrape http://host:port/metrics, hoặc node_exporter đọc file .prom
+    3. close() → ghi textfile lần cuối (giá trị cuối run), tắt server
+    """
+
+    def __init__(self, textfile=None, port=None, host="127.0.0.1", interval=15.0, registry=REGISTRY):
+        """
+        Args:
+            textfile: .prom path rewritten every `interval` seconds (None = off)
+            port: Serve /metrics on this port (None = off, 0 = any free port)
+            host: Bind address for the HTTP endpoint
+            interval: Seconds between textfile writes
+            registry: MetricsRegistry to export
+        """
+        self.textfile = Path(textfile) if textfile else None
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.registry = registry
+        self._server = None
+        self._threads = []
+        self._stop = threading.Event()
+
+    @property
+    def url(self):
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        """Start the HTTP endpoint and the textfile writer"""
+        if self.port is not None:
+            from http.server import ThreadingHTTPServer
+
+            self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self.registry))
+            self._server.daemon_threads = True
+            thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if self.textfile is not None:
+            write_textfile(self.textfile, self.registry)
+            thread = threading.Thread(target=self._write_loop, name="metrics-textfile", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_textfile(self.textfile, self.registry)
+            except OSError as e:
+                print(f"⚠️  Warning: Failed to write metrics file: {e}")
+
+    def close(self):
+        """Final textfile write, stop the HTTP endpoint"""
+        self._stop.set()
+        for thread in self._threads:
+            if thread.name == "metrics-textfile":
+                thread.join(timeout=5)
+        if self.textfile is not None:
+            try:
+                write_textfile(self.textfile, self.registry)
+            except OSError as e:
+                print(f"⚠️  Warning: Failed to write metrics file: {e}")
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,385 @@
+"""
+mp3_frames.py - MPEG Audio Frame Utilities
+
+Features:
+- Parse MPEG-1/2/2.5 Layer III frame headers
+- Iterate audio frames (skips ID3v2 tags and Xing/Info/VBRI tag frames)
+- Frame-level concatenation of independently encoded MP3 parts
+- Writes a Xing/Info + LAME tag frame (frame count, byte count, seek TOC,
+  encoder delay / padding) so players report the right duration, seek
+  correctly and trim the encoder's priming / padding samples
+- mp3_stream_info(): exact decoded length of an MP3 file from its tag
+  frame (falls back to counting frames)
+
+Every part must be a complete LAME stream (flushed encoder): its first
+frame never borrows from the previous part's bit reservoir, so parts can
+be joined by plain byte concatenation.
+
+The join is not gapless between parts: one tag frame can only trim the
+priming of the first part and the padding of the last. Every interior
+boundary keeps its part's encoder delay and padding as silence.
+"""
+
+import os
+import struct
+from pathlib import Path
+
+# Layer III bitrates (kbps) by bitrate index
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+
+# Sample rates by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+XING_FLAGS = 0x0F  # frames + bytes + TOC + quality present
+LAME_TAG_VERSION = b"LAME3.100"
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0):
+    """CRC-16/ARC as used by the LAME tag CRC"""
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC16_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def parse_frame_header(data, offset=0):
+    """
+    Parse a Layer III frame header
+
+    Returns:
+        Dict (version, bitrate, sample_rate, channels, padding,
+        samples_per_frame, side_info_size, frame_length) or None
+    """
+    if offset + 4 > len(data):
+        return None
+
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # reserved, not Layer III, free format or bad rate
+
+    mpeg1 = version == 3
+    bitrate = (_BITRATES_V1 if mpeg1 else _BITRATES_V2)[bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if (b3 >> 6) & 0x03 == 3 else 2
+    samples_per_frame = 1152 if mpeg1 else 576
+
+    if mpeg1:
+        side_info_size = 17 if channels == 1 else 32
+    else:
+        side_info_size = 9 if channels == 1 else 17
+
+    return {
+        "version": version,
+        "bitrate_index": bitrate_index,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "padding": padding,
+        "samples_per_frame": samples_per_frame,
+        "side_info_size": side_info_size,
+        "frame_length": samples_per_frame // 8 * bitrate // sample_rate + padding,
+    }
+
+
+def _id3v2_size(data):
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        return 10 + size + (10 if data[5] & 0x10 else 0)  # footer flag
+    return 0
+
+
+def _is_tag_frame(data, offset, header):
+    tag_offset = offset + 4 + header["side_info_size"]
+    return (
+        data[tag_offset:tag_offset + 4] in (b"Xing", b"Info")
+        or data[offset + 36:offset + 40] == b"VBRI"
+    )
+
+
+def iter_frames(data):
+    """
+    Yield (offset, header) for every audio frame in an MP3 byte string
+
+    ID3v2 tags, Xing/Info/VBRI tag frames and trailing garbage (e.g. ID3v1)
+    are skipped.
+    """
+    offset = _id3v2_size(data)
+    first = True
+
+    while offset + 4 <= len(data):
+        header = parse_frame_header(data, offset)
+        if header is None or offset + header["frame_length"] > len(data):
+            if header is None and first:
+                offset += 1  # resync (leading junk)
+                continue
+            break
+
+        if not (first and _is_tag_frame(data, offset, header)):
+            yield offset, header
+        first = False
+        offset += header["frame_length"]
+
+
+def audio_frames(data):
+    """Return only the audio frames of an MP3 byte string (tags stripped)"""
+    frames = list(iter_frames(data))
+    if not frames:
+        return b""
+    start = frames[0][0]
+    end = frames[-1][0] + frames[-1][1]["frame_length"]
+    if end - start == sum(h["frame_length"] for _, h in frames):
+        return bytes(data[start:end])  # contiguous → single slice
+    return b"".join(bytes(data[o:o + h["frame_length"]]) for o, h in frames)
+
+
+def count_frames(data):
+    """Number of audio frames in an MP3 byte string"""
+    return sum(1 for _ in iter_frames(data))
+
+
+def _read_tag_frame(data, offset, header):
+    """Frame count + encoder delay / padding from a Xing/Info (+ LAME) tag"""
+    pos = offset + 4 + header["side_info_size"]
+    if data[pos:pos + 4] not in (b"Xing", b"Info"):
+        return None
+
+    flags = struct.unpack_from(">I", data, pos + 4)[0]
+    pos += 8
+    frames = None
+    if flags & 0x01:
+        frames = struct.unpack_from(">I", data, pos)[0]
+        pos += 4
+    pos += (4 if flags & 0x02 else 0) + (100 if flags & 0x04 else 0) + (4 if flags & 0x08 else 0)
+
+    delay = padding = 0
+    if pos + 24 <= offset + header["frame_length"] and data[pos:pos + 4] in (b"LAME", b"Lavf", b"Lavc"):
+        b0, b1, b2 = data[pos + 21:pos + 24]
+        delay = (b0 << 4) | (b1 >> 4)
+        padding = ((b1 & 0x0F) << 8) | b2
+
+    return {"frames": frames, "delay": delay, "padding": padding}
+
+
+def mp3_stream_info(path):
+    """
+    Sample rate, channels and decoded length of an MP3 file
+
+    Uses the Xing/Info frame count and LAME delay / padding when present
+    (what a gapless decoder outputs); otherwise every frame is counted.
+
+    Returns:
+        Dict with sample_rate, channels, samples
+
+    Raises:
+        ValueError: If the file contains no MPEG Layer III frames
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = _id3v2_size(data)
+    while offset + 4 <= len(data) and parse_frame_header(data, offset) is None:
+        offset += 1  # leading junk
+    header = parse_frame_header(data, offset)
+    if header is None:
+        raise ValueError(f"No MP3 frames in {path}")
+
+    tag = _read_tag_frame(data, offset, header)
+    if tag is not None and tag["frames"] is not None:
+        samples = tag["frames"] * header["samples_per_frame"] - tag["delay"] - tag["padding"]
+    else:
+        samples = count_frames(data) * header["samples_per_frame"]
+
+    return {
+        "sample_rate": header["sample_rate"],
+        "channels": header["channels"],
+        "samples": max(0, samples),
+    }
+
+
+def _tag_frame_header(template):
+    """Header bytes for the tag frame: same stream params, no CRC, no padding"""
+    bitrates = _BITRATES_V1 if template["version"] == 3 else _BITRATES_V2
+    needed = 4 + template["side_info_size"] + 120 + 36
+
+    bitrate_index = template["bitrate_index"]
+    while True:
+        length = template["samples_per_frame"] // 8 * bitrates[bitrate_index] * 1000 // template["sample_rate"]
+        if length >= needed or bitrate_index == 14:
+            break
+        bitrate_index += 1
+
+    rate_index = _SAMPLE_RATES[template["version"]].index(template["sample_rate"])
+    b1 = 0xE0 | (template["version"] << 3) | (1 << 1) | 0x01  # Layer III, no CRC
+    b2 = (bitrate_index << 4) | (rate_index << 2)
+    b3 = 0xC0 if template["channels"] == 1 else 0x00
+    return bytes((0xFF, b1, b2, b3)), length
+
+
+def build_tag_frame(template, frame_offsets, audio_bytes, encoder_delay, padding, cbr=True):
+    """
+    Build a Xing/Info frame with a LAME tag
+
+    Args:
+        template: Parsed header of the first audio frame
+        frame_offsets: Offset of each audio frame relative to the first one
+        audio_bytes: Total bytes of audio frames
+        encoder_delay: Priming samples at the start (12 bits)
+        padding: Padding samples at the end (12 bits)
+        cbr: Write "Info" (constant bitrate) instead of "Xing"
+
+    Returns:
+        bytes: Complete tag frame
+    """
+    header, length = _tag_frame_header(template)
+    total_bytes = length + audio_bytes
+    frames = len(frame_offsets)
+
+    # Seek table: byte position (0-255 of file size) at each 1% of duration
+    toc = bytearray(100)
+    for i in range(100):
+        if frames:
+            position = length + frame_offsets[min(frames - 1, i * frames // 100)]
+            toc[i] = min(255, position * 256 // total_bytes)
+
+    frame = bytearray(length)
+    frame[0:4] = header
+    pos = 4 + template["side_info_size"]
+
+    frame[pos:pos + 4] = b"Info" if cbr else b"Xing"
+    struct.pack_into(">III", frame, pos + 4, XING_FLAGS, frames, total_bytes)
+    frame[pos + 16:pos + 116] = toc
+    struct.pack_into(">I", frame, pos + 116, 0)  # quality indicator
+    pos += 120
+
+    # LAME tag (36 bytes)
+    delay = max(0, min(encoder_delay, 0xFFF))
+    pad = max(0, min(padding, 0xFFF))
+    frame[pos:pos + 9] = LAME_TAG_VERSION
+    frame[pos + 9] = 0x01 if cbr else 0x04  # tag revision 0, CBR / VBR(mtrh)
+    frame[pos + 20] = min(255, template["bitrate"] // 1000)  # ABR / min bitrate
+    frame[pos + 21:pos + 24] = bytes(((delay >> 4) & 0xFF, ((delay & 0x0F) << 4) | (pad >> 8), pad & 0xFF))
+    # Music CRC left 0: decoders don't verify it, and a pure-Python CRC over
+    # the whole chapter would cost more than the concatenation itself
+    struct.pack_into(">IH", frame, pos + 28, total_bytes, 0)
+    struct.pack_into(">H", frame, pos + 34, crc16(frame[:pos + 34]))
+
+    return bytes(frame)
+
+
+def concat_mp3(parts, mp3_path, encoder_delay, last_part_samples):
+    """
+    Join MP3 parts frame by frame and prepend a Xing/Info + LAME tag frame
+
+    Not gapless between parts: players trim only the first part's priming
+    and the last part's padding. Every interior boundary keeps the encoder
+    delay + padding of its parts (up to ~70 ms of silence at 24 kHz),
+    landing on the paragraph/sentence breaks chunks end at.
+
+    Args:
+        parts: Iterable of MP3 byte strings (one per chunk, playback order)
+        mp3_path: Output path
+        encoder_delay: Priming samples at the start of every part
+        last_part_samples: PCM samples encoded into the last part
+
+    Returns:
+        Dict with frames, bytes, duration (seconds), padding, parts (one
+        {offset, length, frames} per input part, byte offsets in the file)
+
+    Raises:
+        ValueError: If parts contain no frames or mix sample rates / channels
+    """
+    mp3_path = Path(mp3_path)
+    fd = os.open(mp3_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    try:
+        template = None
+        tag_length = 0
+        frame_offsets = []
+        audio_bytes = 0
+        last_part_frames = 0
+        cbr = True
+        part_layout = []
+
+        for part in parts:
+            frames = list(iter_frames(part))
+            if not frames:
+                part_layout.append({"offset": None, "length": 0, "frames": 0})
+                continue
+            last_part_frames = len(frames)
+            part_bytes = 0
+
+            if template is None:
+                template = frames[0][1]
+                _, tag_length = _tag_frame_header(template)
+                os.pwrite(fd, bytes(tag_length), 0)  # reserved for the tag frame
+
+            for offset, header in frames:
+                if (header["sample_rate"], header["channels"]) != (
+                    template["sample_rate"],
+                    template["channels"],
+                ):
+                    raise ValueError("MP3 parts use different sample rates or channel layouts")
+                cbr = cbr and header["bitrate"] == template["bitrate"]
+                frame_offsets.append(audio_bytes + part_bytes)
+                part_bytes += header["frame_length"]
+
+            # One write per part (frames of a part are contiguous once tags are stripped)
+            payload = audio_frames(part)
+            written = 0
+            while written < len(payload):
+                written += os.pwrite(fd, payload[written:], tag_length + audio_bytes + written)
+            part_layout.append({"offset": audio_bytes, "length": len(payload), "frames": len(frames)})
+            audio_bytes += len(payload)
+
+        if template is None:
+            raise ValueError("No MP3 frames to concatenate")
+
+        padding = last_part_frames * template["samples_per_frame"] - encoder_delay - last_part_samples
+        tag = build_tag_frame(template, frame_offsets, audio_bytes, encoder_delay, padding, cbr)
+        os.pwrite(fd, tag, 0)
+        os.fsync(fd)
+    except Exception:
+        os.close(fd)
+        mp3_path.unlink(missing_ok=True)
+        raise
+
+    os.close(fd)
+
+    samples = len(frame_offsets) * template["samples_per_frame"] - encoder_delay - padding
+    return {
+        "frames": len(frame_offsets),
+        "bytes": tag_length + audio_bytes,
+        "duration": max(0, samples) / template["sample_rate"],
+        "padding": padding,
+        "parts": [
+            {**part, "offset": tag_length + part["offset"] if part["offset"] is not None else None}
+            for part in part_layout
+        ],
+    }
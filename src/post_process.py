@@ -0,0 +1,356 @@
+"""
+post_process.py - Chapter Mastering on Memory-mapped PCM (NumPy)
+
+Features:
+- Trim each chunk's leading/trailing silence, then put exactly `gap_ms`
+  of silence at every chunk boundary (short fades at the cut points)
+- Integrated loudness (ITU-R BS.1770: K-weighting, 400 ms blocks,
+  -70 LUFS absolute + -10 LU relative gate) across the whole chapter
+- One gain for the chapter (peak-safe), applied while streaming PCM
+  blocks to the encoder → no extra full-file ffmpeg pass
+- Reads chunks as zero-copy NumPy views of the store's memory map
+  (ChunkStore.array), block by block
+
+NumPy is optional: without it the chapter is assembled unprocessed.
+"""
+
+import math
+
+# Speech below this level counts as silence when trimming chunk edges
+DEFAULT_SILENCE_DB = -50.0
+# Default integrated loudness target (spoken word / audiobooks)
+DEFAULT_TARGET_LUFS = -18.0
+
+# Analysis granularity
+SILENCE_WINDOW_MS = 10
+LOUDNESS_STEP_MS = 100  # 400 ms gating blocks = 4 steps (75% overlap)
+
+
+def numpy_available():
+    """True if NumPy is installed"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ============================================================
+# K-weighting (BS.1770) evaluated in the frequency domain
+# ============================================================
+
+
+def _k_weighting_filters(rate):
+    """
+    Biquad (b, a) pairs of the BS.1770 pre-filter and RLB high-pass,
+    re-derived for any sample rate (matches the published 48 kHz values)
+    """
+    # High shelf (head effects)
+    K = math.tan(math.pi * 1681.974450955533 / rate)
+    Q = 0.7071752369554196
+    Vh = 10 ** (3.999843853973347 / 20)
+    Vb = Vh ** 0.4996667741545416
+    a0 = 1 + K / Q + K * K
+    shelf = (
+        [(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0],
+        [1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0],
+    )
+
+    # RLB high-pass
+    K = math.tan(math.pi * 38.13547087602444 / rate)
+    Q = 0.5003270373238773
+    a0 = 1 + K / Q + K * K
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0])
+
+    return shelf, high_pass
+
+
+def k_weighting_power(n_fft, rate):
+    """
+    |H(f)|² of the K-weighting filter at the rfft bins of an n_fft block
+
+    Filtered block energy = Σ |X(f)|² |H(f)|² (Parseval), so the IIR
+    filter never has to run sample by sample in Python.
+    """
+    import numpy as np
+
+    z = np.exp(-1j * 2 * np.pi * np.fft.rfftfreq(n_fft, 1 / rate) / rate)
+    power = np.ones(len(z))
+
+    for b, a in _k_weighting_filters(rate):
+        num = b[0] + b[1] * z + b[2] * z ** 2
+        den = a[0] + a[1] * z + a[2] * z ** 2
+        power *= np.abs(num / den) ** 2
+
+    return power
+
+
+class LoudnessMeter:
+    """
+    Đo integrated loudness (LUFS) theo kiểu streaming
+
+    Workflow:
+    1. add(samples) → cắt thành các bước 100 ms, tính năng lượng K-weighted
+       bằng rfft theo lô (vectorized)
+    2. integrated() → ghép 4 bước thành block 400 ms, gate -70 LUFS
+       tuyệt đối + -10 LU tương đối
+    """
+
+    def __init__(self, rate, channels=1):
+        import numpy as np
+
+        self.rate = rate
+        self.channels = channels
+        self.step = rate * LOUDNESS_STEP_MS // 1000
+        self._weights = k_weighting_power(self.step, rate)
+        # Parseval for rfft: DC and Nyquist once, every other bin twice
+        self._weights[1:] *= 2
+        if self.step % 2 == 0:
+            self._weights[-1] /= 2
+        self._carry = np.zeros((0, channels), dtype=np.float32)
+        self._energies = []  # summed channel energy per 100 ms step
+
+    def add(self, samples):
+        """Feed float samples shaped (frames, channels), scaled to [-1, 1]"""
+        import numpy as np
+
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+
+        steps = len(samples) // self.step
+        if steps:
+            blocks = samples[: steps * self.step].reshape(steps, self.step, self.channels)
+            spectrum = np.abs(np.fft.rfft(blocks, axis=1)) ** 2
+            energy = np.einsum("sfc,f->s", spectrum, self._weights) / self.step
+            self._energies.append(energy)
+
+        self._carry = samples[steps * self.step:].copy()
+
+    def integrated(self):
+        """Integrated loudness in LUFS, or None if the chapter is (near) silent"""
+        import numpy as np
+
+        if not self._energies:
+            return None
+
+        steps = np.concatenate(self._energies)
+        if len(steps) < 4:
+            return None
+
+        # 400 ms blocks with 75% overlap = sum of 4 consecutive 100 ms steps
+        cumulative = np.concatenate([[0.0], np.cumsum(steps)])
+        blocks = (cumulative[4:] - cumulative[:-4]) / (4 * self.step)
+        blocks = blocks[blocks > 0]
+
+        with np.errstate(divide="ignore"):
+            loudness = -0.691 + 10 * np.log10(blocks)
+
+        gated = blocks[loudness > -70.0]
+        if not len(gated):
+            return None
+
+        relative = -0.691 + 10 * math.log10(gated.mean()) - 10.0
+        gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+
+# ============================================================
+# Chapter analysis + processing
+# ============================================================
+
+
+def find_speech_range(samples, rate, silence_db=DEFAULT_SILENCE_DB, margin_ms=30):
+    """
+    First/last frame of non-silence in an int16 block (10 ms RMS windows)
+
+    Returns:
+        Tuple (start, end) in frames; (0, 0) if the block is all silence
+    """
+    import numpy as np
+
+    window = max(1, rate * SILENCE_WINDOW_MS // 1000)
+    windows = len(samples) // window
+    if windows == 0:
+        return 0, 0
+
+    frames = samples[: windows * window].astype(np.float32) / 32768.0
+    power = (frames.reshape(windows, -1) ** 2).mean(axis=1)
+    loud = np.flatnonzero(power > 10 ** (silence_db / 10))
+    if not len(loud):
+        return 0, 0
+
+    margin = rate * margin_ms // 1000
+    start = max(0, loud[0] * window - margin)
+    end = min(len(samples), (loud[-1] + 1) * window + margin)
+    if loud[-1] == windows - 1:
+        end = len(samples)  # speech runs into the partial tail window
+    return int(start), int(end)
+
+
+def analyze_chapter(store, chunk_ids, silence_db=DEFAULT_SILENCE_DB, block_frames=1 << 20):
+    """
+    Read-only pass over the chapter: speech ranges, loudness, peak
+
+    Args:
+        store: ChunkStore with every chunk
+        chunk_ids: Chunk IDs in playback order
+        silence_db: Silence threshold (dBFS)
+        block_frames: Max frames converted to float at once
+
+    Returns:
+        Dict with ranges [(start, end)], loudness (LUFS or None),
+        peak (0-1), trimmed_frames
+    """
+    import numpy as np
+
+    rate = store.params["rate"]
+    meter = LoudnessMeter(rate, store.params["channels"])
+    ranges = []
+    peak = 0
+    trimmed = 0
+
+    for chunk_id in chunk_ids:
+        view = store.array(chunk_id)
+        start, end = find_speech_range(view, rate, silence_db)
+        ranges.append((start, end))
+        trimmed += len(view) - (end - start)
+
+        for block_start in range(start, end, block_frames):
+            block = view[block_start:min(end, block_start + block_frames)]
+            peak = max(peak, int(np.abs(block.astype(np.int32)).max()))
+            meter.add(block.astype(np.float32) / 32768.0)
+
+    return {
+        "ranges": ranges,
+        "loudness": meter.integrated(),
+        "peak": peak / 32768.0,
+        "trimmed_frames": trimmed,
+    }
+
+
+def chapter_gain(analysis, target_lufs=DEFAULT_TARGET_LUFS, max_peak_db=-1.0, max_gain_db=20.0):
+    """
+    Gain (dB) that brings the chapter to target_lufs without clipping
+
+    Returns:
+        Tuple (gain_db, limited_by_peak: bool)
+    """
+    if analysis["loudness"] is None:
+        return 0.0, False
+
+    gain = max(-max_gain_db, min(max_gain_db, target_lufs - analysis["loudness"]))
+    if analysis["peak"] > 0:
+        headroom = max_peak_db - 20 * math.log10(analysis["peak"])
+        if gain > headroom:
+            return headroom, True
+    return gain, False
+
+
+def iter_processed_pcm(
+    store, chunk_ids, analysis, gain_db, gap_ms=500, fade_ms=5, block_frames=1 << 20
+):
+    """
+    Yield mastered PCM bytes: trimmed chunks, uniform gaps, chapter gain
+
+    Args:
+        store: ChunkStore
+        chunk_ids: Chunk IDs in playback order (same as analyze_chapter)
+        analysis: Result of analyze_chapter
+        gain_db: Gain from chapter_gain
+        gap_ms: Silence between chunks (half of it at the chapter edges)
+        fade_ms: Fade-in/out at every cut point (avoids clicks)
+        block_frames: Max frames processed at once
+    """
+    import numpy as np
+
+    rate = store.params["rate"]
+    channels = store.params["channels"]
+    gain = 10 ** (gain_db / 20)
+    gap = np.zeros((rate * gap_ms // 1000, channels), dtype="<i2").tobytes()
+    edge = gap[: len(gap) // 2 // store.frame_size * store.frame_size]
+    fade_len = rate * fade_ms // 1000
+    fade = np.linspace(0.0, 1.0, fade_len, dtype=np.float32)[:, None] if fade_len else None
+
+    yield edge
+    for index, (chunk_id, (start, end)) in enumerate(zip(chunk_ids, analysis["ranges"])):
+        if index:
+            yield gap
+
+        view = store.array(chunk_id)
+        for block_start in range(start, end, block_frames):
+            block_end = min(end, block_start + block_frames)
+            block = view[block_start:block_end].astype(np.float32) * gain
+
+            if fade is not None:
+                # Fade only where this block touches the chunk's cut points
+                if block_start == start:
+                    n = min(fade_len, len(block))
+                    block[:n] *= fade[:n]
+                if block_end == end:
+                    n = min(fade_len, len(block))
+                    block[len(block) - n:] *= fade[::-1][fade_len - n:]
+
+            yield np.clip(np.rint(block), -32768, 32767).astype("<i2").tobytes()
+    yield edge
+
+
+def _output_layout(ranges, gap_frames):
+    """Where each trimmed chunk lands in iter_processed_pcm's output"""
+    layout = []
+    position = gap_frames // 2  # leading edge
+    for index, (start, end) in enumerate(ranges):
+        if index:
+            position += gap_frames
+        layout.append((position, end - start))
+        position += end - start
+    return layout
+
+
+def master_chapter(store, chunk_ids, target_lufs=DEFAULT_TARGET_LUFS, gap_ms=500):
+    """
+    Analyze the chapter and return a streaming mastered PCM source
+
+    Returns:
+        Tuple (pcm_blocks iterator, report dict with loudness_before,
+        loudness_target, gain_db, limited_by_peak, trimmed_seconds,
+        layout [(start_frame, frames)] of each chunk in the output)
+    """
+    chunk_ids = list(chunk_ids)
+    analysis = analyze_chapter(store, chunk_ids)
+    gain_db, limited = chapter_gain(analysis, target_lufs)
+
+    report = {
+        "loudness_before": analysis["loudness"],
+        "loudness_target": target_lufs,
+        "gain_db": gain_db,
+        "limited_by_peak": limited,
+        "trimmed_seconds": analysis["trimmed_frames"] / store.params["rate"],
+        "boundaries": max(0, len(chunk_ids) - 1),
+        "layout": _output_layout(analysis["ranges"], store.params["rate"] * gap_ms // 1000),
+    }
+    return iter_processed_pcm(store, chunk_ids, analysis, gain_db, gap_ms), report
+
+
+def master_summary(report):
+    """Mastering report without the per-chunk layout (for events/JSONL)"""
+    if report is None:
+        return None
+    return {key: value for key, value in report.items() if key != "layout"}
+
+
+def format_master_report(report):
+    """Two-line summary of the mastering pass"""
+    before = report["loudness_before"]
+    before_text = f"{before:.1f} LUFS" if before is not None else "silent"
+    limited = " (peak-limited)" if report["limited_by_peak"] else ""
+    return (
+        f"🎚️  Loudness: {before_text} → target {report['loudness_target']:.1f} LUFS, "
+        f"gain {report['gain_db']:+.1f} dB{limited}\n"
+        f"✂️  Trimmed {report['trimmed_seconds']:.1f}s of edge silence, "
+        f"{report['boundaries']} chunk boundaries normalized"
+    )
+
+
+def print_master_report(report):
+    """Print the mastering summary"""
+    print(format_master_report(report))
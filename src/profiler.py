@@ -0,0 +1,309 @@
+"""
+profiler.py - Per-stage Profiling of the Chapter Pipeline (--profile)
+
+Features:
+- Wall time, CPU time (of the thread running the stage) and peak Python
+  heap (tracemalloc) for every stage and every chunk
+- Stage breakdown + slowest chunks printed at the end of the run
+- Optional dump directory: cProfile stats per local stage ({stage}.prof,
+  open with `python -m pstats` or snakeviz), a tracemalloc snapshot of each
+  local stage's highest-peak call, and every raw record as profile.json
+- Disabled by default: stage() is a no-op until enable() is called
+- Every stage is also a span of the --trace timeline (tracer.py)
+
+Stages:
+- Local (CPU / disk in this process): read_text, clean_markdown,
+  split_chunks, resume_scan, audio_check, stream_write, store_put,
+  checkpoint, chunk_mp3_encode, assembly, timing_index
+- Waiting: key_wait (KeyRotationManager), api_request (Gemini call),
+  encode_background (wall + CPU of the encoder worker process)
+
+In concurrent mode stages overlap across threads, so the summed stage wall
+time exceeds the run's wall time; the peak heap of a stage is the
+process-wide peak while it ran.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from .tracer import TRACER
+
+
+class StageProfiler:
+    """
+    Đo thời gian + bộ nhớ theo từng stage của pipeline
+
+    Workflow:
+    1. enable(dump_dir) → bật tracemalloc (+ cProfile nếu có dump_dir)
+    2. Code pipeline bọc mỗi bước bằng `with PROFILER.stage("name")`
+    3. chunk(n, chapter) gắn số chunk cho mọi stage trong thread hiện tại
+    4. print_report() → bảng stage + chunk chậm nhất; dump() → .prof / snapshot / JSON
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.dump_dir = None
+        self.lock = threading.Lock()
+        self.records = []  # [{stage, chapter, chunk, wall, cpu, peak}]
+
+        self._local = threading.local()
+        self._active = 0
+        self._started = None
+        self._finished = None
+        self._profile_lock = threading.Lock()  # one cProfile at a time per process
+        self._profiles = {}  # stage → pstats.Stats
+        self._snapshots = {}  # stage → (peak, tracemalloc.Snapshot)
+        self._started_tracemalloc = False
+
+    def enable(self, dump_dir=None):
+        """
+        Start recording
+
+        Args:
+            dump_dir: Directory for cProfile / tracemalloc / JSON dumps
+                      (None = printed report only)
+        """
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._started = time.perf_counter()
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording (records are kept for the report)"""
+        self.enabled = False
+        self._finished = time.perf_counter()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # ------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------
+
+    @contextmanager
+    def chunk(self, number, chapter=None):
+        """Attribute every stage run by this thread to chunk `number`"""
+        if not (self.enabled or TRACER.enabled):
+            yield
+            return
+        previous = getattr(self._local, "context", (None, None))
+        self._local.context = (chapter, number)
+        try:
+            yield
+        finally:
+            self._local.context = previous
+
+    @contextmanager
+    def stage(self, name, local=False):
+        """
+        Time one stage
+
+        Args:
+            name: Stage name
+            local: Runs Python code in this process → cProfile / tracemalloc
+                   snapshots are taken when a dump directory is set
+        """
+        if not self.enabled:
+            if TRACER.enabled:
+                chapter, number = getattr(self._local, "context", (None, None))
+                with TRACER.span(name, chapter=chapter, chunk=number):
+                    yield
+            else:
+                yield
+            return
+
+        with self.lock:
+            # Peak is process-wide: only reset it when no other stage is running
+            if self._active == 0:
+                tracemalloc.reset_peak()
+            self._active += 1
+
+        profile = None
+        if local and self.dump_dir is not None and self._profile_lock.acquire(blocking=False):
+            import cProfile  # only with --profile-dump
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active (e.g. a debugger)
+                self._profile_lock.release()
+                profile = None
+
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_started
+            cpu = time.thread_time() - cpu_started
+            if profile is not None:
+                profile.disable()
+                self._profile_lock.release()
+            peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+            with self.lock:
+                self._active -= 1
+            chapter, number = getattr(self._local, "context", (None, None))
+            self._add(name, chapter, number, wall, cpu, peak, profile, local)
+            TRACER.complete(name, wall_started, wall, chapter=chapter, chunk=number)
+
+    def record(self, name, wall, cpu=None, chapter=None, chunk=None):
+        """Record a stage measured elsewhere (e.g. in an encoder worker process)"""
+        if self.enabled:
+            self._add(name, chapter, chunk, wall, cpu, 0)
+
+    def _add(self, name, chapter, number, wall, cpu, peak, profile=None, local=False):
+        with self.lock:
+            self.records.append(
+                {"stage": name, "chapter": chapter, "chunk": number, "wall": wall, "cpu": cpu, "peak": peak}
+            )
+            if profile is not None:
+                stats = self._profiles.get(name)
+                if stats is None:
+                    import pstats
+
+                    self._profiles[name] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            best = self._snapshots.get(name)
+            take_snapshot = (
+                local and self.dump_dir is not None and tracemalloc.is_tracing()
+                and (best is None or peak > best[0])
+            )
+        if take_snapshot:
+            snapshot = tracemalloc.take_snapshot()
+            with self.lock:
+                best = self._snapshots.get(name)
+                if best is None or peak > best[0]:
+                    self._snapshots[name] = (peak, snapshot)
+
+    # ------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------
+
+    def summary(self):
+        """
+        Aggregate records per stage and per chunk
+
+        Returns:
+            Dict with stages ({name: calls, wall, mean, max, cpu, peak}),
+            chunks ([{chapter, chunk, wall, stages}] slowest first),
+            wall_seconds
+        """
+        with self.lock:
+            records = list(self.records)
+
+        stages = {}
+        chunks = {}
+        for r in records:
+            entry = stages.setdefault(
+                r["stage"], {"calls": 0, "wall": 0.0, "max": 0.0, "cpu": 0.0, "cpu_known": False, "peak": 0}
+            )
+            entry["calls"] += 1
+            entry["wall"] += r["wall"]
+            entry["max"] = max(entry["max"], r["wall"])
+            if r["cpu"] is not None:
+                entry["cpu"] += r["cpu"]
+                entry["cpu_known"] = True
+            entry["peak"] = max(entry["peak"], r["peak"])
+
+            if r["chunk"] is not None:
+                chunk = chunks.setdefault(
+                    (r["chapter"] or "", r["chunk"]),
+                    {"chapter": r["chapter"], "chunk": r["chunk"], "wall": 0.0, "stages": {}},
+                )
+                chunk["wall"] += r["wall"]
+                chunk["stages"][r["stage"]] = chunk["stages"].get(r["stage"], 0.0) + r["wall"]
+
+        for entry in stages.values():
+            entry["mean"] = entry["wall"] / entry["calls"]
+            if not entry.pop("cpu_known"):
+                entry["cpu"] = None
+
+        end = self._finished or time.perf_counter()
+        return {
+            "stages": stages,
+            "chunks": sorted(chunks.values(), key=lambda c: c["wall"], reverse=True),
+            "wall_seconds": end - self._started if self._started else 0.0,
+        }
+
+    def print_report(self, top_chunks=5):
+        """Print the stage breakdown and the slowest chunks"""
+        summary = self.summary()
+        if not summary["stages"]:
+            return
+
+        print(f"\n{'='*60}")
+        print(f"⏱️  Stage Profile ({summary['wall_seconds']:.1f}s wall)")
+        print(f"{'='*60}")
+        print(f"{'Stage':<18}{'Calls':>6}{'Wall s':>9}{'Mean s':>8}{'Max s':>8}{'CPU s':>8}{'CPU%':>6}{'Peak MB':>9}")
+        stages = sorted(summary["stages"].items(), key=lambda item: item[1]["wall"], reverse=True)
+        for name, s in stages:
+            cpu = f"{s['cpu']:>8.2f}{s['cpu'] / s['wall']:>6.0%}" if s["cpu"] is not None and s["wall"] >= 0.01 else f"{'-':>8}{'-':>6}"
+            peak = f"{s['peak'] / 1024 / 1024:>9.1f}" if s["peak"] else f"{'-':>9}"
+            print(f"{name:<18}{s['calls']:>6}{s['wall']:>9.2f}{s['mean']:>8.3f}{s['max']:>8.2f}{cpu}{peak}")
+
+        if summary["chunks"]:
+            print(f"\nSlowest chunks:")
+            for chunk in summary["chunks"][:top_chunks]:
+                label = f"{chunk['chapter']} #{chunk['chunk']}" if chunk["chapter"] else f"#{chunk['chunk']}"
+                split = ", ".join(
+                    f"{name} {seconds:.2f}s"
+                    for name, seconds in sorted(chunk["stages"].items(), key=lambda item: item[1], reverse=True)
+                )
+                print(f"  {label}: {chunk['wall']:.2f}s ({split})")
+
+        try:
+            import resource
+
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f"\nProcess peak RSS: {max_rss / 1024:.1f} MB")  # KiB on Linux
+        except (ImportError, AttributeError):
+            pass
+        print(f"{'='*60}\n")
+
+    def dump(self):
+        """
+        Write profile.json, {stage}.prof and {stage}.tracemalloc to dump_dir
+
+        Returns:
+            List of written paths
+        """
+        if self.dump_dir is None:
+            return []
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+
+        with self.lock:
+            records = list(self.records)
+            profiles = dict(self._profiles)
+            snapshots = dict(self._snapshots)
+
+        json_path = self.dump_dir / "profile.json"
+        tmp_path = json_path.with_name(json_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"summary": self.summary(), "records": records}, f, indent=2, default=str)
+        os.replace(tmp_path, json_path)
+        written.append(json_path)
+
+        for name, stats in profiles.items():
+            path = self.dump_dir / f"{name}.prof"
+            stats.dump_stats(str(path))
+            written.append(path)
+
+        for name, (_, snapshot) in snapshots.items():
+            path = self.dump_dir / f"{name}.tracemalloc"
+            snapshot.dump(str(path))
+            written.append(path)
+
+        return written
+
+
+# Shared by every module of the pipeline (no-op until enable())
+PROFILER = StageProfiler()
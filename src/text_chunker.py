@@ -21,23 +21,47 @@ import logging
 import re
 from typing import List
 
-# Import tiktoken for token counting
-try:
-    import tiktoken
-except ImportError:
-    raise ImportError(
-        "tiktoken is required for token counting. Install with: pip install tiktoken"
-    )
-
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# tiktoken + its BPE table are loaded on first count (import is ~0.1s)
+_encoding = None
+_encoding_error = None  # BPE download failed once → word estimate from then on
+
 
 # ============================================================
 # Token Counting
 # ============================================================
 
 
+def get_encoding():
+    """
+    cl100k_base encoding, created on first use and cached
+
+    Raises:
+        ImportError: tiktoken is not installed
+        Exception: The BPE table could not be loaded (raised again on every
+                   call without retrying the download)
+    """
+    global _encoding, _encoding_error
+    if _encoding_error is not None:
+        raise _encoding_error
+    if _encoding is None:
+        try:
+            import tiktoken
+        except ImportError:
+            raise ImportError(
+                "tiktoken is required for token counting. Install with: pip install tiktoken"
+            )
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_error = e
+            logger.warning(f"Token counting failed: {e}, using word count estimation")
+            raise
+    return _encoding
+
+
 def count_tokens(text: str) -> int:
     """
     Count tokens using tiktoken (cl100k_base encoding)
@@ -49,10 +73,10 @@ def count_tokens(text: str) -> int:
         int: Number of tokens
     """
     try:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-    except Exception as e:
-        logger.warning(f"Token counting failed: {e}, using word count estimation")
+        return len(get_encoding().encode(text))
+    except ImportError:
+        raise
+    except Exception:
         # Fallback: estimate 1 word ≈ 1.3 tokens
         return int(len(text.split()) * 1.3)
 
@@ -0,0 +1,171 @@
+"""
+tracer.py - Timeline Trace of Concurrent Chunk Execution (--trace)
+
+Features:
+- Spans per thread: key acquisition, cooldown sleeps, API requests,
+  audio checks, chunk writes, checkpoint records, assembly, encoding
+- Instant events for retries (soft-fail, 429, overload, suspect audio)
+  and a counter track of in-flight API requests
+- Background encodes (worker processes) appear on their own "encoder" row
+- Chrome Trace Event JSON: open in chrome://tracing or ui.perfetto.dev
+- Opt-in: every call is a no-op until start()
+
+Spans come from the same `PROFILER.stage(...)` hooks as --profile (see
+profiler.py), so both views always cover the same stages.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class TraceRecorder:
+    """
+    Ghi timeline (span theo thread) để xem worker chờ key / gọi API / idle
+
+    Workflow:
+    1. start() → bắt đầu ghi (timestamp tính từ lúc start)
+    2. span(name) / instant(name) / counter(name, value) từ mọi thread
+    3. save(path) → Chrome Trace Event JSON (chrome://tracing, Perfetto)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.events = []  # (phase, name, ts_us, dur_us, tid, args)
+        self._origin = 0.0
+        self._threads = {}  # tid → thread name
+        self._rows = {}  # virtual row name → tid
+        self._counters = {}  # counter name → current value
+        self._pid = os.getpid()
+
+    def start(self):
+        """Start recording (drops earlier events)"""
+        with self.lock:
+            self.events = []
+            self._threads = {}
+            self._rows = {}
+            self._counters = {}
+        self._origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def _now_us(self, at=None):
+        return ((time.perf_counter() if at is None else at) - self._origin) * 1e6
+
+    def _tid(self, name=None):
+        if name is not None:
+            # Virtual rows get small ids (thread idents are never that small)
+            tid = self._rows.setdefault(name, len(self._rows) + 1)
+        else:
+            tid = threading.get_ident()
+            name = threading.current_thread().name
+        if tid not in self._threads:
+            self._threads[tid] = name
+        return tid
+
+    # ------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------
+
+    @contextmanager
+    def span(self, name, **args):
+        """Record a complete event ("X") covering the with-block"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, started, time.perf_counter() - started, **args)
+
+    def complete(self, name, started, seconds, row=None, **args):
+        """
+        Record a span measured elsewhere
+
+        Args:
+            name: Span name
+            started: perf_counter() at span start
+            seconds: Span duration
+            row: Virtual row name (None = current thread)
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            tid = self._tid(row)
+            self.events.append(("X", name, self._now_us(started), seconds * 1e6, tid, args))
+
+    def instant(self, name, **args):
+        """Record a thread-scoped instant event ("i"), e.g. a retry"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append(("i", name, self._now_us(), 0.0, self._tid(), args))
+
+    def counter(self, name, delta):
+        """Add delta to a counter track ("C") and record its new value"""
+        if not self.enabled:
+            return
+        with self.lock:
+            value = self._counters.get(name, 0) + delta
+            self._counters[name] = value
+            self.events.append(("C", name, self._now_us(), 0.0, 0, {"value": value}))
+
+    # ------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------
+
+    def to_chrome_trace(self):
+        """
+        Build the Chrome Trace Event document
+
+        Returns:
+            Dict with traceEvents (+ thread_name metadata) and displayTimeUnit
+        """
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+
+        trace = [
+            {"ph": "M", "name": "process_name", "pid": self._pid, "tid": 0, "args": {"name": "audiobook_generator"}}
+        ]
+        for tid, name in threads.items():
+            trace.append({"ph": "M", "name": "thread_name", "pid": self._pid, "tid": tid, "args": {"name": name}})
+
+        for phase, name, ts, dur, tid, args in events:
+            event = {"ph": phase, "name": name, "cat": "tts", "pid": self._pid, "tid": tid, "ts": round(ts, 1)}
+            if phase == "X":
+                event["dur"] = round(dur, 1)
+            elif phase == "i":
+                event["s"] = "t"
+            if args:
+                event["args"] = {k: v for k, v in args.items() if v is not None}
+            trace.append(event)
+
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """
+        Write the trace as JSON (atomic)
+
+        Returns:
+            Number of events written
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        document = self.to_chrome_trace()
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(document, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        return len(document["traceEvents"])
+
+
+# Shared by every module of the pipeline (no-op until start())
+TRACER = TraceRecorder()
@@ -1,16 +1,28 @@
+from textual import work
 from textual.app import App
 from textual.containers import Container, Horizontal
 from textual.widgets import Button, ContentSwitcher, Label
 
-from tui.messages import FileSelected
+from tui.engine import EngineBridge, LiveStats
+from tui.messages import FileSelected, VoiceSelected
 from tui.screens.dashboard import Dashboard
 from tui.screens.file_browser import FileBrowser
 from tui.screens.voice_select import VoiceSelect
 
+# Seconds between dashboard renders: events arriving in between are
+# applied as one batch → heavy runs cannot flood the render loop
+REFRESH_INTERVAL = 0.5
+
 
 class TTSApp(App):
     CSS_PATH = "styles/app.tcss"
 
+    def __init__(self, engine=None):
+        super().__init__()
+        self.engine = engine or EngineBridge()
+        self.stats = LiveStats()
+        self.selected_file = None
+
     def compose(self):
         with Horizontal():
             with Container(id="sidebar"):
@@ -24,6 +36,43 @@ class TTSApp(App):
                     yield FileBrowser(id="new-job")
                     yield VoiceSelect(id="voice-select")
 
+    def on_mount(self) -> None:
+        self.start_engine()
+        self.set_interval(REFRESH_INTERVAL, self.refresh_dashboard)
+
+    def on_unmount(self) -> None:
+        self.engine.stop()
+
+    @work(thread=True, exclusive=True, group="engine")
+    def start_engine(self) -> None:
+        """Load keys / SDK and start the job server off the UI thread"""
+        try:
+            self.engine.start()
+        except Exception as e:
+            self.call_from_thread(self.notify, f"Engine failed to start: {e}", severity="error", timeout=10)
+            return
+        self.call_from_thread(self.notify, "Engine ready")
+
+    @work(thread=True, group="submit")
+    def submit_job(self, path: str, voice: str) -> None:
+        """Queue a chapter; synthesis runs on the engine's own threads"""
+        try:
+            jobs = self.engine.submit(path, voice)
+        except Exception as e:
+            self.call_from_thread(self.notify, f"Could not queue {path}: {e}", severity="error")
+            return
+        ids = ", ".join(str(job["id"]) for job in jobs)
+        self.call_from_thread(self.notify, f"Queued job {ids} ({voice})")
+
+    def refresh_dashboard(self) -> None:
+        """Apply every event buffered since the last tick, then render once"""
+        batch = self.engine.drain()
+        self.stats.apply(batch)
+        for _, payload in batch:
+            if payload["event"] == "job_done" and not payload.get("ok"):
+                self.notify(f"Job {payload['job']} failed: {payload.get('error')}", severity="error")
+        self.query_one(Dashboard).render_stats(self.stats, self.engine.latest)
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         button_id = event.button.id
 
@@ -34,12 +83,22 @@ class TTSApp(App):
             self.query_one(ContentSwitcher).current = "new-job"
 
     def on_file_selected(self, message: FileSelected) -> None:
-        selected_file = message.path
+        self.selected_file = message.path
 
-        self.notify(f"File selected: {selected_file}")
+        self.notify(f"File selected: {self.selected_file}")
 
         self.query_one(ContentSwitcher).current = "voice-select"
 
+    def on_voice_selected(self, message: VoiceSelected) -> None:
+        if self.selected_file is None:
+            self.notify("Select a file first", severity="warning")
+            self.query_one(ContentSwitcher).current = "new-job"
+            return
+
+        self.submit_job(self.selected_file, message.voice)
+        self.selected_file = None
+        self.query_one(ContentSwitcher).current = "dashboard"
+
 
 if __name__ == "__main__":
     app = TTSApp()
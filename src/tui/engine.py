@@ -0,0 +1,251 @@
+"""
+engine.py - Engine Bridge for the TUI (in-process job server + batched events)
+
+Features:
+- EngineBridge: runs a JobServer inside the app; jobs are synthesized on
+  its dispatcher threads, so the UI thread never waits on the API
+- Events reach the TUI through a job server subscriber that only appends
+  to a deque (listener thread, never blocks); the app drains it on a
+  timer → one render pass per tick however many events arrived
+- Engine state (queue, per-key health) is sampled on a background thread:
+  the rotation lock can be held through a cooldown sleep, the UI only
+  reads the latest sample
+- LiveStats: per-chunk status, job progress, requests per second and
+  chunks per second over a sliding window, ETA
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# Sliding window for requests / chunks per second
+RATE_WINDOW = 30.0
+
+# Chunk status per event (events without a chunk field update jobs only)
+CHUNK_STATUS = {
+    "chunk_start": "synthesizing",
+    "request_start": "requesting",
+    "retry": "retry",
+    "suspect_audio": "suspect",
+    "chunk_done": "done",
+    "chunk_failed": "failed",
+}
+
+
+class EngineBridge:
+    """
+    Cầu nối TUI ↔ engine: job server chạy nền trong cùng process
+
+    Workflow:
+    1. start() (worker thread của app) → JobServer + subscriber
+    2. submit(path, voice) → job "queued", dispatcher thread xử lý
+    3. Subscriber (listener thread) → deque, không render gì
+    4. Timer của app → drain() lấy cả batch event → LiveStats.apply() → render một lần
+    5. Sampler thread → latest (queue, key stats); UI chỉ đọc, không bao giờ chờ lock
+    """
+
+    def __init__(self, db_path="data/tui_jobs.sqlite3", max_jobs=2, workers=3, event_log="data/events.jsonl",
+                 sample_interval=1.0):
+        """
+        Args:
+            db_path: Queue database (separate from the daemon's)
+            max_jobs: Chapters synthesized at once
+            workers: Concurrent workers per chapter
+            event_log: JSONL event log (None = off)
+            sample_interval: Seconds between engine state samples
+        """
+        self.db_path = db_path
+        self.max_jobs = max_jobs
+        self.workers = workers
+        self.event_log = event_log
+        self.sample_interval = sample_interval
+        self.server = None
+        self.latest = None  # last snapshot() (None until the engine runs)
+        self._events = deque()  # (received monotonic, payload)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _on_event(self, payload):
+        """Job server subscriber (listener thread): just buffer"""
+        self._events.append((time.monotonic(), payload))
+
+    def start(self):
+        """Create and start the engine (slow: keys, health store, SDK) → call from a worker thread"""
+        # Lazy: the engine (Gemini SDK, tokenizer) is only loaded once the UI is up
+        from src.job_server import JobServer
+
+        with self._lock:
+            if self.server is None:
+                self.server = JobServer(
+                    db_path=self.db_path, max_jobs=self.max_jobs, workers=self.workers,
+                    event_log=self.event_log, console=False, subscribers=[self._on_event],
+                ).start()
+                threading.Thread(target=self._sample, name="tui-sampler", daemon=True).start()
+        return self.server
+
+    def _sample(self):
+        while True:
+            self.latest = self.snapshot()
+            if self._stopping.wait(self.sample_interval):
+                return
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            if self.server is not None:
+                self.server.stop()
+                self.server = None
+
+    def submit(self, path, voice, submitter="tui"):
+        """
+        Queue a chapter (or a book directory)
+
+        Returns:
+            List of job dicts
+        """
+        if self.server is None:
+            raise RuntimeError("Engine is not running")
+        return self.server.submit([path], submitter, {"voice": voice})
+
+    def drain(self):
+        """All events buffered since the last call"""
+        batch = []
+        while self._events:
+            batch.append(self._events.popleft())
+        return batch
+
+    def snapshot(self):
+        """
+        Engine state for one render (may block on engine locks → sampler thread)
+
+        Returns:
+            JobServer.status() (queue counts, keys per key...) + total
+            workers and mean request latency; None if the engine is not running
+        """
+        server = self.server
+        if server is None:
+            return None
+        status = server.status()
+        status.update(workers=server.max_jobs * server.workers, latency=server.health_store.mean_latency())
+        return status
+
+
+class LiveStats:
+    """Dashboard state built from engine events (UI thread only)"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.jobs = {}    # job id → job dict (chapter, status, done, total)
+        self.chunks = {}  # (job id, chunk) → row dict
+        self.requests = deque()     # request_start times
+        self.completions = deque()  # chunk_done times
+        self.changed = set()  # chunk rows to re-render
+        self.events = 0
+
+    def apply(self, batch):
+        """Fold a batch of (received, payload) events into the state"""
+        for received, payload in batch:
+            self.events += 1
+            event = payload["event"]
+            job = self._job(payload)
+
+            if event == "request_start":
+                self.requests.append(received)
+            elif event == "chunk_done":
+                self.completions.append(received)
+
+            if job is not None:
+                self._apply_job(job, event, payload)
+            if event in CHUNK_STATUS and payload.get("chunk") is not None:
+                self._apply_chunk(event, payload)
+
+        self._trim(time.monotonic())
+
+    def _job(self, payload):
+        job_id = payload.get("job")
+        if job_id is None:
+            return None
+        return self.jobs.setdefault(
+            job_id, {"id": job_id, "chapter": payload.get("chapter", "?"), "status": "queued", "done": 0, "total": 0}
+        )
+
+    def _apply_job(self, job, event, payload):
+        if event == "job_start":
+            job.update(status="running", chapter=Path(payload.get("path", job["chapter"])).name)
+        elif event == "chapter_start":
+            job.update(total=payload.get("chunks", 0), done=payload.get("resumed", 0) or 0)
+        elif event == "chunk_done":
+            job["done"] = max(job["done"] + 1, payload.get("completed") or 0)
+        elif event == "job_done":
+            job["status"] = "done" if payload.get("ok") else "failed"
+            job["error"] = payload.get("error")
+        elif event == "job_requeued":
+            job["status"] = "queued"
+
+    def _apply_chunk(self, event, payload):
+        row_key = (payload.get("job"), payload["chunk"])
+        row = self.chunks.setdefault(row_key, {
+            "job": payload.get("job"), "chapter": payload.get("chapter", "?"), "chunk": payload["chunk"],
+            "total": payload.get("total"), "status": "", "key": "", "attempts": 0, "seconds": None,
+        })
+        row["status"] = CHUNK_STATUS[event]
+        if event == "request_start":
+            row["key"] = payload.get("key_display", row["key"])
+            row["attempts"] += 1
+        elif event == "chunk_done":
+            row["seconds"] = payload.get("seconds")
+            row["total"] = payload.get("total", row["total"])
+        elif event == "chunk_start":
+            row["total"] = payload.get("total", row["total"])
+        self.changed.add(row_key)
+
+    def _trim(self, now):
+        for times in (self.requests, self.completions):
+            while times and now - times[0] > self.window:
+                times.popleft()
+
+    def _rate(self, times, now):
+        self._trim(now)
+        if not times:
+            return 0.0
+        # Young run: divide by the time since the first event, not the full window
+        return len(times) / max(1.0, min(self.window, now - times[0]))
+
+    def requests_per_second(self, now=None):
+        return self._rate(self.requests, now or time.monotonic())
+
+    def chunks_per_second(self, now=None):
+        return self._rate(self.completions, now or time.monotonic())
+
+    def remaining(self):
+        """Chunks left in running / queued jobs whose size is known"""
+        return sum(
+            max(0, job["total"] - job["done"]) for job in self.jobs.values() if job["status"] in ("running", "queued")
+        )
+
+    def eta(self, workers=1, latency=None, now=None):
+        """
+        Seconds until the known chunks are done
+
+        Measured chunk throughput once there is one; before that, the
+        historical mean latency × rounds of `workers` parallel requests.
+
+        Returns:
+            Seconds, or None if nothing is left / no estimate yet
+        """
+        remaining = self.remaining()
+        if remaining == 0:
+            return None
+        rate = self.chunks_per_second(now)
+        if rate > 0:
+            return remaining / rate
+        if latency:
+            return math.ceil(remaining / max(1, workers)) * latency
+        return None
+
+    def take_changed(self):
+        """Chunk rows changed since the last render"""
+        changed, self.changed = self.changed, set()
+        return [self.chunks[key] for key in sorted(changed, key=lambda k: (k[0] or 0, k[1]))]
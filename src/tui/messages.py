@@ -5,3 +5,9 @@ class FileSelected(Message):
     def __init__(self, path: str) -> None:
         self.path = path
         super().__init__()
+
+
+class VoiceSelected(Message):
+    def __init__(self, voice: str) -> None:
+        self.voice = voice
+        super().__init__()
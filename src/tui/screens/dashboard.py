@@ -1,18 +1,118 @@
 from textual.containers import Container, Horizontal
 from textual.widgets import DataTable, Label, Static
 
+KEY_STATE_ICONS = {"available": "🟢", "in_use": "🔵", "cooldown": "🟡", "removed": "🔴"}
+
+
+def format_seconds(seconds):
+    """ETA / duration as 1h 02m, 3m 10s or 42s"""
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
 
 class Dashboard(Container):
+    """Live engine view: job / chunk / rate / ETA boxes, per-key health, per-chunk status"""
+
     def compose(self):
         yield Label("Dashboard Overview")
 
         with Horizontal():
-            yield Static("Stat 1")
-            yield Static("Stat 2")
-            yield Static("Stat 3")
+            yield Static("Jobs\n-", id="stat-jobs")
+            yield Static("Chunks\n-", id="stat-chunks")
+            yield Static("Req/s\n-", id="stat-rate")
+            yield Static("ETA\n-", id="stat-eta")
 
-        yield DataTable()
+        yield DataTable(id="keys-table")
+        yield DataTable(id="chunks-table")
 
     def on_mount(self):
-        table = self.query_one(DataTable)
-        table.add_columns("ID", "File", "Status")
+        keys = self.query_one("#keys-table", DataTable)
+        for label, key in (
+            ("Key", "key"), ("State", "state"), ("OK", "ok"), ("Fail", "fail"),
+            ("Fail rate", "fail_rate"), ("Latency", "latency"),
+        ):
+            keys.add_column(label, key=key)
+
+        chunks = self.query_one("#chunks-table", DataTable)
+        for label, key in (
+            ("Job", "job"), ("Chapter", "chapter"), ("Chunk", "chunk"), ("Status", "status"),
+            ("Key", "key"), ("Tries", "tries"), ("Time", "time"),
+        ):
+            chunks.add_column(label, key=key)
+
+    def render_stats(self, stats, engine):
+        """
+        Re-render from the current state (called once per batch of events)
+
+        Args:
+            stats: LiveStats (its changed chunk rows are consumed)
+            engine: EngineBridge.snapshot() (None while the engine starts)
+        """
+        jobs = list(stats.jobs.values())
+        running = sum(1 for job in jobs if job["status"] == "running")
+        queued = engine["queue"]["queued"] if engine else 0
+        done = sum(job["done"] for job in jobs)
+        total = sum(job["total"] for job in jobs)
+
+        self.query_one("#stat-jobs", Static).update(f"Jobs\n{running} running · {queued} queued")
+        self.query_one("#stat-chunks", Static).update(f"Chunks\n{done}/{total}" if total else "Chunks\n-")
+        self.query_one("#stat-rate", Static).update(
+            f"Req/s\n{stats.requests_per_second():.2f} ({stats.chunks_per_second() * 60:.1f} chunks/min)"
+        )
+        if engine and engine["quota_wait_until"]:
+            self.query_one("#stat-eta", Static).update("ETA\nwaiting for quota")
+        else:
+            eta = stats.eta(
+                workers=engine["workers"] if engine else 1, latency=engine["latency"] if engine else None
+            )
+            self.query_one("#stat-eta", Static).update(f"ETA\n{format_seconds(eta)}")
+
+        if engine:
+            self._render_keys(engine["keys"].get("keys", []))
+        self._render_chunks(stats.take_changed())
+
+    def _render_keys(self, keys):
+        table = self.query_one("#keys-table", DataTable)
+        for entry in keys:
+            state = f"{KEY_STATE_ICONS.get(entry['state'], '')} {entry['state']}"
+            if entry["state"] == "cooldown":
+                state += f" ({entry['cooldown_left']:.0f}s)"
+            latency = entry.get("latency_ewma")
+            cells = {
+                "key": f"#{entry['index']} {entry['key']}",
+                "state": state,
+                "ok": str(entry.get("successes") or 0),
+                "fail": str(entry.get("failures") or 0),
+                "fail_rate": f"{entry.get('soft_fail_rate') or 0.0:.0%}",
+                "latency": f"{latency:.1f}s" if latency else "-",
+            }
+            self._upsert(table, entry["key"], cells)
+
+    def _render_chunks(self, rows):
+        table = self.query_one("#chunks-table", DataTable)
+        for row in rows:
+            cells = {
+                "job": str(row["job"] or "-"),
+                "chapter": row["chapter"],
+                "chunk": f"{row['chunk']}/{row['total']}" if row["total"] else str(row["chunk"]),
+                "status": row["status"],
+                "key": row["key"],
+                "tries": str(row["attempts"]),
+                "time": f"{row['seconds']:.1f}s" if row["seconds"] is not None else "",
+            }
+            self._upsert(table, f"{row['job']}:{row['chunk']}", cells)
+
+    @staticmethod
+    def _upsert(table, row_key, cells):
+        """Update a row in place (only changed rows are touched → no full table redraw)"""
+        if row_key in table.rows:
+            for column, value in cells.items():
+                table.update_cell(row_key, column, value)
+        else:
+            table.add_row(*cells.values(), key=row_key)
@@ -13,5 +13,8 @@ class FileBrowser(Container):
     def on_directory_tree_file_selected(self, event: DirectoryTree.FileSelected):
         """Hàm này chạy khi user chọn một file"""
         selected_file = str(event.path)
+        if not selected_file.endswith(".md"):
+            self.notify("Chỉ chọn được file Markdown (.md)", severity="warning")
+            return
 
         self.post_message(FileSelected(selected_file))
@@ -1,6 +1,8 @@
 from textual.containers import Container, Horizontal
 from textual.widgets import Button, Label
 
+from tui.messages import VoiceSelected
+
 
 class VoiceCard(Container):
     def __init__(self, voice_name, voice_style):
@@ -12,7 +14,12 @@ class VoiceCard(Container):
         yield Label(self.voice_name)
         yield Label(self.voice_style)
         yield Button("Preview")
-        yield Button("Select")
+        yield Button("Select", classes="select-voice")
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.has_class("select-voice"):
+            event.stop()
+            self.post_message(VoiceSelected(self.voice_name))
 
 
 class VoiceSelect(Container):
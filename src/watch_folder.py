@@ -0,0 +1,509 @@
+"""
+watch_folder.py - Watch Mode: Incremental Processing of New / Edited Chapters
+
+Features:
+- Watches book folders for *.md chapters that appear or change (the
+  translation pipeline drops chapters all day) → no manual run_batch.sh
+  re-scan of the whole book
+- inotify on Linux (ctypes, no extra dependency), polling fallback
+  elsewhere or with --poll
+- Debounce: a file is picked up only after it has been quiet for --settle
+  seconds and its size / mtime stopped changing (half-written files wait)
+- O(1) skip of finished chapters: one stat compared with the source
+  fingerprint stored in the chapter's timing index (TTS/{stem}.index.json);
+  touched-but-identical files are recognised by their hash
+- Edited chapters: only the chunks whose text changed are re-synthesized
+  and spliced into the finished file (same chunk count, pcm / frames
+  layout, at most --max-changed of the chunks); otherwise the whole
+  chapter is queued again
+- Jobs go to the running job server (JobClient) or to an in-process engine
+  (--local); a chapter with a job in flight is never queued twice
+
+Usage:
+    python -m src.watch_folder book/
+    python -m src.watch_folder book/ book2/ --socket /tmp/tts.sock --submitter translator
+    python -m src.watch_folder book/ --local --max-jobs 2 --workers 3 --chunk-mp3
+    python -m src.watch_folder book/ --poll 5            # polling instead of inotify
+    python -m src.watch_folder book/ --once              # one scan, queue, exit
+"""
+
+import ctypes
+import ctypes.util
+import getpass
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+from .chapter_index import REPLACEABLE_LAYOUTS, chunk_text_hash, get_index_path, load_index, write_index
+from .checkpoint import calculate_file_hash, source_fingerprint
+
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Above this share of changed chunks a full rebuild is cheaper than splicing
+DEFAULT_MAX_CHANGED = 0.5
+
+# Seconds between job status checks of in-flight chapters
+JOB_CHECK_INTERVAL = 2.0
+
+FINAL_STATUSES = ("done", "failed", "cancelled")
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len (+ name)
+
+
+def inotify_available():
+    """Check if inotify can be used (Linux libc with inotify_init1)"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        return hasattr(ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6"), "inotify_init1")
+    except OSError:
+        return False
+
+
+def is_chapter(path):
+    """Markdown chapter (not an editor temp file, nothing inside TTS/)"""
+    path = Path(path)
+    return path.suffix == ".md" and not path.name.startswith((".", "~", "#")) and path.parent.name != "TTS"
+
+
+def find_chapters(folder):
+    """All chapters under a watched folder (sorted)"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(d for d in dirnames if d != "TTS" and not d.startswith("."))
+        found.extend(Path(dirpath) / name for name in sorted(filenames) if is_chapter(Path(dirpath) / name))
+    return found
+
+
+def plan_update(file_path, max_changed=DEFAULT_MAX_CHANGED):
+    """
+    Decide what a chapter needs, reading only its timing index
+
+    Finished chapters are recognised with one stat (fingerprint stored in
+    the index). A changed fingerprint with the same content hash (touch,
+    copy) only refreshes the index. Indexes written before source
+    manifests existed are adopted as they are (output exists = done, same
+    rule as run_batch.sh).
+
+    Args:
+        file_path: Markdown chapter
+        max_changed: Max share of changed chunks to splice in place
+
+    Returns:
+        Dict with action (skip / chunks / full), reason, and chunks
+        (1-based numbers, action "chunks" only)
+    """
+    file_path = Path(file_path)
+    index_path = get_index_path(file_path.parent / "TTS", file_path)
+    fingerprint = source_fingerprint(file_path)
+    try:
+        index = load_index(index_path)
+    except (OSError, ValueError):
+        return {"action": "full", "reason": "new chapter"}
+
+    if index.get("source_fingerprint") == fingerprint:
+        return {"action": "skip", "reason": "finished"}
+
+    file_hash = calculate_file_hash(file_path)
+    legacy = index.get("source_hash") is None
+    if legacy or index["source_hash"] == file_hash:
+        if legacy:
+            _adopt_chunk_hashes(file_path, index)
+        index.update(source_fingerprint=fingerprint, source_hash=file_hash)
+        write_index(index_path, index)
+        return {"action": "skip", "reason": "adopted" if legacy else "finished"}
+
+    # Lazy: chunking pulls in the tokenizer, only needed for edited chapters
+    from .book_planner import chunk_chapter
+
+    current = [chunk_text_hash(chunk) for chunk in chunk_chapter(file_path)]
+    built = [entry.get("text_hash") for entry in index["chunks"]]
+    if len(current) != len(built):
+        return {"action": "full", "reason": f"{len(built)} → {len(current)} chunks"}
+
+    changed = [i + 1 for i, (old, new) in enumerate(zip(built, current)) if old != new]
+    if not changed:
+        # Markdown-only edit (formatting, comments): same spoken text
+        index.update(source_fingerprint=fingerprint, source_hash=file_hash)
+        write_index(index_path, index)
+        return {"action": "skip", "reason": "no spoken text changed"}
+    if index["layout"] not in REPLACEABLE_LAYOUTS:
+        return {"action": "full", "reason": f"'{index['layout']}' layout cannot be patched in place"}
+    if len(changed) > max_changed * len(current):
+        return {"action": "full", "reason": f"{len(changed)}/{len(current)} chunks changed"}
+    return {"action": "chunks", "reason": f"{len(changed)}/{len(current)} chunks changed", "chunks": changed}
+
+
+def _adopt_chunk_hashes(file_path, index):
+    """Legacy index: assume the finished audio speaks the current text"""
+    from .book_planner import chunk_chapter
+
+    chunks = chunk_chapter(file_path)
+    if len(chunks) == len(index["chunks"]):
+        for entry in index["chunks"]:
+            entry["text_hash"] = chunk_text_hash(chunks[entry["chunk"]])
+
+
+class _Inotify:
+    """Minimal inotify(7) binding: recursive directory watches, non-blocking reads"""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}  # wd → directory
+
+    def add_tree(self, folder):
+        """Watch a directory and its subdirectories (TTS/ and hidden ones excluded)"""
+        for dirpath, dirnames, _ in os.walk(folder):
+            dirnames[:] = [d for d in dirnames if d != "TTS" and not d.startswith(".")]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {dirpath}")
+            self.dirs[wd] = Path(dirpath)
+
+    def read(self, timeout):
+        """
+        Wait up to timeout seconds for events
+
+        Returns:
+            (paths of changed files, new directories, overflow flag)
+        """
+        paths, new_dirs, overflow = [], [], False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return paths, new_dirs, overflow
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths, new_dirs, overflow
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+            elif wd in self.dirs and name:
+                path = self.dirs[wd] / os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and path.name != "TTS" and not path.name.startswith("."):
+                        new_dirs.append(path)
+                else:
+                    paths.append(path)
+        return paths, new_dirs, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _LocalClient:
+    """JobServer in this process, behind JobClient's interface (--local)"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def submit(self, paths, submitter=None, **options):
+        return self.server.submit(paths, submitter, {k: v for k, v in options.items() if v is not None})
+
+    def jobs(self, status=None, submitter=None):
+        return self.server.queue.list(status=status, submitter=submitter)
+
+    def job(self, job_id):
+        return self.server.job(job_id)
+
+
+class FolderWatcher:
+    """
+    Theo dõi thư mục sách, chỉ gửi phần việc còn thiếu lên engine
+
+    Workflow:
+    1. start: quét toàn bộ chapter → plan_update() (chapter xong: 1 stat, bỏ qua)
+    2. inotify (hoặc polling) báo file .md mới / thay đổi → đưa vào hàng chờ debounce
+    3. File yên lặng ≥ settle giây + size/mtime không đổi → plan_update()
+    4. skip / job "chunks" (chỉ chunk đổi text) / job cả chapter
+    5. Chapter đang có job → chờ job xong rồi kiểm tra lại (file có thể đã sửa trong lúc chạy)
+    """
+
+    def __init__(self, folders, client, submitter=None, job_options=None, settle=DEFAULT_SETTLE,
+                 poll_interval=None, max_changed=DEFAULT_MAX_CHANGED):
+        """
+        Args:
+            folders: Book folders to watch (recursive, TTS/ excluded)
+            client: JobClient (or _LocalClient)
+            submitter: Submitter name for fair sharing
+            job_options: Options of full-chapter jobs (voice, workers, chunk_mp3...)
+            settle: Seconds a file must stay unchanged before it is queued
+            poll_interval: Poll instead of inotify, every N seconds
+            max_changed: Max share of changed chunks to splice in place
+        """
+        self.folders = [Path(f).resolve() for f in folders]
+        self.client = client
+        self.submitter = submitter or getpass.getuser()
+        self.job_options = dict(job_options or {})
+        self.settle = settle
+        self.max_changed = max_changed
+
+        self.inotify = None
+        if poll_interval is None and inotify_available():
+            self.inotify = _Inotify()
+        self.poll_interval = poll_interval or DEFAULT_POLL_INTERVAL
+
+        self.pending = {}    # path → (last change, (size, mtime_ns))
+        self.in_flight = {}  # path → job id
+        self.failed = {}     # path → fingerprint of a failed / cancelled job (retried once the file changes)
+        self.snapshot = {}   # path → (size, mtime_ns), polling mode
+        self.next_poll = 0.0
+        self.next_job_check = 0.0
+        self.stats = {"queued": 0, "chunk_jobs": 0, "skipped": 0}
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify is not None else f"polling every {self.poll_interval:g}s"
+
+    # ------------------------------------------------------------
+    # Change detection
+    # ------------------------------------------------------------
+
+    def _mark(self, path, now=None):
+        """Queue a path for the debounce (every new change restarts the wait)"""
+        path = Path(path)
+        try:
+            st = path.stat()
+        except OSError:
+            self.pending.pop(path, None)  # deleted / renamed away
+            return
+        self.pending[path] = (now if now is not None else time.monotonic(), (st.st_size, st.st_mtime_ns))
+
+    def scan(self):
+        """Mark every chapter under the watched folders (start, inotify overflow)"""
+        now = time.monotonic() - self.settle  # existing files: no need to wait
+        for folder in self.folders:
+            for path in find_chapters(folder):
+                self._mark(path, now)
+
+    def _poll(self):
+        """Polling fallback: stat every chapter, mark new / changed ones"""
+        snapshot = {}
+        for folder in self.folders:
+            for path in find_chapters(folder):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_size, st.st_mtime_ns)
+                if self.snapshot.get(path) != snapshot[path] and path not in self.pending:
+                    self._mark(path)
+        self.snapshot = snapshot
+
+    def _collect(self, timeout):
+        """Wait up to timeout for file changes"""
+        if self.inotify is None:
+            if time.monotonic() >= self.next_poll:
+                self._poll()
+                self.next_poll = time.monotonic() + self.poll_interval
+            time.sleep(timeout)
+            return
+
+        paths, new_dirs, overflow = self.inotify.read(timeout)
+        for path in paths:
+            if is_chapter(path):
+                self._mark(path)
+        for folder in new_dirs:
+            # A folder moved in with its chapters: no events for files already inside
+            self.inotify.add_tree(folder)
+            for path in find_chapters(folder):
+                self._mark(path)
+        if overflow:
+            print("⚠️  inotify queue overflow, rescanning")
+            self.scan()
+
+    # ------------------------------------------------------------
+    # Submitting
+    # ------------------------------------------------------------
+
+    def _due(self):
+        """Pending paths quiet for `settle` seconds whose size / mtime did not change meanwhile"""
+        now = time.monotonic()
+        due = []
+        for path, (changed_at, signature) in list(self.pending.items()):
+            if now - changed_at < self.settle or path in self.in_flight:
+                continue
+            self._mark(path, now)
+            if self.pending.get(path, (None, None))[1] == signature:
+                del self.pending[path]
+                due.append(path)
+        return due
+
+    def _submit(self, path):
+        try:
+            plan = plan_update(path, self.max_changed)
+        except OSError as e:
+            print(f"⚠️  {path.name}: {e}")
+            return
+
+        if plan["action"] == "skip":
+            self.stats["skipped"] += 1
+            return
+        fingerprint = source_fingerprint(path)
+        if self.failed.get(path) == fingerprint:
+            return  # failed before and unchanged since → wait for the next edit
+
+        if plan["action"] == "chunks":
+            options = {"voice": self.job_options.get("voice"), "chunks": plan["chunks"]}
+        else:
+            options = self.job_options
+        job = self.client.submit([path], submitter=self.submitter, **options)[0]
+        self.in_flight[path] = job["id"]
+        self.failed.pop(path, None)
+        self.stats["chunk_jobs" if plan["action"] == "chunks" else "queued"] += 1
+        what = f"chunks {', '.join(map(str, plan['chunks']))}" if plan["action"] == "chunks" else "full chapter"
+        print(f"📥 {path.name}: {what} ({plan['reason']}) → job {job['id']}")
+
+    def _check_jobs(self):
+        """Forget finished jobs; re-check their chapter (edited while it ran?)"""
+        if not self.in_flight or time.monotonic() < self.next_job_check:
+            return
+        self.next_job_check = time.monotonic() + JOB_CHECK_INTERVAL
+        for path, job_id in list(self.in_flight.items()):
+            job = self.client.job(job_id)
+            if job is None or job["status"] not in FINAL_STATUSES:
+                continue
+            del self.in_flight[path]
+            if job["status"] == "done":
+                print(f"✅ {path.name}: job {job_id} done")
+            else:
+                print(f"❌ {path.name}: job {job_id} {job['status']} ({job.get('error') or 'by user'})")
+                self.failed[path] = source_fingerprint(path) if path.exists() else None
+            self._mark(path, time.monotonic() - self.settle)
+
+    def _adopt_in_flight(self):
+        """Chapters already queued / running on the server (watcher restart)"""
+        for status in ("queued", "running"):
+            for job in self.client.jobs(status=status):
+                self.in_flight.setdefault(Path(job["path"]), job["id"])
+
+    def step(self, timeout=1.0):
+        """One iteration: collect changes, check jobs, queue due chapters"""
+        self._collect(timeout)
+        self._check_jobs()
+        for path in self._due():
+            self._submit(path)
+
+    def run(self, once=False):
+        """
+        Watch until interrupted
+
+        Args:
+            once: Scan, queue what is missing, and return (no watching)
+        """
+        for folder in self.folders:
+            if self.inotify is not None:
+                self.inotify.add_tree(folder)
+        self._adopt_in_flight()
+        self.scan()
+        self.snapshot = {path: signature for path, (_, signature) in self.pending.items()}
+
+        for path in self._due():
+            self._submit(path)
+        print(
+            f"🔎 Initial scan: {self.stats['skipped']} finished, {self.stats['queued']} chapters + "
+            f"{self.stats['chunk_jobs']} chunk jobs queued, {len(self.in_flight)} in flight"
+        )
+        if once:
+            return
+
+        print(f"👀 Watching {', '.join(map(str, self.folders))} ({self.mode}, settle {self.settle:g}s)")
+        while True:
+            self.step()
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def main():
+    import argparse
+
+    from .job_server import DEFAULT_PORT, JobClient, JobServer, JobServerError
+
+    parser = argparse.ArgumentParser(description="Watch book folders and queue new / edited chapters")
+    parser.add_argument("folders", nargs="+", help="Book folders to watch")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}", help="Job server URL")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="Job server Unix socket")
+    parser.add_argument("--local", action="store_true", help="Run the engine in this process (no job server)")
+    parser.add_argument("--db", default="data/jobs.sqlite3", help="Queue database with --local")
+    parser.add_argument("--max-jobs", type=int, default=2, help="Chapters at once with --local (default: 2)")
+    parser.add_argument("--submitter", default=None, help="Name for fair sharing (default: login name)")
+    parser.add_argument("--voice", default=None, help="Voice name")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent workers per chapter")
+    parser.add_argument("--chunk-mp3", action="store_true", default=None,
+                        help="Per-chunk MP3 → edited chapters can be patched in place")
+    parser.add_argument("--normalize", type=float, default=None, metavar="LUFS", help="Loudness target")
+    parser.add_argument("--cue", action="store_true", default=None, help="Also write CUE sheets")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE,
+                        help=f"Seconds a file must stay unchanged (default: {DEFAULT_SETTLE:g})")
+    parser.add_argument("--poll", type=float, default=None, metavar="SECONDS",
+                        help="Poll instead of inotify (default when inotify is unavailable: "
+                        f"{DEFAULT_POLL_INTERVAL:g}s)")
+    parser.add_argument("--max-changed", type=float, default=DEFAULT_MAX_CHANGED,
+                        help="Max share of changed chunks patched in place (default: 0.5)")
+    parser.add_argument("--once", action="store_true", help="Scan once, queue missing work, exit")
+    args = parser.parse_args()
+
+    missing = [f for f in args.folders if not Path(f).is_dir()]
+    if missing:
+        print(f"❌ Not a directory: {', '.join(missing)}")
+        sys.exit(1)
+
+    server = None
+    if args.local:
+        server = JobServer(db_path=args.db, max_jobs=args.max_jobs, workers=args.workers or 3,
+                           voice=args.voice or "Kore").start()
+        client = _LocalClient(server)
+    else:
+        client = JobClient(url=args.url, socket_path=args.socket)
+
+    job_options = {
+        "voice": args.voice, "workers": args.workers, "chunk_mp3": args.chunk_mp3,
+        "normalize": args.normalize, "cue": args.cue,
+    }
+    watcher = FolderWatcher(
+        args.folders, client, submitter=args.submitter, job_options=job_options, settle=args.settle,
+        poll_interval=args.poll, max_changed=args.max_changed,
+    )
+    try:
+        watcher.run(once=args.once)
+        if server is not None and args.once:
+            # In-process engine: wait for the queued chapters before exiting
+            while watcher.in_flight:
+                watcher.step()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped watching")
+    except JobServerError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        watcher.close()
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import sys
+from pathlib import Path
+
+# Tests import the package as `src.*` (same as `python -m src.audiobook_generator`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import math
+import struct
+
+import pytest
+
+
+@pytest.fixture
+def tone():
+    """16-bit mono sine as raw PCM: tone(freq, seconds=0.5, rate=24000)"""
+    def make(freq, seconds=0.5, rate=24000):
+        samples = int(rate * seconds)
+        return b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * freq * i / rate))) for i in range(samples)
+        )
+    return make
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import audio_check
+from src import audiobook_generator as generator
+from src.audio_check import AudioChecker
+
+TEXT = " ".join(["word"] * 100)  # 100 tokens → ~8 s expected at the prior rate
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(audio_check, "count_tokens", lambda text: len(text.split()))
+
+
+@pytest.fixture
+def checker():
+    return AudioChecker(path=None)
+
+
+def silence(seconds):
+    return bytes(int(24000 * seconds) * 2)
+
+
+def test_ok_audio_is_accepted(checker, tone):
+    verdict = checker.check(tone(220, 8.0), TEXT)
+    assert not verdict["suspect"]
+    assert verdict["reason"] is None
+    assert verdict["expected_seconds"] == pytest.approx(8.0)
+
+
+def test_truncated_audio_is_short(checker, tone):
+    verdict = checker.check(tone(220, 2.0), TEXT)
+    assert verdict["suspect"] and verdict["reason"] == "short"
+
+
+def test_mostly_silent_audio_is_silent(checker, tone):
+    verdict = checker.check(tone(220, 1.0) + silence(7.0), TEXT)
+    assert verdict["suspect"] and verdict["reason"] == "silent"
+    assert verdict["voiced_fraction"] < audio_check.MIN_VOICED_FRACTION
+
+
+def test_runaway_audio_is_long(checker, tone):
+    verdict = checker.check(tone(220, 30.0), TEXT)
+    assert verdict["suspect"] and verdict["reason"] == "long"
+
+
+def test_short_text_skips_duration_checks(checker, tone):
+    # 10 tokens → 0.8 s expected, below MIN_EXPECTED_SECONDS
+    verdict = checker.check(tone(220, 0.2), " ".join(["word"] * 10))
+    assert not verdict["suspect"]
+    assert checker.run["checked"] == 1 and checker.run["suspect"] == 0
+
+
+class FakeRotation:
+    def __init__(self):
+        self.calls = []
+        self.health_store = SimpleNamespace(record_soft_fail=lambda key: self.calls.append(("soft_fail", key)))
+
+    def get_next_key(self):
+        return "key-a"
+
+    def return_key(self, key, latency=None):
+        self.calls.append(("return", key, latency is not None))
+
+
+def test_suspect_audio_is_not_a_key_success(monkeypatch, checker, tone):
+    responses = iter([silence(8.0), tone(220, 8.0)])
+
+    def generate_content(**kwargs):
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=next(responses)))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    monkeypatch.setattr(generator, "get_client", lambda key: client)
+    monkeypatch.setattr(generator, "get_api_key_manager",
+                        lambda: SimpleNamespace(keys=["key-a"], log_request=lambda *a, **k: None))
+    monkeypatch.setattr(generator, "emit", lambda *a, **k: None)
+    rotation = FakeRotation()
+
+    audio = generator.generate_audio_data(None, TEXT, rotation_manager=rotation, audio_checker=checker)
+
+    assert audio == tone(220, 8.0)
+    # Suspect attempt: key back in the queue without a success, one soft fail;
+    # accepted attempt: success with latency
+    assert rotation.calls == [("return", "key-a", False), ("soft_fail", "key-a"), ("return", "key-a", True)]
@@ -0,0 +1,60 @@
+import pytest
+
+from src.audio_io import WAV_HEADER_SIZE, build_wav_header, wav_data_range
+from src.chapter_index import load_index, mp3_samples_per_frame, replace_chunk
+from src.chunk_store import DEFAULT_PARAMS, ChunkStore
+from src.encode_pipeline import join_chunk_mp3, write_chapter_index
+
+
+def test_replace_pcm_chunk_keeps_later_offsets(tmp_path, tone):
+    pcm = [tone(220, 0.5), tone(330, 0.3), tone(440, 0.7)]
+    wav_path = tmp_path / "ch1.wav"
+    wav_path.write_bytes(build_wav_header(sum(map(len, pcm))) + b"".join(pcm))
+    index_path = write_chapter_index(wav_path, tmp_path / "ch1.md", DEFAULT_PARAMS, [len(p) // 2 for p in pcm])
+
+    new = tone(550, 0.4)
+    result = replace_chunk(index_path, 1, new)
+
+    assert result["layout"] == "pcm"
+    assert result["delta_seconds"] == pytest.approx(0.1)
+    assert wav_path.read_bytes()[WAV_HEADER_SIZE:] == pcm[0] + new + pcm[2]
+    assert wav_data_range(wav_path)[1] == len(pcm[0]) + len(new) + len(pcm[2])
+
+    chunks = load_index(index_path)["chunks"]
+    assert [c["offset"] for c in chunks] == [0, len(pcm[0]) // 2, (len(pcm[0]) + len(new)) // 2]
+    last = chunks[2]
+    data = wav_path.read_bytes()
+    assert data[last["byte_offset"]:last["byte_offset"] + last["byte_length"]] == pcm[2]
+
+
+def test_replace_frames_chunk_rejoins_mp3(tmp_path, tone):
+    pytest.importorskip("lameenc")
+    from src.encoder import encode_chunk_mp3
+    from src.mp3_frames import mp3_stream_info
+
+    pcm = [tone(220, 0.5), tone(330, 0.3), tone(440, 0.7)]
+    store = ChunkStore(tmp_path, "ch1")
+    mp3_store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    for chunk_id, data in enumerate(pcm):
+        store.put(chunk_id, data)
+    mp3_path = tmp_path / "ch1.mp3"
+    join = join_chunk_mp3(store, mp3_store, len(pcm), mp3_path)
+    index_path = write_chapter_index(mp3_path, tmp_path / "ch1.md", store.params, [len(p) // 2 for p in pcm],
+                                     join=join)
+    store.close()
+    mp3_store.close()
+
+    new = tone(550, 0.9)
+    result = replace_chunk(index_path, 1, new)
+    assert result["layout"] == "frames"
+
+    chunks = load_index(index_path)["chunks"]
+    data = mp3_path.read_bytes()
+    parts = [encode_chunk_mp3(p, DEFAULT_PARAMS) for p in (pcm[0], new, pcm[2])]
+    for entry, part in zip(chunks, parts):
+        assert data[entry["byte_offset"]:entry["byte_offset"] + entry["byte_length"]] == part
+
+    spf = mp3_samples_per_frame(DEFAULT_PARAMS["rate"])
+    assert chunks[1]["samples"] == len(new) // 2
+    assert chunks[2]["offset"] == (chunks[0]["frames"] + chunks[1]["frames"]) * spf
+    assert mp3_stream_info(mp3_path)["samples"] == chunks[2]["offset"] + len(pcm[2]) // 2
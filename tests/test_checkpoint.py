@@ -0,0 +1,41 @@
+import os
+
+from src.checkpoint import CheckpointJournal, calculate_file_hash, load_checkpoint, read_source
+
+
+def kill(journal):
+    """Simulate kill -9: the fd goes away, close() never runs"""
+    os.close(journal._fd)
+    journal._fd = None
+
+
+def test_journal_replay_after_torn_write(tmp_path):
+    source = tmp_path / "ch1.md"
+    source.write_text("# Chapter 1\n", encoding="utf-8")
+
+    journal = CheckpointJournal(tmp_path, source, total_chunks=6, snapshot_every=100)
+    for chunk_id in (0, 2, 1):
+        journal.mark_completed(chunk_id)
+    kill(journal)
+    with open(journal.journal_path, "ab") as f:
+        f.write(b'{"type":"done","ch')  # killed mid-append
+
+    checkpoint = load_checkpoint(tmp_path, source)
+    assert checkpoint["completed_chunks"] == [0, 1, 2]
+    assert checkpoint["total_chunks"] == 6
+
+    # Resume: a new run starts a fresh journal, nothing is glued to the torn line
+    journal = CheckpointJournal(tmp_path, source, 6, checkpoint["completed_chunks"], snapshot_every=100)
+    journal.mark_completed(3)
+    kill(journal)
+    assert load_checkpoint(tmp_path, source)["completed_chunks"] == [0, 1, 2, 3]
+
+
+def test_read_source_hashes_the_bytes_read(tmp_path):
+    source = tmp_path / "ch1.md"
+    source.write_bytes("# Chương 1\r\nMột dòng.\r\n".encode("utf-8"))
+
+    text, file_hash = read_source(source)
+
+    assert text == "# Chương 1\nMột dòng.\n"  # same newlines as open(..., "r")
+    assert file_hash == calculate_file_hash(source)
@@ -0,0 +1,67 @@
+import os
+
+from src.chunk_store import ChunkStore
+
+
+def pcm(value, frames=100):
+    return bytes([value, 0]) * frames
+
+
+def test_put_read_reopen(tmp_path):
+    store = ChunkStore(tmp_path, "ch1")
+    store.put(0, pcm(1))
+    store.put(1, pcm(2))
+    store.close()
+
+    store = ChunkStore(tmp_path, "ch1")
+    assert store.chunk_ids() == [0, 1]
+    assert store.read(1, verify=True) == pcm(2)
+    store.close()
+
+
+def test_torn_index_tail_is_truncated(tmp_path):
+    store = ChunkStore(tmp_path, "ch1")
+    store.put(0, pcm(1))
+    store.close()
+    with open(store.index_path, "ab") as f:
+        f.write(b'{"type":"chunk","chunk":9,"off')  # killed mid-append
+
+    store = ChunkStore(tmp_path, "ch1")
+    assert store.chunk_ids() == [0]
+    store.put(1, pcm(2))
+    store.put(2, pcm(3))
+    store.close()
+
+    store = ChunkStore(tmp_path, "ch1")
+    assert store.chunk_ids() == [0, 1, 2]
+    assert store.read(1, verify=True) == pcm(2)
+    store.close()
+
+
+def test_record_past_segment_end_is_dropped(tmp_path):
+    store = ChunkStore(tmp_path, "ch1")
+    store.put(0, pcm(1))
+    store.put(1, pcm(2))
+    store.close()
+    os.truncate(store.segment_path, len(pcm(1)) + 10)  # payload of chunk 1 lost
+
+    store = ChunkStore(tmp_path, "ch1")
+    assert store.chunk_ids() == [0]
+    store.close()
+
+
+def test_discard_survives_reopen(tmp_path):
+    store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    store.put(0, b"old")
+    store.discard(0)
+    store.discard(5)  # unknown chunk: no record
+    store.close()
+
+    store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    assert 0 not in store
+    store.put(0, b"new")
+    store.close()
+
+    store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    assert store.read(0) == b"new"
+    store.close()
@@ -0,0 +1,28 @@
+import pytest
+
+from src.chunk_store import ChunkStore
+from src.encode_pipeline import join_chunk_mp3
+from src.encoder import encode_chunk_mp3
+
+pytest.importorskip("lameenc")
+
+
+def test_resynthesized_chunk_is_reencoded(tmp_path, tone):
+    store = ChunkStore(tmp_path, "ch1")
+    mp3_store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    for chunk_id, freq in enumerate((220, 330)):
+        store.put(chunk_id, tone(freq))
+        mp3_store.put(chunk_id, encode_chunk_mp3(tone(freq), store.params))
+
+    # Chunk 1 synthesized again; the process dies before its MP3 is encoded
+    mp3_store.discard(1)
+    store.put(1, tone(440, seconds=0.7))
+    mp3_store.close()
+
+    mp3_store = ChunkStore(tmp_path, "ch1", kind="mp3")
+    stats = join_chunk_mp3(store, mp3_store, 2, tmp_path / "ch1.mp3")
+
+    assert stats["encoded_chunks"] == 1
+    assert mp3_store.read(1) == encode_chunk_mp3(tone(440, seconds=0.7), store.params)
+    store.close()
+    mp3_store.close()
@@ -0,0 +1,37 @@
+from src.events import render
+
+
+def test_chapter_failure_renders_partial_progress_and_chunk():
+    line = render("chapter_done", {
+        "chapter": "ch1.md", "chunk": 3, "ok": False, "error": "boom",
+        "partial": "TTS/ch1_PARTIAL.mp3", "partial_bytes": 2048, "partial_chunks": 2, "chunks": 7,
+    })
+
+    assert "💾 Saved partial progress (2/7 chunks):" in line
+    assert line.endswith("❌ ch1.md, chunk 3: boom")
+
+
+def test_redo_success_is_rendered_per_chunk_only():
+    assert render("chapter_done", {"chapter": "ch1.md", "ok": True, "mode": "redo", "output": "x"}) is None
+    assert render("chunk_replaced", {"chunk": 2, "audio": "ch1.mp3", "layout": "frames", "delta_seconds": 0.25}) == (
+        "✅ Chunk 2 replaced in ch1.mp3 (frames layout, +0.2s)"
+    )
+
+
+def test_assembly_done_reports_wav_fallback_and_index():
+    line = render("assembly_done", {
+        "chapter": "ch1.md", "output": "ch1.wav", "mode": "wav", "seconds": 0.5, "encode": None,
+        "index": "ch1.index.json",
+    })
+
+    assert "⚠️  MP3 encoder unavailable, kept WAV instead" in line
+    assert line.endswith("🗂️  Timing index: ch1.index.json")
+
+
+def test_job_server_events_have_console_lines():
+    assert render("jobs_requeued", {"jobs": 2}) == "🔄 Re-queued 2 jobs interrupted by the last shutdown"
+    assert render("quota_wait", {"until": 0}).startswith("😴 All keys exhausted, jobs wait until ")
+
+
+def test_bad_fields_fall_back_to_raw_event():
+    assert render("chunk_replaced", {"chunk": 2}) == "chunk_replaced {'chunk': 2}"
@@ -0,0 +1,28 @@
+from src.job_queue import JobQueue
+
+
+def test_submit_same_path_merges_queued_job():
+    queue = JobQueue(":memory:")
+    first = queue.submit("alice", "/book/ch1.md", {"voice": "Kore"})
+    second = queue.submit("bob", "/book/ch1.md", {"voice": "Puck"})
+
+    assert second["id"] == first["id"]
+    assert second["options"] == {"voice": "Puck"}
+    assert queue.counts()["queued"] == 1
+
+
+def test_claim_next_skips_running_path():
+    queue = JobQueue(":memory:")
+    queue.submit("alice", "/book/ch1.md")
+    running = queue.claim_next()
+
+    follow_up = queue.submit("tui", "/book/ch1.md")
+    other = queue.submit("tui", "/book/ch2.md")
+    assert follow_up["id"] != running["id"]
+
+    # Only ch2 is claimable while ch1 runs
+    assert queue.claim_next()["id"] == other["id"]
+    assert queue.claim_next() is None
+
+    queue.finish(running["id"], ok=True)
+    assert queue.claim_next()["id"] == follow_up["id"]
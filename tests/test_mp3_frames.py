@@ -0,0 +1,36 @@
+import pytest
+
+from src.chunk_store import DEFAULT_PARAMS
+from src.encoder import LAME_ENCODER_DELAY, encode_chunk_mp3
+from src.mp3_frames import _read_tag_frame, concat_mp3, count_frames, mp3_stream_info, parse_frame_header
+
+pytest.importorskip("lameenc")
+
+
+def test_concat_writes_frame_count_and_trims_outer_edges_only(tmp_path, tone):
+    pcm = [tone(220, 0.5), tone(330, 0.3), tone(440, 0.7)]
+    parts = [encode_chunk_mp3(data, DEFAULT_PARAMS) for data in pcm]
+    last_samples = len(pcm[-1]) // 2
+    joined = concat_mp3(parts, tmp_path / "ch.mp3", LAME_ENCODER_DELAY, last_samples)
+
+    data = (tmp_path / "ch.mp3").read_bytes()
+    header = parse_frame_header(data, 0)
+    tag = _read_tag_frame(data, 0, header)
+    part_frames = [count_frames(part) for part in parts]
+    spf = header["samples_per_frame"]
+
+    assert tag["frames"] == joined["frames"] == sum(part_frames) == count_frames(data)
+    assert tag["delay"] == LAME_ENCODER_DELAY
+    assert tag["padding"] == part_frames[-1] * spf - LAME_ENCODER_DELAY - last_samples
+    # Not gapless: interior parts decode in full (priming + padding kept as
+    # silence at each boundary), only the first priming / last padding is trimmed
+    assert mp3_stream_info(tmp_path / "ch.mp3")["samples"] == sum(part_frames[:-1]) * spf + last_samples
+
+    # Parts follow the tag frame back to back, in order
+    position = header["frame_length"]
+    for part, frames in zip(joined["parts"], parts):
+        assert part["offset"] == position
+        assert data[position:position + part["length"]] == frames
+        position += part["length"]
+    assert position == len(data)
+    assert [part["frames"] for part in joined["parts"]] == part_frames
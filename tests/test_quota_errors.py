@@ -0,0 +1,56 @@
+from google.genai.errors import ClientError
+
+from src.audiobook_generator import classify_error, parse_quota_error
+from src.key_health import KeyHealthStore
+from src.key_rotation_manager import KeyRotationManager
+
+
+def quota_error(quota_id=None, retry_delay=None):
+    details = []
+    if quota_id:
+        details.append({
+            "@type": "type.googleapis.com/google.rpc.QuotaFailure",
+            "violations": [{"quotaMetric": "generativelanguage.googleapis.com/generate_requests", "quotaId": quota_id}],
+        })
+    if retry_delay:
+        details.append({"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay})
+    return ClientError(429, {"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": "You exceeded your current quota, please check your plan and billing details.",
+        "details": details,
+    }})
+
+
+def test_daily_quota_is_exhausted():
+    error = quota_error("GenerateRequestsPerDayPerProjectPerModel-FreeTier", "21s")
+    assert parse_quota_error(error) == {"scope": "day", "retry_delay": 21.0}
+    assert classify_error(error) == "QUOTA_EXHAUSTED"
+
+
+def test_per_minute_quota_is_rate_limit():
+    error = quota_error("GenerateRequestsPerMinutePerProjectPerModel-FreeTier", "37s")
+    assert parse_quota_error(error) == {"scope": "minute", "retry_delay": 37.0}
+    assert classify_error(error) == "RATE_LIMIT"
+
+
+def test_retry_delay_without_quota_id_is_rate_limit():
+    assert classify_error(quota_error(retry_delay="5s")) == "RATE_LIMIT"
+
+
+def test_unknown_scope_removes_for_this_run_only():
+    error = quota_error()
+    assert parse_quota_error(error)["scope"] is None
+    assert classify_error(error) == "QUOTA_EXHAUSTED"
+
+
+def test_remove_key_persists_only_when_asked(tmp_path):
+    store = KeyHealthStore(path=tmp_path / "key_health.json")
+    manager = KeyRotationManager(["key-a", "key-b"], health_store=store)
+
+    manager.remove_key("key-a")
+    assert not store.is_exhausted("key-a")
+    assert manager.get_stats()["removed"] == 1
+
+    manager.remove_key("key-b", persist=True)
+    assert store.is_exhausted("key-b")
+    assert KeyHealthStore(path=tmp_path / "key_health.json").is_exhausted("key-b")
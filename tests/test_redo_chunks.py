@@ -0,0 +1,53 @@
+import pytest
+
+from src import audiobook_generator as generator
+from src.audio_io import build_wav_header
+from src.chunk_store import DEFAULT_PARAMS
+from src.encode_pipeline import write_chapter_index
+
+
+@pytest.fixture
+def chapter(tmp_path):
+    source = tmp_path / "ch1.md"
+    source.write_text("# Chapter 1\n\nOne short paragraph.\n", encoding="utf-8")
+    (tmp_path / "TTS").mkdir()
+    return source
+
+
+@pytest.fixture
+def events(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(generator, "emit", lambda event, **fields: recorded.append((event, fields)))
+    return recorded
+
+
+def no_backend(*args, **kwargs):
+    raise AssertionError("backend must not be called")
+
+
+def test_stream_layout_is_rejected_before_synthesis(chapter, monkeypatch, events):
+    output = chapter.parent / "TTS" / "ch1.mp3"
+    output.write_bytes(b"")
+    write_chapter_index(output, chapter, DEFAULT_PARAMS, [24000])
+    monkeypatch.setattr(generator, "generate_audio_data", no_backend)
+
+    assert generator.redo_chunks(chapter, [1]) is False
+    event, fields = events[-1]
+    assert (event, fields["ok"], fields["mode"]) == ("chapter_done", False, "redo")
+    assert "(stream layout) cannot be patched in place" in fields["error"]
+
+
+def test_synthesis_failure_ends_chapter(chapter, monkeypatch, events):
+    output = chapter.parent / "TTS" / "ch1.wav"
+    output.write_bytes(build_wav_header(48000) + bytes(48000))
+    write_chapter_index(output, chapter, DEFAULT_PARAMS, [24000])
+
+    def failing(*args, **kwargs):
+        raise Exception("Failed to generate audio after 6 attempts")
+
+    monkeypatch.setattr(generator, "generate_audio_data", failing)
+
+    assert generator.redo_chunks(chapter, [1]) is False
+    assert events[-1] == ("chapter_done", {"chapter": "ch1.md", "ok": False,
+                                           "error": "Failed to generate audio after 6 attempts"})
+    assert output.stat().st_size == 44 + 48000
@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+from src import book_planner, text_chunker
+from src.chapter_index import load_index, source_manifest, write_index
+from src.checkpoint import calculate_file_hash, source_fingerprint
+from src.chunk_store import DEFAULT_PARAMS
+from src.encode_pipeline import write_chapter_index
+from src.watch_folder import plan_update
+
+
+def words(count):
+    return len(count.split())
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    # Same chunk boundaries whether or not the tiktoken vocabulary is cached
+    monkeypatch.setattr(text_chunker, "count_tokens", words)
+    monkeypatch.setattr(book_planner, "count_tokens", words)
+
+
+def paragraph(tag, count=600):
+    return " ".join(f"{tag}{i}." for i in range(count))
+
+
+def write_chapter(path, paragraphs):
+    path.write_text("# Chapter\n\n" + "\n\n".join(paragraphs) + "\n", encoding="utf-8")
+
+
+def build(source, suffix=".wav"):
+    """Index of a finished chapter built from the current source"""
+    chunks = book_planner.chunk_chapter(source)
+    output = source.parent / "TTS" / (source.stem + suffix)
+    output.parent.mkdir(exist_ok=True)
+    output.write_bytes(b"")
+    info = source_manifest(source_fingerprint(source), calculate_file_hash(source), chunks)
+    return write_chapter_index(output, source, DEFAULT_PARAMS, [24000] * len(chunks), source_info=info)
+
+
+@pytest.fixture
+def chapter(tmp_path):
+    source = tmp_path / "ch1.md"
+    write_chapter(source, [paragraph("a"), paragraph("b"), paragraph("c")])
+    assert len(book_planner.chunk_chapter(source)) == 3
+    return source
+
+
+def touch(path):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_new_chapter_is_built(chapter):
+    assert plan_update(chapter)["action"] == "full"
+
+
+def test_finished_chapter_is_skipped(chapter):
+    build(chapter)
+    assert plan_update(chapter) == {"action": "skip", "reason": "finished"}
+
+
+def test_touched_chapter_refreshes_fingerprint(chapter):
+    index_path = build(chapter)
+    touch(chapter)
+
+    assert plan_update(chapter) == {"action": "skip", "reason": "finished"}
+    assert load_index(index_path)["source_fingerprint"] == source_fingerprint(chapter)
+
+
+def test_legacy_index_is_adopted(chapter):
+    index_path = build(chapter)
+    index = load_index(index_path)
+    for field in ("source_fingerprint", "source_hash"):
+        del index[field]
+    for entry in index["chunks"]:
+        del entry["text_hash"]
+    write_index(index_path, index)
+
+    assert plan_update(chapter) == {"action": "skip", "reason": "adopted"}
+    index = load_index(index_path)
+    assert index["source_hash"] == calculate_file_hash(chapter)
+    assert all(entry["text_hash"] for entry in index["chunks"])
+
+
+def test_markdown_only_edit_is_skipped(chapter):
+    build(chapter)
+    chapter.write_text(chapter.read_text(encoding="utf-8").replace("# Chapter", "## Chapter"), encoding="utf-8")
+    assert plan_update(chapter) == {"action": "skip", "reason": "no spoken text changed"}
+
+
+def test_edited_chunk_is_spliced(chapter):
+    build(chapter)
+    write_chapter(chapter, [paragraph("a"), paragraph("x"), paragraph("c")])
+
+    plan = plan_update(chapter)
+    assert plan["action"] == "chunks"
+    assert plan["chunks"] == [2]
+
+
+def test_edit_of_unpatchable_layout_rebuilds(chapter):
+    build(chapter, suffix=".mp3")  # stream layout
+    write_chapter(chapter, [paragraph("a"), paragraph("x"), paragraph("c")])
+    assert plan_update(chapter)["action"] == "full"
+
+
+def test_too_many_changed_chunks_rebuild(chapter):
+    build(chapter)
+    write_chapter(chapter, [paragraph("x"), paragraph("y"), paragraph("c")])
+    assert plan_update(chapter, max_changed=0.5)["action"] == "full"
+
+
+def test_chunk_count_change_rebuilds(chapter):
+    build(chapter)
+    write_chapter(chapter, [paragraph("a"), paragraph("b"), paragraph("c"), paragraph("d")])
+    assert plan_update(chapter) == {"action": "full", "reason": "3 → 4 chunks"}